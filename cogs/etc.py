@@ -1,10 +1,13 @@
 import importlib
+import io
 import logging
 
+import discord
 from discord.ext import commands, tasks
 
 from config import config
 from main import Bot
+from utils.shards import SAMPLE_INTERVAL, ShardMonitor
 
 
 class Etc(commands.Cog):
@@ -12,6 +15,29 @@ class Etc(commands.Cog):
 
     def __init__(self, bot):
         self.bot: Bot = bot
+        self.shard_monitor = ShardMonitor(bot)
+
+    async def cog_load(self):
+        self.sample_shards.start()
+
+    async def cog_unload(self):
+        self.sample_shards.cancel()
+
+    @tasks.loop(seconds=SAMPLE_INTERVAL)
+    async def sample_shards(self):
+        self.shard_monitor.sample()
+
+    @commands.Cog.listener()
+    async def on_shard_connect(self, shard_id: int):
+        self.shard_monitor.connected(shard_id)
+
+    @commands.Cog.listener()
+    async def on_shard_resumed(self, shard_id: int):
+        self.shard_monitor.resumed(shard_id)
+
+    @commands.Cog.listener()
+    async def on_shard_disconnect(self, shard_id: int):
+        self.shard_monitor.disconnected(shard_id)
 
     @tasks.loop(hours=6)
     async def post_stats(self):
@@ -59,6 +85,28 @@ class Etc(commands.Cog):
         importlib.reload(module)
         await ctx.send("✅ Reloaded successfully.")
 
+    @commands.command()
+    @commands.is_owner()
+    async def shards(self, ctx: commands.Context):
+        monitor = self.shard_monitor
+        if not monitor.shards:
+            await ctx.send("❌ No shards have been sampled yet.")
+            return
+
+        degraded = monitor.degraded()
+        summary = f"{len(monitor.shards)} shards, {len(degraded)} degraded" + (
+            f": {', '.join(map(str, degraded))}" if degraded else ""
+        )
+        table = monitor.table()
+        if len(summary) + len(table) > 1900:
+            # dozens of shards don't fit in a message
+            await ctx.send(
+                summary,
+                file=discord.File(io.BytesIO(table.encode()), filename="shards.txt"),
+            )
+        else:
+            await ctx.send(f"{summary}\n```\n{table}\n```")
+
 
 async def setup(bot):
     await bot.add_cog(Etc(bot))
@@ -1,184 +1,745 @@
+import asyncio
+import hashlib
+import hmac
+import io
 import random
+import re
+import secrets
+import time
+import weakref
+from collections import deque
 from urllib.parse import quote_plus
 
 import discord
-from aiohttp import ClientSession
+import numpy as np
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 
+from config import config
 from main import Bot
-from views import Confirm
+from utils import dice as dice_engine
+from utils import images, rps
+from utils import text as text_effects
+from utils import tictactoe as ttt
+from utils.bloom import RotatingBloomFilter
+from utils.cache import LRUCache
+from utils.grid import CONNECT_FOUR, GOMOKU, GridGame
+from views import b36encode
+
+# Game messages keep their whole state in the components' custom IDs, and
+# every click is routed to a DynamicItem registered once by the cog. Only the
+# last state of recently played boards is kept in memory (see BOARDS), so
+# idle games are free and survive restarts.
+
+CHALLENGE_TIMEOUT = 300
+
+# picks are sealed with this key so players can't read them from the custom ID
+RPS_KEY = hashlib.sha256(b"rps:" + config["token"].encode()).digest()
+
+# message ID -> the state last drawn on it. Two quick clicks on a board both
+# carry its old state in their custom IDs, and the second edit would undo the
+# first move, so clicks on a message take turns (see board_lock) and check
+# the state they start from against this.
+BOARDS = LRUCache(4096)
+# message ID -> lock, kept only while a click holds or waits for it
+BOARD_LOCKS: weakref.WeakValueDictionary[int, asyncio.Lock] = (
+    weakref.WeakValueDictionary()
+)
+
+
+def board_lock(message_id: int) -> asyncio.Lock:
+    """A lock held while a click on a game message edits it."""
+    return BOARD_LOCKS.setdefault(message_id, asyncio.Lock())
+
+
+async def edit_board(i: discord.Interaction, state, new_state, **edit) -> None:
+    """Edits a board from `state` to `new_state`, unless it has moved on since.
+
+    The new state is only recorded once the edit succeeds, so a failed edit
+    leaves the board playable from what it still shows.
+    """
+    async with board_lock(i.message.id):
+        if BOARDS.get(i.message.id, state) != state:
+            await i.response.send_message(
+                "❌ The board has changed, try again.", ephemeral=True
+            )
+            return
+        await i.response.edit_message(**edit)
+        BOARDS[i.message.id] = new_state
 
 
-class TicTacToeButton(discord.ui.Button):
-    def __init__(self, x: int, y: int):
-        super().__init__(style=discord.ButtonStyle.secondary, label="\u200b", row=y)
-        self.x = x
-        self.y = y
+def tictactoe_board(p1: int, p2: int, x: int, o: int, finished: bool = False):
+    view = discord.ui.View(timeout=None)
+    for cell in range(9):
+        view.add_item(TicTacToeCell(p1, p2, x, o, cell, finished))
+    return view
 
-    async def callback(self, i: discord.Interaction):
-        assert self.view is not None
-        view = self.view
-        state = view.board[self.y][self.x]
-        if state in (view.X, view.O):
-            return
 
-        if view.current_player == view.X and i.user.id == view.p1:
-            self.style = discord.ButtonStyle.danger
-            self.label = "X"
-            self.disabled = True
-            view.board[self.y][self.x] = view.X
-            view.current_player = view.O
-            content = "It is now O's turn"
-        elif view.current_player == view.O and i.user.id == view.p2:
-            self.style = discord.ButtonStyle.success
-            self.label = "O"
-            self.disabled = True
-            view.board[self.y][self.x] = view.O
-            view.current_player = view.X
-            content = "It is now X's turn"
-        elif (
-            view.current_player == view.X
-            and i.user.id == view.p2
-            or view.current_player == view.O
-            and i.user.id == view.p1
-        ):
-            await i.response.send_message("❌ It's not your turn!", ephemeral=True)
-            return
+class TicTacToeCell(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"ttt:(?P<p1>[0-9a-z]+):(?P<p2>[0-9a-z]+):(?P<x>[0-9a-z]+):(?P<o>[0-9a-z]+):(?P<cell>[0-8])",
+):
+    def __init__(
+        self, p1: int, p2: int, x: int, o: int, cell: int, finished: bool = False
+    ):
+        if x >> cell & 1:
+            style, label = discord.ButtonStyle.danger, "X"
+        elif o >> cell & 1:
+            style, label = discord.ButtonStyle.success, "O"
         else:
+            style, label = discord.ButtonStyle.secondary, "\u200b"
+        super().__init__(
+            discord.ui.Button(
+                style=style,
+                label=label,
+                row=cell // 3,
+                disabled=finished or label != "\u200b",
+                custom_id=f"ttt:{b36encode(p1)}:{b36encode(p2)}:{b36encode(x)}:{b36encode(o)}:{cell}",
+            )
+        )
+        self.p1 = p1
+        self.p2 = p2
+        self.x = x
+        self.o = o
+        self.cell = cell
+
+    @classmethod
+    async def from_custom_id(cls, i: discord.Interaction, item, match: re.Match):
+        return cls(
+            int(match["p1"], 36),
+            int(match["p2"], 36),
+            int(match["x"], 36),
+            int(match["o"], 36),
+            int(match["cell"]),
+        )
+
+    @staticmethod
+    def play(x: int, o: int, cell: int) -> tuple[int, int, str | None]:
+        """Plays a cell for whoever's turn it is. Returns the new board and the result, if any."""
+        # only the lines through the cell that was just played can have been completed
+        if ttt.x_to_move(x, o):
+            x |= 1 << cell
+            if ttt.wins(x, cell):
+                return x, o, "**X won!**"
+        else:
+            o |= 1 << cell
+            if ttt.wins(o, cell):
+                return x, o, "**O won!**"
+        if x | o == ttt.FULL:
+            return x, o, "**It's a tie!**"
+        return x, o, None
+
+    async def callback(self, i: discord.Interaction):
+        if i.user.id not in (self.p1, self.p2):
             await i.response.send_message(
                 "❌ You are not part of this game!", ephemeral=True
             )
             return
+        if i.user.id != (self.p1 if ttt.x_to_move(self.x, self.o) else self.p2):
+            await i.response.send_message("❌ It's not your turn!", ephemeral=True)
+            return
+
+        x, o, result = self.play(self.x, self.o, self.cell)
+        # 1Bot answers straight away, its move is a table lookup
+        if result is None and self.p2 == i.client.user.id:
+            x, o, result = self.play(x, o, ttt.best_move(x, o))
+
+        content = result or (
+            "It is now X's turn" if ttt.x_to_move(x, o) else "It is now O's turn"
+        )
+        await edit_board(
+            i,
+            (self.x, self.o),
+            (x, o),
+            content=content,
+            view=tictactoe_board(self.p1, self.p2, x, o, result is not None),
+        )
+
+
+def rps_pad(nonce: str, slot: int) -> int:
+    return hmac.digest(RPS_KEY, f"{nonce}:{slot}".encode(), "sha256")[0] & 3
 
-        winner = view.check_board_winner()
-        if winner is not None:
-            if winner == view.X:
-                content = "**X won!**"
-            elif winner == view.O:
-                content = "**O won!**"
-            else:
-                content = "**It's a tie!**"
-
-            for child in view.children:
-                child.disabled = True
-
-            view.stop()
-
-        await i.response.edit_message(content=content, view=view)
-
-
-class TicTacToe(discord.ui.View):
-    X = -1
-    O = 1  # noqa: E741
-    Tie = 2
-
-    def __init__(self, p1: discord.User, p2: discord.User):
-        super().__init__(timeout=60)
-        self.p1 = p1.id
-        self.p2 = p2.id
-        self.current_player = self.X
-        self.board = [
-            [0, 0, 0],
-            [0, 0, 0],
-            [0, 0, 0],
-        ]
 
-        # Our board is made up of 3 by 3 TicTacToeButtons
-        for x in range(3):
-            for y in range(3):
-                self.add_item(TicTacToeButton(x, y))
-
-    # This method checks for the board winner -- it is used by the TicTacToeButton
-    def check_board_winner(self):
-        for across in self.board:
-            value = sum(across)
-            if value == 3:
-                return self.O
-            elif value == -3:
-                return self.X
-
-        # Check vertical
-        for line in range(3):
-            value = self.board[0][line] + self.board[1][line] + self.board[2][line]
-            if value == 3:
-                return self.O
-            elif value == -3:
-                return self.X
-
-        # Check diagonals
-        diag = self.board[0][2] + self.board[1][1] + self.board[2][0]
-        if diag == 3:
-            return self.O
-        elif diag == -3:
-            return self.X
-
-        diag = self.board[0][0] + self.board[1][1] + self.board[2][2]
-        if diag == 3:
-            return self.O
-        elif diag == -3:
-            return self.X
-
-        # If we're here, we need to check if a tie was made
-        if all(i != 0 for row in self.board for i in row):
-            return self.Tie
-
-        return None
-
-
-class RPSButton(discord.ui.Button):
-    def __init__(self, label: str, emoji: str):
-        super().__init__(label=label, emoji=emoji)
+def rps_embed(p1: int, p2: int, picks: tuple[int, int]) -> discord.Embed:
+    embed = discord.Embed(title="Rock Paper Scissors", colour=Bot.colour)
+    if rps.NOT_CHOSEN in picks:
+        embed.description = f"### <@{p1}> vs <@{p2}>\nWaiting for players to choose..."
+        for player, pick in zip((p1, p2), picks):
+            if pick != rps.NOT_CHOSEN:
+                embed.description += f"\n✅ <@{player}> has chosen."
+        return embed
+
+    outcome = rps.OUTCOMES[picks[0] * 4 + picks[1]]
+    if outcome == rps.TIE:
+        embed.description = "### It's a tie!"
+        embed.add_field(name="Both players chose:", value=rps.CHOICES[picks[0]][0])
+        return embed
+
+    winner, winning, losing = (
+        (p1, picks[0], picks[1]) if outcome == rps.FIRST else (p2, picks[1], picks[0])
+    )
+    embed.description = f"### <@{winner}> is the **winner!**"
+    embed.add_field(name="Winning pick:", value=rps.CHOICES[winning][0])
+    embed.add_field(name="Losing pick:", value=rps.CHOICES[losing][0])
+    return embed
+
+
+def rps_buttons(p1: int, p2: int, picks: tuple[int, int]) -> discord.ui.View:
+    # a new nonce on every render, so a sealed pick never repeats between edits
+    nonce = secrets.token_hex(4)
+    view = discord.ui.View(timeout=None)
+    for choice in range(len(rps.CHOICES)):
+        view.add_item(RPSChoice(p1, p2, picks, choice, nonce))
+    return view
+
+
+class RPSChoice(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"rps:(?P<p1>[0-9a-z]+):(?P<p2>[0-9a-z]+):(?P<nonce>[0-9a-f]+):(?P<sealed>[0-9a-f]):(?P<choice>[0-2])",
+):
+    def __init__(
+        self, p1: int, p2: int, picks: tuple[int, int], choice: int, nonce: str
+    ):
+        sealed = ((picks[0] + rps_pad(nonce, 0)) & 3) << 2 | (
+            (picks[1] + rps_pad(nonce, 1)) & 3
+        )
+        label, emoji = rps.CHOICES[choice]
+        super().__init__(
+            discord.ui.Button(
+                label=label,
+                emoji=emoji,
+                custom_id=f"rps:{b36encode(p1)}:{b36encode(p2)}:{nonce}:{sealed:x}:{choice}",
+            )
+        )
+        self.p1 = p1
+        self.p2 = p2
+        self.picks = picks
+        self.choice = choice
+
+    @classmethod
+    async def from_custom_id(cls, i: discord.Interaction, item, match: re.Match):
+        nonce, sealed = match["nonce"], int(match["sealed"], 16)
+        picks = (
+            ((sealed >> 2) - rps_pad(nonce, 0)) & 3,
+            (sealed - rps_pad(nonce, 1)) & 3,
+        )
+        return cls(
+            int(match["p1"], 36),
+            int(match["p2"], 36),
+            picks,
+            int(match["choice"]),
+            nonce,
+        )
 
     async def callback(self, i: discord.Interaction):
-        view = self.view
-        if i.user.id not in (view.p1.id, view.p2.id):
+        if i.user.id not in (self.p1, self.p2):
             await i.response.send_message(
                 "❌ You are not part of this game.", ephemeral=True
             )
             return
 
-        if view.choices.get(i.user.id):
-            await i.response.send_message(
-                f"❌ You have already chosen {view.choices[i.user.id]}.", ephemeral=True
+        # both players usually pick at once, from the same render, so the other
+        # player's pick may only be in memory. Taking turns means the edit
+        # with both picks is always the last one to land.
+        async with board_lock(i.message.id):
+            picks = list(BOARDS.get(i.message.id, self.picks))
+            slot = 0 if i.user.id == self.p1 else 1
+            if picks[slot] != rps.NOT_CHOSEN:
+                await i.response.send_message(
+                    f"❌ You have already chosen {rps.CHOICES[picks[slot]][0]}.",
+                    ephemeral=True,
+                )
+                return
+
+            picks[slot] = self.choice
+            picks = tuple(picks)
+            finished = rps.NOT_CHOSEN not in picks
+            await i.response.edit_message(
+                embed=rps_embed(self.p1, self.p2, picks),
+                view=None if finished else rps_buttons(self.p1, self.p2, picks),
             )
+            BOARDS[i.message.id] = picks
+
+
+GRID_STONES = ("⬛", "🔴", "🟡")
+KEYCAPS = ("1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣")
+ROW_LABELS = "ABCDEFGHI"
+
+
+def grid_content(
+    game: GridGame, p1: int, p2: int, a: int, b: int, result: int | None
+) -> str:
+    """Draws a grid game's board and status as message content."""
+
+    lines = [f"<@{p1}> {GRID_STONES[1]} vs. <@{p2}> {GRID_STONES[2]}"]
+    # Gomoku cells are picked by row, so label the rows too
+    prefix = "⬛" if game is GOMOKU else ""
+    lines.append(prefix + "".join(KEYCAPS[: game.width]))
+    for row in range(game.height):
+        line = f"{chr(0x1F1E6 + row)}" if game is GOMOKU else ""
+        for column in range(game.width):
+            cell = game.index(row, column)
+            line += GRID_STONES[(a >> cell & 1) + (b >> cell & 1) * 2]
+        lines.append(line)
+
+    if result is None:
+        turn = p1 if game.first_to_move(a, b) else p2
+        lines.append(f"It is <@{turn}>'s turn.")
+    elif result == 0:
+        lines.append("**It's a tie!**")
+    else:
+        lines.append(f"**<@{p1 if result == 1 else p2}> won!**")
+    return "\n".join(lines)
+
+
+async def grid_turn_check(
+    i: discord.Interaction, game: GridGame, p1: int, p2: int, a: int, b: int
+) -> bool:
+    """Tells the user off if it isn't their turn. Returns whether they may move."""
+
+    if i.user.id not in (p1, p2):
+        await i.response.send_message(
+            "❌ You are not part of this game!", ephemeral=True
+        )
+        return False
+    if i.user.id != (p1 if game.first_to_move(a, b) else p2):
+        await i.response.send_message("❌ It's not your turn!", ephemeral=True)
+        return False
+    return True
+
+
+def connect_four_board(p1: int, p2: int, a: int, b: int, finished: bool = False):
+    view = discord.ui.View(timeout=None)
+    for column in range(CONNECT_FOUR.width):
+        view.add_item(ConnectFourColumn(p1, p2, a, b, column, finished))
+    return view
+
+
+class ConnectFourColumn(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"c4:(?P<p1>[0-9a-z]+):(?P<p2>[0-9a-z]+):(?P<a>[0-9a-z]+):(?P<b>[0-9a-z]+):(?P<column>[0-6])",
+):
+    def __init__(
+        self, p1: int, p2: int, a: int, b: int, column: int, finished: bool = False
+    ):
+        super().__init__(
+            discord.ui.Button(
+                label=str(column + 1),
+                # Discord allows 5 buttons per row
+                row=column // 5,
+                disabled=finished or CONNECT_FOUR.drop(a | b, column) is None,
+                custom_id=f"c4:{b36encode(p1)}:{b36encode(p2)}:{b36encode(a)}:{b36encode(b)}:{column}",
+            )
+        )
+        self.p1 = p1
+        self.p2 = p2
+        self.a = a
+        self.b = b
+        self.column = column
+
+    @classmethod
+    async def from_custom_id(cls, i: discord.Interaction, item, match: re.Match):
+        return cls(
+            int(match["p1"], 36),
+            int(match["p2"], 36),
+            int(match["a"], 36),
+            int(match["b"], 36),
+            int(match["column"]),
+        )
+
+    async def callback(self, i: discord.Interaction):
+        if not await grid_turn_check(i, CONNECT_FOUR, self.p1, self.p2, self.a, self.b):
+            return
+        cell = CONNECT_FOUR.drop(self.a | self.b, self.column)
+        if cell is None:
+            await i.response.send_message("❌ That column is full!", ephemeral=True)
             return
 
-        await i.response.defer()
-        view.choices[i.user.id] = self.label
-        if len(view.choices) == 2:
-            if view.choices[view.p1.id] == view.choices[view.p2.id]:
-                view.winner = None
-            elif (
-                view.choices[view.p1.id] == "Rock"
-                and view.choices[view.p2.id] == "Scissors"
-                or view.choices[view.p1.id] == "Paper"
-                and view.choices[view.p2.id] == "Rock"
-                or view.choices[view.p1.id] == "Scissors"
-                and view.choices[view.p2.id] == "Paper"
-            ):
-                view.winner = view.p1
-            else:
-                view.winner = view.p2
-            view.stop()
-
-
-class RockPaperScissors(discord.ui.View):
-    def __init__(self, p1: discord.User, p2: discord.User):
-        super().__init__(timeout=60)
+        a, b, result = CONNECT_FOUR.play(self.a, self.b, cell)
+        await edit_board(
+            i,
+            (self.a, self.b),
+            (a, b),
+            content=grid_content(CONNECT_FOUR, self.p1, self.p2, a, b, result),
+            view=connect_four_board(self.p1, self.p2, a, b, result is not None),
+        )
+
+
+def gomoku_board(
+    p1: int, p2: int, a: int, b: int, column: int | None = None
+) -> discord.ui.View:
+    view = discord.ui.View(timeout=None)
+    view.add_item(GomokuPicker(p1, p2, a, b, column))
+    return view
+
+
+class GomokuPicker(
+    discord.ui.DynamicItem[discord.ui.Select],
+    template=r"gmk:(?P<p1>[0-9a-z]+):(?P<p2>[0-9a-z]+):(?P<a>[0-9a-z]+):(?P<b>[0-9a-z]+)(?::(?P<column>[0-8]))?",
+):
+    """Picks a cell in two steps, a column and then a free row in it, since a
+    select menu holds at most 25 options."""
+
+    def __init__(self, p1: int, p2: int, a: int, b: int, column: int | None = None):
+        custom_id = f"gmk:{b36encode(p1)}:{b36encode(p2)}:{b36encode(a)}:{b36encode(b)}"
+        if column is None:
+            placeholder = "Pick a column"
+            options = [
+                discord.SelectOption(label=f"Column {c + 1}", value=str(c))
+                for c in GOMOKU.free_columns(a | b)
+            ]
+        else:
+            custom_id += f":{column}"
+            placeholder = f"Pick a row in column {column + 1}"
+            options = [
+                discord.SelectOption(label=f"Row {ROW_LABELS[row]}", value=str(row))
+                for row in GOMOKU.free_rows(a | b, column)
+            ]
+            options.append(
+                discord.SelectOption(label="Pick another column", value="back")
+            )
+        super().__init__(
+            discord.ui.Select(
+                placeholder=placeholder, options=options, custom_id=custom_id
+            )
+        )
         self.p1 = p1
         self.p2 = p2
-        self.choices = {}
-        self.winner = None
-        self.add_item(RPSButton(label="Rock", emoji="🪨"))
-        self.add_item(RPSButton(label="Paper", emoji="📄"))
-        self.add_item(RPSButton(label="Scissors", emoji="✂️"))
+        self.a = a
+        self.b = b
+        self.column = column
+
+    @classmethod
+    async def from_custom_id(cls, i: discord.Interaction, item, match: re.Match):
+        return cls(
+            int(match["p1"], 36),
+            int(match["p2"], 36),
+            int(match["a"], 36),
+            int(match["b"], 36),
+            int(match["column"]) if match["column"] else None,
+        )
+
+    async def callback(self, i: discord.Interaction):
+        if not await grid_turn_check(i, GOMOKU, self.p1, self.p2, self.a, self.b):
+            return
+
+        value = self.item.values[0]
+        if self.column is None or value == "back":
+            column = None if value == "back" else int(value)
+            await i.response.edit_message(
+                view=gomoku_board(self.p1, self.p2, self.a, self.b, column)
+            )
+            return
+
+        cell = GOMOKU.index(int(value), self.column)
+        if not GOMOKU.is_free(self.a | self.b, cell):
+            await i.response.send_message("❌ That cell is taken!", ephemeral=True)
+            return
+
+        a, b, result = GOMOKU.play(self.a, self.b, cell)
+        await edit_board(
+            i,
+            (self.a, self.b),
+            (a, b),
+            content=grid_content(GOMOKU, self.p1, self.p2, a, b, result),
+            view=None if result is not None else gomoku_board(self.p1, self.p2, a, b),
+        )
+
+
+def challenge_buttons(game: str, p1: int, p2: int) -> discord.ui.View:
+    expires = int(time.time()) + CHALLENGE_TIMEOUT
+    view = discord.ui.View(timeout=None)
+    view.add_item(Challenge(game, p1, p2, expires, True))
+    view.add_item(Challenge(game, p1, p2, expires, False))
+    return view
+
+
+class Challenge(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"challenge:(?P<game>ttt|rps|c4|gmk):(?P<p1>[0-9a-z]+):(?P<p2>[0-9a-z]+):(?P<expires>[0-9a-z]+):(?P<accept>[01])",
+):
+    def __init__(self, game: str, p1: int, p2: int, expires: int, accept: bool):
+        super().__init__(
+            discord.ui.Button(
+                label="Accept" if accept else "Reject",
+                style=(
+                    discord.ButtonStyle.green if accept else discord.ButtonStyle.red
+                ),
+                custom_id=f"challenge:{game}:{b36encode(p1)}:{b36encode(p2)}:{b36encode(expires)}:{accept:d}",
+            )
+        )
+        self.game = game
+        self.p1 = p1
+        self.p2 = p2
+        self.expires = expires
+        self.accept = accept
+
+    @classmethod
+    async def from_custom_id(cls, i: discord.Interaction, item, match: re.Match):
+        return cls(
+            match["game"],
+            int(match["p1"], 36),
+            int(match["p2"], 36),
+            int(match["expires"], 36),
+            match["accept"] == "1",
+        )
+
+    async def callback(self, i: discord.Interaction):
+        if i.user.id != self.p2:
+            await i.response.send_message("❌ This is not for you.", ephemeral=True)
+            return
+
+        if time.time() > self.expires:
+            await i.response.edit_message(
+                content=f"<@{self.p2}> did not respond in time.", view=None
+            )
+        elif not self.accept:
+            await i.response.edit_message(
+                content=f"The challenge was **rejected** by <@{self.p2}>.", view=None
+            )
+        elif self.game == "ttt":
+            await i.response.edit_message(
+                content=f"<@{self.p1}> as **X** vs. <@{self.p2}> as **O**",
+                view=tictactoe_board(self.p1, self.p2, 0, 0),
+            )
+        elif self.game == "c4":
+            await i.response.edit_message(
+                content=grid_content(CONNECT_FOUR, self.p1, self.p2, 0, 0, None),
+                view=connect_four_board(self.p1, self.p2, 0, 0),
+            )
+        elif self.game == "gmk":
+            await i.response.edit_message(
+                content=grid_content(GOMOKU, self.p1, self.p2, 0, 0, None),
+                view=gomoku_board(self.p1, self.p2, 0, 0),
+            )
+        else:
+            picks = (rps.NOT_CHOSEN, rps.NOT_CHOSEN)
+            await i.response.edit_message(
+                content=None,
+                embed=rps_embed(self.p1, self.p2, picks),
+                view=rps_buttons(self.p1, self.p2, picks),
+            )
+
+
+TOURNAMENT_MAX_PLAYERS = 512
+TOURNAMENT_LOBBY_TIME = 120
+TOURNAMENT_ROUND_TIME = 45
+
+
+class RPSTournament(discord.ui.View):
+    """A Rock Paper Scissors tournament hosted in a single message.
+
+    Unlike 1v1 games, a tournament's bracket doesn't fit in a custom ID, so it
+    lives in this view until the tournament ends. Picks are acknowledged with
+    ephemeral replies, and the shared message is only edited once per round.
+    """
+
+    def __init__(self, host: discord.abc.User):
+        super().__init__(timeout=None)
+        self.host = host
+        self.players: list[int] = [host.id]
+        self.bracket: rps.Bracket | None = None
+        self.started = asyncio.Event()
+        self.round_done = asyncio.Event()
+        self.rng = random.Random()
+        for choice, (label, emoji) in enumerate(rps.CHOICES):
+            button = discord.ui.Button(label=label, emoji=emoji, disabled=True)
+            button.callback = self.make_pick_callback(choice)
+            self.add_item(button)
+
+    def lobby_embed(self) -> discord.Embed:
+        return discord.Embed(
+            title="Rock Paper Scissors Tournament",
+            colour=Bot.colour,
+            description=f"{self.host.mention} is hosting a tournament! Press **Join** to enter.\n"
+            f"**Players**: {len(self.players)}/{TOURNAMENT_MAX_PLAYERS}\n"
+            f"The host can start it at any time; it starts by itself in {TOURNAMENT_LOBBY_TIME // 60} minutes.",
+        )
+
+    def round_embed(
+        self, number: int, deadline: float, previous: list[str]
+    ) -> discord.Embed:
+        embed = discord.Embed(
+            title=f"Rock Paper Scissors Tournament - Round {number}",
+            colour=Bot.colour,
+            description=f"**{self.bracket.remaining()} players left**, {self.bracket.pending} matches.\n"
+            f"Pick with the buttons below <t:{deadline:.0f}:R>. "
+            "You'll be told who you're playing when you pick. Players who don't pick forfeit.",
+        )
+        if previous:
+            embed.add_field(
+                name=f"Round {number - 1} results", value=self.summary(previous)
+            )
+        return embed
+
+    @staticmethod
+    def summary(lines: list[str]) -> str:
+        text = ""
+        for index, line in enumerate(lines):
+            if len(text) + len(line) > 950:
+                return text + f"...and {len(lines) - index} more"
+            text += line + "\n"
+        return text
+
+    def round_results(self) -> list[str]:
+        lines = []
+        for winner, loser, winning, losing in self.bracket.results:
+            line = f"<@{self.bracket.ids[winner]}> beat <@{self.bracket.ids[loser]}>"
+            if winning != rps.NOT_CHOSEN and losing != rps.NOT_CHOSEN:
+                line += f" ({rps.CHOICES[winning][0]} vs {rps.CHOICES[losing][0]})"
+            lines.append(line)
+        return lines
+
+    @discord.ui.button(label="Join", style=discord.ButtonStyle.green, row=1)
+    async def join(self, i: discord.Interaction, _: discord.ui.Button):
+        if i.user.id in self.players:
+            await i.response.send_message("❌ You have already joined.", ephemeral=True)
+        elif len(self.players) >= TOURNAMENT_MAX_PLAYERS:
+            await i.response.send_message("❌ The tournament is full.", ephemeral=True)
+        else:
+            self.players.append(i.user.id)
+            await i.response.send_message(
+                "✅ You joined the tournament!", ephemeral=True
+            )
+
+    @discord.ui.button(label="Start", style=discord.ButtonStyle.blurple, row=1)
+    async def start(self, i: discord.Interaction, _: discord.ui.Button):
+        if i.user.id != self.host.id:
+            await i.response.send_message(
+                "❌ Only the host can start the tournament.", ephemeral=True
+            )
+        elif len(self.players) < 2:
+            await i.response.send_message(
+                "❌ At least 2 players are needed.", ephemeral=True
+            )
+        else:
+            await i.response.defer()
+            self.started.set()
+
+    def make_pick_callback(self, choice: int):
+        async def callback(i: discord.Interaction):
+            await self.pick(i, choice)
+
+        return callback
+
+    async def pick(self, i: discord.Interaction, choice: int):
+        bracket = self.bracket
+        slot = bracket.slots.get(i.user.id) if bracket else None
+        if slot is None:
+            await i.response.send_message(
+                "❌ You are not part of this tournament.", ephemeral=True
+            )
+            return
+        if not bracket.alive[slot]:
+            await i.response.send_message(
+                "❌ You have been knocked out of the tournament.", ephemeral=True
+            )
+            return
+        opponent = bracket.opponent[slot]
+        if opponent == rps.NO_OPPONENT:
+            await i.response.send_message(
+                "You don't have a match left this round. Wait for the next round!",
+                ephemeral=True,
+            )
+            return
+        if bracket.picks[slot] != rps.NOT_CHOSEN:
+            await i.response.send_message(
+                f"❌ You have already chosen {rps.CHOICES[bracket.picks[slot]][0]}.",
+                ephemeral=True,
+            )
+            return
+
+        mention = f"<@{bracket.ids[opponent]}>"
+        opponent_pick = bracket.picks[opponent]
+        outcome = bracket.pick(slot, choice)
+        if outcome is None:
+            msg = f"You chose **{rps.CHOICES[choice][0]}** against {mention}. Waiting for them to choose..."
+        elif outcome == rps.TIE:
+            msg = f"It's a tie, you both chose **{rps.CHOICES[choice][0]}**! Choose again."
+        elif outcome == rps.FIRST:
+            msg = f"🎉 You beat {mention} (**{rps.CHOICES[choice][0]}** vs {rps.CHOICES[opponent_pick][0]})!"
+        else:
+            msg = f"You lost to {mention} (**{rps.CHOICES[choice][0]}** vs {rps.CHOICES[opponent_pick][0]}). Better luck next time!"
+        await i.response.send_message(msg, ephemeral=True)
+
+        if bracket.pending == 0:
+            self.round_done.set()
+
+    async def run(self, message: discord.Message | discord.PartialMessage):
+        """Runs the lobby and every round, editing the tournament message once per round."""
+
+        try:
+            await asyncio.wait_for(self.started.wait(), TOURNAMENT_LOBBY_TIME)
+        except asyncio.TimeoutError:
+            pass
+        if len(self.players) < 2:
+            await message.edit(
+                content="Not enough players joined the tournament.",
+                embed=None,
+                view=None,
+            )
+            return
+
+        self.remove_item(self.join)
+        self.remove_item(self.start)
+        for item in self.children:
+            item.disabled = False
+        self.bracket = rps.Bracket(self.players)
+
+        number, previous = 0, []
+        while self.bracket.remaining() > 1:
+            number += 1
+            self.bracket.start_round(self.rng)
+            self.round_done.clear()
+            deadline = time.time() + TOURNAMENT_ROUND_TIME
+            await message.edit(
+                embed=self.round_embed(number, deadline, previous), view=self
+            )
+            try:
+                await asyncio.wait_for(self.round_done.wait(), TOURNAMENT_ROUND_TIME)
+            except asyncio.TimeoutError:
+                self.bracket.finish_round(self.rng)
+            previous = self.round_results()
+
+        self.stop()
+        embed = discord.Embed(
+            title="Rock Paper Scissors Tournament",
+            colour=Bot.colour,
+            description=f"### 🏆 <@{self.bracket.winner()}> won the tournament!\n"
+            f"{len(self.players)} players, {number} rounds.",
+        )
+        embed.add_field(name=f"Round {number} results", value=self.summary(previous))
+        await message.edit(embed=embed, view=None)
+
+    async def update_lobby(self, message: discord.Message | discord.PartialMessage):
+        """Refreshes the player count in the lobby every few seconds, not on every join."""
+        while not self.started.is_set():
+            count = len(self.players)
+            await asyncio.sleep(5)
+            if len(self.players) != count and not self.started.is_set():
+                await message.edit(embed=self.lobby_embed())
+
+
+# /meme remembers up to this many posts per channel and generation
+MEME_MEMORY = 500
+MEME_BATCH = 50
+
+
+GAME_ITEMS = (TicTacToeCell, RPSChoice, ConnectFourColumn, GomokuPicker, Challenge)
 
 
 # Cog containing the actual commands
 class Fun(commands.Cog):
     def __init__(self, bot):
         self.bot: Bot = bot
+        # running RPS tournaments by channel ID
+        self.tournaments: dict[int, RPSTournament] = {}
+        self.rng = np.random.default_rng()
+        # rendered quote PNGs by (avatar key, text, name)
+        self.quotes = LRUCache(128)
+        # memes fetched in batches, and what each channel has been shown lately
+        self.meme_buffer: deque[dict] = deque(maxlen=5 * MEME_BATCH)
+        self.seen_memes: dict[int, RotatingBloomFilter] = {}
         self.bot.tree.add_command(
             app_commands.ContextMenu(name="Quote", callback=self.quote_ctx)
         )
@@ -189,53 +750,72 @@ class Fun(commands.Cog):
             app_commands.ContextMenu(name="Woosh", callback=self.woosh_ctx),
         )
 
-    @staticmethod
-    async def get_reddit_post(session: ClientSession) -> dict:
-        nsfw = True
-        while nsfw:
-            async with session.get("https://meme-api.com/gimme") as r:
-                json = await r.json()
-                if "message" in json:
-                    return json
-                nsfw = json["nsfw"]
-        return json
+    async def cog_load(self):
+        self.bot.add_dynamic_items(*GAME_ITEMS)
+        self.rotate_seen_memes.start()
+
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(*GAME_ITEMS)
+        self.rotate_seen_memes.cancel()
+
+    @tasks.loop(hours=2)
+    async def rotate_seen_memes(self):
+        # posts are forgotten 4-6 hours after they were shown, and channels
+        # that haven't used /meme in that time are dropped entirely
+        for channel_id, seen in list(self.seen_memes.items()):
+            seen.rotate()
+            if seen.is_empty():
+                del self.seen_memes[channel_id]
+
+    async def fetch_memes(self) -> None:
+        async with self.bot.session.get(
+            f"https://meme-api.com/gimme/{MEME_BATCH}"
+        ) as r:
+            json = await r.json()
+        if "message" in json:
+            raise ValueError(json["message"])
+        self.meme_buffer.extend(post for post in json["memes"] if not post["nsfw"])
+
+    async def get_meme(self, channel_id: int) -> dict:
+        """Takes a meme from the buffer that this channel hasn't seen recently."""
+
+        seen = self.seen_memes.get(channel_id)
+        if seen is None:
+            seen = self.seen_memes[channel_id] = RotatingBloomFilter(MEME_MEMORY, 0.01)
+
+        for _ in range(3):
+            for post in self.meme_buffer:
+                if post["postLink"] not in seen:
+                    self.meme_buffer.remove(post)
+                    seen.add(post["postLink"])
+                    return post
+            await self.fetch_memes()
+
+        # a repeat is better than no meme at all
+        if not self.meme_buffer:
+            raise ValueError("Couldn't retrieve data. Try again later.")
+        return self.meme_buffer.popleft()
 
     # tic tac toe
     @app_commands.command(name="tictactoe", description="Play Tic Tac Toe")
-    @app_commands.describe(user="The user to play with")
+    @app_commands.describe(user="The user to play with (pick 1Bot to play solo)")
     @app_commands.checks.cooldown(2, 30, key=lambda i: i.user)
     async def tictactoe(self, i: discord.Interaction, user: discord.User):
         if i.user.id == user.id:
             raise ValueError("You can't play with yourself!")
+        if user.id == self.bot.user.id:
+            await i.response.send_message(
+                content=f"{i.user.mention} as **X** vs. 1Bot as **O**",
+                view=tictactoe_board(i.user.id, user.id, 0, 0),
+            )
+            return
         if user.bot:
             raise ValueError("You can't play with a bot!")
 
-        view = Confirm(user)
         await i.response.send_message(
-            content=f"{user.mention}, you have been challenged to **Tic Tac Toe** by {i.user.mention}! Respond within 60 seconds.",
-            view=view,
-        )
-        await view.wait()
-        if view.accepted is False:
-            await i.edit_original_response(
-                content=f"The challenge was **rejected** by {user.mention}.", view=None
-            )
-            return
-        elif view.accepted is None:
-            await i.edit_original_response(
-                content=f"{user.mention} did not respond in time.", view=None
-            )
-            return
-
-        view = TicTacToe(i.user, user)
-        await i.edit_original_response(
-            content=f"{i.user.mention} as **X** vs. {user.mention} as **O**", view=view
+            content=f"{user.mention}, you have been challenged to **Tic Tac Toe** by {i.user.mention}! Respond within 5 minutes.",
+            view=challenge_buttons("ttt", i.user.id, user.id),
         )
-        timed_out = await view.wait()
-        if timed_out:
-            await i.edit_original_response(
-                content=":information_source: The game timed out.", view=None
-            )
 
     # rock paper scissors
     @app_commands.command(
@@ -250,59 +830,80 @@ class Fun(commands.Cog):
         elif user.bot:
             raise ValueError("You can't play with a bot!")
 
-        view = Confirm(user)
         await i.response.send_message(
-            f"{user.mention}, you have been challenged to **Rock Paper Scissors** by {i.user.mention}! Respond within 60 seconds.",
-            view=view,
+            f"{user.mention}, you have been challenged to **Rock Paper Scissors** by {i.user.mention}! Respond within 5 minutes.",
+            view=challenge_buttons("rps", i.user.id, user.id),
         )
-        await view.wait()
-        if view.accepted is False:
-            await i.edit_original_response(
-                content=f"The challenge was **rejected** by {user.mention}.",
-                view=None,
-            )
-            return
-        elif view.accepted is None:
-            await i.edit_original_response(
-                content=f"{user.mention} did not respond in time.",
-                view=None,
-            )
-            return
 
-        view = RockPaperScissors(i.user, user)
-        embed = discord.Embed(
-            title="Rock Paper Scissors",
-            description=f"### {i.user.mention} vs {user.mention}\nWaiting for players to choose...",
-            colour=self.bot.colour,
+    # connect four
+    @app_commands.command(name="connectfour", description="Play Connect Four")
+    @app_commands.describe(user="The user to play with")
+    @app_commands.checks.cooldown(2, 30, key=lambda i: i.user)
+    async def connectfour(self, i: discord.Interaction, user: discord.User):
+        if i.user.id == user.id:
+            raise ValueError("You can't play with yourself!")
+        if user.bot:
+            raise ValueError("You can't play with a bot!")
+
+        await i.response.send_message(
+            content=f"{user.mention}, you have been challenged to **Connect Four** by {i.user.mention}! Respond within 5 minutes.",
+            view=challenge_buttons("c4", i.user.id, user.id),
         )
-        await i.edit_original_response(content=None, embed=embed, view=view)
-        timed_out = await view.wait()
-        if timed_out:
-            await i.edit_original_response(
-                content=":information_source: The game timed out.",
-                view=None,
-                embed=None,
-            )
-            return
-        if view.winner is not None:
-            winning_choice = (
-                view.choices[i.user.id]
-                if view.winner == view.p1
-                else view.choices[user.id]
-            )
-            losing_choice = (
-                view.choices[user.id]
-                if view.winner == view.p1
-                else view.choices[i.user.id]
-            )
-            embed.description = f"### {view.winner.mention} is the **winner!**"
-            embed.add_field(name="Winning pick:", value=winning_choice)
-            embed.add_field(name="Losing pick:", value=losing_choice)
-            await i.edit_original_response(embed=embed, view=None)
-        else:
-            embed.description = "### It's a tie!"
-            embed.add_field(name="Both players chose:", value=view.choices[i.user.id])
-            await i.edit_original_response(embed=embed, view=None)
+
+    # gomoku
+    @app_commands.command(
+        name="gomoku", description="Play Gomoku (five in a row on a 9x9 board)"
+    )
+    @app_commands.describe(user="The user to play with")
+    @app_commands.checks.cooldown(2, 30, key=lambda i: i.user)
+    async def gomoku(self, i: discord.Interaction, user: discord.User):
+        if i.user.id == user.id:
+            raise ValueError("You can't play with yourself!")
+        if user.bot:
+            raise ValueError("You can't play with a bot!")
+
+        await i.response.send_message(
+            content=f"{user.mention}, you have been challenged to **Gomoku** by {i.user.mention}! Respond within 5 minutes.",
+            view=challenge_buttons("gmk", i.user.id, user.id),
+        )
+
+    # group for /rps, only usable in servers: a subcommand's own contexts are
+    # ignored, the group's apply to all of them
+    rps_group = app_commands.Group(
+        name="rps",
+        description="More ways to play Rock Paper Scissors",
+        allowed_contexts=app_commands.AppCommandContext(
+            guild=True, dm_channel=False, private_channel=False
+        ),
+    )
+
+    # rps tournament
+    @rps_group.command(
+        name="tournament", description="Host a Rock Paper Scissors tournament"
+    )
+    @app_commands.checks.cooldown(1, 60, key=lambda i: i.channel)
+    async def rps_tournament(self, i: discord.Interaction):
+        if i.channel_id in self.tournaments:
+            raise ValueError("There is already a tournament in this channel.")
+
+        view = RPSTournament(i.user)
+        await i.response.send_message(embed=view.lobby_embed(), view=view)
+        original = await i.original_response()
+        # an InteractionMessage edits through the interaction token, which expires
+        # after 15 minutes, and rounds can outlast it. The bot token doesn't, but
+        # it only works where the bot is in the server, not for a user install.
+        message = (
+            i.channel.get_partial_message(original.id)
+            if i.is_guild_integration()
+            else original
+        )
+        self.tournaments[i.channel_id] = view
+        lobby = asyncio.create_task(view.update_lobby(message))
+        try:
+            await view.run(message)
+        finally:
+            lobby.cancel()
+            del self.tournaments[i.channel_id]
 
     # quote (ctxmenu)
     @app_commands.checks.cooldown(2, 20, key=lambda i: i.channel)
@@ -331,20 +932,33 @@ class Fun(commands.Cog):
             raise ValueError("The text must have no more than 100 characters.")
 
         await i.response.defer()
-        url = (
-            "https://api.popcat.xyz/quote?image="
-            f"{quote_plus(user.display_avatar.url)}"
-            f"&text={quote_plus(quote)}"
-            f"&name={quote_plus(user.display_name)}"
+        key = (user.display_avatar.key, quote, user.display_name)
+        png = self.quotes.get(key)
+        if png is None:
+            avatar = await images.read_avatar(user.display_avatar)
+            png = await self.bot.loop.run_in_executor(
+                self.bot.process_pool,
+                images.render_quote,
+                avatar,
+                quote,
+                user.display_name,
+            )
+            self.quotes[key] = png
+        # read_avatar cached the image, so a cold colour costs one pool call,
+        # shared with any other lookup of the same avatar
+        colour = await images.avatar_colour(
+            user.display_avatar, self.bot.process_pool, self.bot.colour
         )
 
         embed = discord.Embed(
-            colour=self.bot.colour,
+            colour=colour,
             title=f"a beautiful quote from {user.display_name}",
         )
-        embed.set_image(url=url)
+        embed.set_image(url="attachment://quote.png")
 
-        await i.followup.send(embed=embed)
+        await i.followup.send(
+            embed=embed, file=discord.File(io.BytesIO(png), "quote.png")
+        )
 
     # pickupline
     @app_commands.command(name="pickupline", description="Get a pickup line")
@@ -413,36 +1027,81 @@ class Fun(commands.Cog):
     @app_commands.command(name="dice", description="Roll dice")
     @app_commands.checks.cooldown(3, 15, key=lambda i: i.channel)
     @app_commands.describe(
-        number="The number of dice to roll",
+        dice="Dice to roll, like 2d6, 8d20+5, 4d6kh3 (keep highest 3) or 3d6! (exploding)",
+        stats="Show the distribution of the total instead of rolling",
     )
-    async def dice(self, i: discord.Interaction, number: int = 1):
-        if not 1 <= number <= 6:
-            raise ValueError("The number of dice must be between 1 and 6.")
-        rolls = random.sample(range(1, 7), number)
-        await i.response.send_message(
-            f"🎲 Rolled {number} dice: {', '.join([str(r) for r in rolls])}"
+    async def dice(
+        self, i: discord.Interaction, dice: str = "1d6", stats: bool = False
+    ):
+        expression = dice_engine.parse(dice)
+
+        if not stats:
+            total, breakdown = dice_engine.roll(expression, self.rng)
+            msg = f"🎲 **{expression.text}** = **{total:,}**"
+            details = "\n".join(breakdown)
+            if len(msg) + len(details) < 1990:
+                msg += f"\n{details}"
+            await i.response.send_message(msg)
+            return
+
+        await i.response.defer()
+        result = await self.bot.loop.run_in_executor(
+            self.bot.process_pool, dice_engine.stats, expression
+        )
+        embed = discord.Embed(
+            colour=self.bot.colour,
+            title=f"🎲 Stats for {expression.text}",
+            description=(
+                f"**Average**: {result.mean:,.2f} (σ {result.std:,.2f})\n"
+                f"**Range**: {result.minimum:,} to {result.maximum:,}\n"
+                "**5/25/50/75/95th percentiles**: "
+                + " / ".join(f"{p:,}" for p in result.percentiles)
+            ),
+        )
+        peak = max(weight for _, _, weight in result.histogram)
+        embed.add_field(
+            name="Distribution",
+            value="```\n"
+            + "\n".join(
+                f"{f'{low:,}' if low == high else f'{low:,}-{high:,}':>15} "
+                f"{'█' * round(20 * weight / peak):<20} {weight:6.1%}"
+                for low, high, weight in result.histogram
+            )
+            + "\n```",
         )
+        embed.set_footer(
+            text=(
+                "Exact probabilities"
+                if result.exact
+                else "Estimated from simulated rolls"
+            )
+        )
+        await i.followup.send(embed=embed)
 
     # mock (ctxmenu)
     @app_commands.checks.cooldown(2, 10, key=lambda i: i.channel)
     async def mock_ctx(self, i: discord.Interaction, message: discord.Message):
         if not message.content:
             raise ValueError("The message has no text.")
-        await self.mock.callback(self, i, message.content)
+        await self.text.callback(self, i, "mock", message.content)
 
-    # mock
-    @app_commands.command(name="mock", description="Mock text")
+    # text
+    @app_commands.command(name="text", description="Apply an effect to text")
     @app_commands.checks.cooldown(2, 10, key=lambda i: i.channel)
-    @app_commands.describe(text="The text to mock")
-    async def mock(self, i: discord.Interaction, text: str):
+    @app_commands.describe(effect="The effect to apply", text="The text to change")
+    @app_commands.choices(
+        effect=[
+            app_commands.Choice(name=name, value=name) for name in text_effects.EFFECTS
+        ]
+    )
+    async def text(self, i: discord.Interaction, effect: str, text: str):
         if len(text) > 2000:
             raise ValueError("The text must be no more than 2000 characters.")
-        mock_text = "".join(
-            [char.upper() if i % 2 else char.lower() for i, char in enumerate(text)]
-        )
+        # some effects make text longer
+        changed = text_effects.EFFECTS[effect](text)[:2000]
 
         await i.response.send_message(
-            mock_text,
+            changed,
             allowed_mentions=discord.AllowedMentions(users=False, roles=False),
         )
 
@@ -583,13 +1242,12 @@ class Fun(commands.Cog):
     async def meme(self, i: discord.Interaction):
         await i.response.defer()
         try:
-            json = await self.get_reddit_post(self.bot.session)
+            json = await self.get_meme(i.channel_id)
+        except ValueError:
+            raise
         except Exception:
             raise ValueError("Couldn't retrieve data. Try again later.")
 
-        if "message" in json:
-            raise ValueError(json["message"])
-
         embed = (
             discord.Embed(
                 title=json["title"], url=json["postLink"], colour=self.bot.colour
@@ -1,3 +1,5 @@
+import asyncio
+import time
 from sys import version_info
 
 import discord
@@ -5,12 +7,31 @@ from discord import app_commands
 from discord.ext import commands
 
 from config import config
+from utils import images
+from utils.cache import LRUCache
 from views import InfoButtons
 
+_vl = discord.VerificationLevel
+VERIFICATION_LEVELS = {
+    _vl.none: "None",
+    _vl.low: "Members must have a verified email on their Discord account.",
+    _vl.medium: "Members must have a verified email and be registered on Discord for more than five minutes.",
+    _vl.high: "Members must have a verified email, be registered on Discord for more than five minutes,"
+    " and be a member of the server for more than ten minutes.",
+    _vl.highest: "Members must have a verified phone number.",
+}
+# how long an approximate member count from the API is reused
+MEMBER_COUNT_TTL = 10 * 60
+
 
 class Miscellaneous(commands.Cog):
     def __init__(self, bot):
         self.bot: commands.Bot = bot
+        # guild ID -> (expiry timestamp, approximate member count)
+        self.member_counts = LRUCache(1024)
+        # guild ID -> the request refreshing its member count, shared by every
+        # /serverinfo waiting for it
+        self.member_count_fetches: dict[int, asyncio.Task] = {}
         self.bot.tree.add_command(
             app_commands.ContextMenu(name="User Info", callback=self.userinfo_ctx)
         )
@@ -30,8 +51,12 @@ class Miscellaneous(commands.Cog):
             f"**Websocket latency**: {(self.bot.latency * 1000):.0f} ms\n"
             f"**Command count**: {len(self.bot.tree.get_commands())} (not including subcommands)\n",
         )
+        embed.description += f"**Shards**: {self.bot.shard_count}\n"
         if i.guild:
+            shard = self.bot.get_shard(i.guild.shard_id)
             embed.description += f"**Shard ID**: {i.guild.shard_id}"
+            if shard is not None and not shard.is_closed():
+                embed.description += f" ({shard.latency * 1000:.0f} ms)"
 
         embed.add_field(
             name="Software versions",
@@ -72,8 +97,11 @@ class Miscellaneous(commands.Cog):
         type: app_commands.Choice[int] = 0,
     ):
         user = user or i.user
-        embed = discord.Embed(colour=self.bot.colour, title=(f"{user.name}'s avatar"))
         asset = user.avatar if type and user.avatar else user.display_avatar
+        colour = await images.avatar_colour(
+            asset, self.bot.process_pool, self.bot.colour
+        )
+        embed = discord.Embed(colour=colour, title=(f"{user.name}'s avatar"))
         embed.set_image(url=asset.url)
         # Download links for all formats
         links = []
@@ -94,9 +122,12 @@ class Miscellaneous(commands.Cog):
         self, i: discord.Interaction, user: discord.Member | discord.User = None
     ):
         user = user or i.user
+        colour = await images.avatar_colour(
+            user.display_avatar, self.bot.process_pool, self.bot.colour
+        )
         embed = discord.Embed(
             title=user.name,
-            colour=self.bot.colour,
+            colour=colour,
             description=f"**ID**: {user.id}\n"
             f"**Bot**: {user.bot}\n"
             f"**Display name**: {user.global_name}\n",
@@ -120,7 +151,7 @@ class Miscellaneous(commands.Cog):
             if i.is_guild_integration():
                 embed.description += f"**Role count**: {len(user.roles)-1}\n"
 
-        embed.set_thumbnail(url=user.avatar.url)
+        embed.set_thumbnail(url=user.display_avatar.url)
         await i.response.send_message(embed=embed)
 
     # userinfo (ctxmenu)
@@ -129,6 +160,36 @@ class Miscellaneous(commands.Cog):
     ):
         await self.userinfo.callback(self, i, user)
 
+    async def fetch_member_count(self, guild_id: int) -> int:
+        try:
+            guild = await self.bot.fetch_guild(guild_id, with_counts=True)
+            count = guild.approximate_member_count
+            self.member_counts[guild_id] = (time.time() + MEMBER_COUNT_TTL, count)
+            return count
+        finally:
+            del self.member_count_fetches[guild_id]
+
+    async def member_count(self, guild: discord.Guild) -> int | None:
+        # with the members intent the gateway keeps the count exact
+        if self.bot.intents.members and guild.member_count is not None:
+            return guild.member_count
+
+        cached = self.member_counts.get(guild.id)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+
+        task = self.member_count_fetches.get(guild.id)
+        if task is None:
+            task = self.member_count_fetches[guild.id] = asyncio.create_task(
+                self.fetch_member_count(guild.id)
+            )
+        try:
+            # shielded, so one cancelled interaction doesn't cancel it for the rest
+            return await asyncio.shield(task)
+        except discord.HTTPException:
+            # the count from when the bot joined, or the last good one
+            return cached[1] if cached is not None else guild.member_count
+
     # server info
     @app_commands.command(
         name="serverinfo", description="Get information about the server"
@@ -137,24 +198,16 @@ class Miscellaneous(commands.Cog):
     @app_commands.allowed_contexts(guilds=True, dms=False, private_channels=False)
     @app_commands.checks.cooldown(2, 15, key=lambda i: i.channel)
     async def serverinfo(self, i: discord.Interaction):
-        vl = discord.VerificationLevel
-        vl_strings = {
-            vl.none: "None",
-            vl.low: "Members must have a verified email on their Discord account.",
-            vl.medium: "Members must have a verified email and be registered on Discord for more than five minutes.",
-            vl.high: "Members must have a verified email, be registered on Discord for more than five minutes,"
-            " and be a member of the server for more than ten minutes.",
-            vl.highest: "Members must have a verified phone number.",
-        }
-
-        guild = await self.bot.fetch_guild(i.guild.id)
+        # everything but the member count comes from the gateway's cache
+        guild = i.guild
+        member_count = await self.member_count(guild)
 
         embed = discord.Embed(
             title=guild.name,
             colour=self.bot.colour,
-            description=f"**Member count**: {guild.approximate_member_count}\n"
+            description=f"**Member count**: {member_count}\n"
             f"**Created at**: <t:{guild.created_at.timestamp():.0f}:F>\n"
-            f"**Verification**: {vl_strings[guild.verification_level]}\n"
+            f"**Verification**: {VERIFICATION_LEVELS[guild.verification_level]}\n"
             f"**Boost level**: {guild.premium_tier}\n"
             f"**Boosts**: {guild.premium_subscription_count}\n"
             f"**Roles**: {len(guild.roles)}\n"
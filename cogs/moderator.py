@@ -1,8 +1,40 @@
+import io
+import json
+import logging
+import re
+from collections.abc import Awaitable, Callable
 from datetime import UTC, datetime, timedelta
 
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
+
+from main import Bot
+from utils.journal import ModerationJournal
+from utils.scheduler import ScheduledAction, Scheduler
+from utils.workers import ProgressReporter, WorkerPool
+from views import Confirm
+
+# permissions removed by /lock and /lockdown
+LOCK_PERMISSIONS = ("send_messages", "create_public_threads", "create_private_threads")
+# most users a single /massban or /masstimeout will act on
+MASS_ACTION_LIMIT = 1000
+# the bulk ban endpoint accepts at most 200 users per request
+BULK_BAN_CHUNK = 200
+USER_ID_RE = re.compile(r"\d{15,20}")
+# saved /embed templates per server
+TEMPLATE_LIMIT = 25
+
+
+async def send_component_error(i: discord.Interaction, error: Exception) -> bool:
+    """Shows a ValueError raised in a modal or view to the user, like the tree's error handler does."""
+    if not isinstance(error, ValueError):
+        return False
+    if i.response.is_done():
+        await i.followup.send(f"❌ {error}", ephemeral=True)
+    else:
+        await i.response.send_message(f"❌ {error}", ephemeral=True)
+    return True
 
 
 class EmbedSetup(discord.ui.Modal, title="Embed Setup"):
@@ -27,6 +59,12 @@ class EmbedSetup(discord.ui.Modal, title="Embed Setup"):
         required=False,
     )
 
+    def __init__(
+        self, callback: Callable[[discord.Interaction, discord.Embed], Awaitable]
+    ):
+        super().__init__()
+        self.callback = callback
+
     async def on_submit(self, i: discord.Interaction):
         embed = discord.Embed(
             title=self.embed_title.value,
@@ -37,16 +75,67 @@ class EmbedSetup(discord.ui.Modal, title="Embed Setup"):
         if self.image.value:
             embed.set_image(url=self.image.value)
         if self.show_author.value.lower() == "y":
-            embed.set_author(name=i.user.display_name, icon_url=i.user.avatar.url)
-        await i.channel.send(embed=embed)
-        await i.response.send_message("✅ Sent the embed.", ephemeral=True)
+            embed.set_author(
+                name=i.user.display_name, icon_url=i.user.display_avatar.url
+            )
+        await self.callback(i, embed)
+
+    async def on_error(self, i: discord.Interaction, error: Exception):
+        if not await send_component_error(i, error):
+            await super().on_error(i, error)
+
+
+class BroadcastChannels(discord.ui.View):
+    def __init__(self, callback: Callable[[discord.Interaction, list], Awaitable]):
+        super().__init__(timeout=300)
+        self.callback = callback
+
+    async def on_error(
+        self, i: discord.Interaction, error: Exception, item: discord.ui.Item
+    ):
+        if not await send_component_error(i, error):
+            await super().on_error(i, error, item)
+
+    @discord.ui.select(
+        cls=discord.ui.ChannelSelect,
+        channel_types=[discord.ChannelType.text, discord.ChannelType.news],
+        placeholder="Select the channels to send the embed to",
+        max_values=25,
+    )
+    async def channels(self, i: discord.Interaction, select: discord.ui.ChannelSelect):
+        self.stop()
+        await self.callback(i, select.values)
 
 
 class Moderator(commands.Cog):
     def __init__(self, bot):
-        self.bot: commands.Bot = bot
+        self.bot: Bot = bot
+        self.journal = ModerationJournal(bot.db)
+        self.scheduler = Scheduler(bot.db, bot.wait_until_ready)
+        self.scheduler.register("unban", self.scheduled_unban)
+        self.scheduler.register("unlock", self.scheduled_unlock)
 
-    def cog_load(self):
+    async def cog_load(self):
+        await self.journal.create_schema()
+        self.flush_journal.start()
+        await self.scheduler.start()
+        await self.bot.db.executescript("""
+            CREATE TABLE IF NOT EXISTS lockdown_snapshots (
+                guild_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                role_id INTEGER NOT NULL,
+                -- allow/deny are NULL if the role had no overwrite before the lockdown
+                allow INTEGER,
+                deny INTEGER,
+                PRIMARY KEY (guild_id, channel_id)
+            );
+            CREATE TABLE IF NOT EXISTS embed_templates (
+                guild_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                embed TEXT NOT NULL,
+                PRIMARY KEY (guild_id, name)
+            );
+            """)
         for cmd in self.walk_app_commands():
             cmd.allowed_installs = app_commands.AppInstallationType(
                 guild=True, user=False
@@ -55,12 +144,257 @@ class Moderator(commands.Cog):
                 guild=True, dm_channel=False, private_channel=False
             )
 
+    async def cog_unload(self):
+        self.scheduler.stop()
+        self.flush_journal.cancel()
+        await self.journal.flush()
+
+    @tasks.loop(seconds=2)
+    async def flush_journal(self):
+        """Write buffered journal entries to the database in one batch."""
+        try:
+            await self.journal.flush()
+        except Exception:
+            # an unhandled error would stop the loop for good, and the entries
+            # stay buffered for the next attempt anyway
+            logging.exception("Failed to write the moderation journal")
+
+    @staticmethod
+    def locked_overwrite(
+        overwrite: discord.PermissionOverwrite,
+    ) -> discord.PermissionOverwrite:
+        """Returns a copy of an overwrite with the lock permissions denied."""
+        locked = discord.PermissionOverwrite.from_pair(*overwrite.pair())
+        locked.update(**dict.fromkeys(LOCK_PERMISSIONS, False))
+        return locked
+
+    @staticmethod
+    def save_overwrite(
+        channel: discord.abc.GuildChannel, role: discord.Role
+    ) -> tuple[int | None, int | None]:
+        """Returns a role's overwrite as (allow, deny) values, or Nones if it has none."""
+        if role not in channel.overwrites:
+            return None, None
+        allow, deny = channel.overwrites_for(role).pair()
+        return allow.value, deny.value
+
+    @staticmethod
+    async def restore_overwrite(
+        channel: discord.abc.GuildChannel,
+        role: discord.Role,
+        allow: int | None,
+        deny: int | None,
+        reason: str,
+    ) -> bool:
+        """Puts back an overwrite saved by save_overwrite. Returns False if it was already in place."""
+        if allow is None:
+            if role not in channel.overwrites:
+                return False
+            overwrite = None
+        else:
+            overwrite = discord.PermissionOverwrite.from_pair(
+                discord.Permissions(allow), discord.Permissions(deny)
+            )
+            if channel.overwrites_for(role) == overwrite:
+                return False
+        await channel.set_permissions(role, overwrite=overwrite, reason=reason)
+        return True
+
+    async def scheduled_unban(self, action: ScheduledAction):
+        guild = self.bot.get_guild(action.guild_id)
+        if guild is None:
+            return
+        try:
+            await guild.unban(
+                discord.Object(action.target_id), reason="Temporary ban expired"
+            )
+        except discord.NotFound:
+            # already unbanned by someone else
+            return
+        self.journal.record(
+            "unban",
+            guild.id,
+            self.bot.user.id,
+            action.target_id,
+            "Temporary ban expired",
+        )
+
+    async def scheduled_unlock(self, action: ScheduledAction):
+        guild = self.bot.get_guild(action.guild_id)
+        if guild is None:
+            return
+        channel = guild.get_channel(action.target_id)
+        role = guild.get_role(action.payload["role"])
+        if channel is None or role is None:
+            return
+
+        if not await self.restore_overwrite(
+            channel,
+            role,
+            action.payload["allow"],
+            action.payload["deny"],
+            "Timed lock expired",
+        ):
+            return
+        self.journal.record(
+            "unlock",
+            guild.id,
+            self.bot.user.id,
+            channel.id,
+            "Timed lock expired",
+            details=f"role {role.id}",
+        )
+        if not action.payload["silent"]:
+            embed = discord.Embed(
+                title="Channel Unlocked",
+                description=f"🔓 This channel was automatically unlocked for `{role.name}`.",
+                color=self.bot.colour,
+            )
+            await channel.send(embed=embed)
+
+    @staticmethod
+    def has_self_overwrite(channel: discord.abc.GuildChannel) -> bool:
+        """Whether the bot already has an overwrite letting it talk in a channel."""
+        overwrite = channel.overwrites_for(channel.guild.me)
+        return overwrite.view_channel is True and overwrite.send_messages is True
+
+    @staticmethod
+    def format_failures(failed: list[str]) -> str:
+        if len(failed) > 10:
+            failed = failed[:10] + [f"and {len(failed) - 10} more"]
+        return ", ".join(failed)
+
+    async def deliver_embed(
+        self,
+        i: discord.Interaction,
+        embed: discord.Embed,
+        channels: list[discord.abc.Messageable],
+    ):
+        """Sends one embed to many channels and reports the result per channel.
+
+        The interaction must already be responded to; the report replaces the
+        original response.
+        """
+
+        # moderators can only post where they could post themselves
+        allowed = [
+            channel
+            for channel in channels
+            if channel.permissions_for(i.user).send_messages
+            and channel.permissions_for(i.user).manage_messages
+        ]
+        failed = [
+            f"{channel.mention} (you can't post there)"
+            for channel in channels
+            if channel not in allowed
+        ]
+
+        async def send(channel):
+            await channel.send(embed=embed)
+
+        results = await WorkerPool().run(allowed, send)
+        failed += [
+            f"{r.item.mention} ({getattr(r.error, 'text', None) or r.error})"
+            for r in results
+            if not r.ok
+        ]
+        sent = sum(r.ok for r in results)
+
+        msg = f"✅ Sent the embed to {sent} channel{'s' if sent != 1 else ''}."
+        if failed:
+            msg += "\n❌ Failed: " + self.format_failures(failed)
+        await i.edit_original_response(content=msg, view=None)
+
+    async def embed_targets(
+        self,
+        i: discord.Interaction,
+        embed: discord.Embed,
+        category: discord.CategoryChannel | None,
+        broadcast: bool,
+        save_as: str | None,
+    ):
+        """Saves a built embed if requested, then sends it where it was asked to go."""
+
+        if save_as:
+            rows = await self.bot.db.execute(
+                "SELECT COUNT(*) FROM embed_templates WHERE guild_id = ? AND name != ?",
+                (i.guild.id, save_as),
+            )
+            if rows[0][0] >= TEMPLATE_LIMIT:
+                raise ValueError(
+                    f"This server already has {TEMPLATE_LIMIT} saved embed templates."
+                )
+            await self.bot.db.execute(
+                "INSERT OR REPLACE INTO embed_templates VALUES (?, ?, ?)",
+                (i.guild.id, save_as, json.dumps(embed.to_dict())),
+            )
+
+        if broadcast and category is None:
+
+            async def on_select(si: discord.Interaction, selected: list):
+                await si.response.edit_message(content="⏳ Sending...", view=None)
+                channels = [i.guild.get_channel(channel.id) for channel in selected]
+                await self.deliver_embed(si, embed, [c for c in channels if c])
+
+            await i.response.send_message(
+                "Select the channels to send the embed to.",
+                view=BroadcastChannels(on_select),
+                ephemeral=True,
+            )
+            return
+
+        await i.response.defer(ephemeral=True, thinking=True)
+        if category is not None:
+            channels = category.text_channels
+            if not channels:
+                raise ValueError(f"`{category.name}` has no text channels.")
+        else:
+            channels = [i.channel]
+        await self.deliver_embed(i, embed, channels)
+
     # embed
     @app_commands.command(name="embed", description="Create a rich embed")
     @app_commands.default_permissions(manage_messages=True)
     @app_commands.checks.bot_has_permissions(send_messages=True)
-    async def embed(self, i: discord.Interaction):
-        await i.response.send_modal(EmbedSetup())
+    @app_commands.describe(
+        broadcast="Pick several channels to send the embed to (default: False)",
+        category="Send the embed to every text channel in a category",
+        template="Send a saved embed instead of creating a new one",
+        save_as="Save the embed as a template with this name",
+    )
+    async def embed(
+        self,
+        i: discord.Interaction,
+        broadcast: bool = False,
+        category: discord.CategoryChannel = None,
+        template: str = None,
+        save_as: app_commands.Range[str, 1, 32] = None,
+    ):
+        if template is None:
+
+            async def on_submit(si: discord.Interaction, embed: discord.Embed):
+                await self.embed_targets(si, embed, category, broadcast, save_as)
+
+            await i.response.send_modal(EmbedSetup(on_submit))
+            return
+
+        rows = await self.bot.db.execute(
+            "SELECT embed FROM embed_templates WHERE guild_id = ? AND name = ?",
+            (i.guild.id, template),
+        )
+        if not rows:
+            raise ValueError(f"There is no saved embed named `{template}`.")
+        embed = discord.Embed.from_dict(json.loads(rows[0][0]))
+        await self.embed_targets(i, embed, category, broadcast, save_as)
+
+    @embed.autocomplete("template")
+    async def embed_template_autocomplete(self, i: discord.Interaction, current: str):
+        rows = await self.bot.db.execute(
+            "SELECT name FROM embed_templates WHERE guild_id = ?"
+            " AND name LIKE ? ESCAPE '\\' ORDER BY name LIMIT 25",
+            (i.guild.id, re.sub(r"([%_\\])", r"\\\1", current) + "%"),
+        )
+        return [app_commands.Choice(name=name, value=name) for (name,) in rows]
 
     # group for /purge commands
     purge_group = app_commands.Group(
@@ -89,6 +423,13 @@ class Moderator(commands.Cog):
             oldest_first=False,
             reason=f"Purged by {i.user.name}",
         )
+        self.journal.record(
+            "purge",
+            i.guild.id,
+            i.user.id,
+            i.channel.id,
+            details=f"{len(deleted)} messages (all)",
+        )
         await i.followup.send(f"✅ Found and deleted {len(deleted)} messages.")
 
     # /purge bots
@@ -111,6 +452,13 @@ class Moderator(commands.Cog):
             check=lambda m: m.author.bot,
             reason=f"Purged by {i.user.name}",
         )
+        self.journal.record(
+            "purge",
+            i.guild.id,
+            i.user.id,
+            i.channel.id,
+            details=f"{len(deleted)} messages (bots)",
+        )
         await i.followup.send(
             f" ✅ Found and deleted {len(deleted)} messages from bots."
         )
@@ -135,6 +483,13 @@ class Moderator(commands.Cog):
             check=lambda m: not m.author.bot,
             reason=f"Purged by {i.user.name}",
         )
+        self.journal.record(
+            "purge",
+            i.guild.id,
+            i.user.id,
+            i.channel.id,
+            details=f"{len(deleted)} messages (humans)",
+        )
         await i.followup.send(
             f"✅ Found and deleted {len(deleted)} messages from humans."
         )
@@ -159,6 +514,13 @@ class Moderator(commands.Cog):
             check=lambda m: m.author == user,
             reason=f"Purged by {i.user.name}",
         )
+        self.journal.record(
+            "purge",
+            i.guild.id,
+            i.user.id,
+            i.channel.id,
+            details=f"{len(deleted)} messages (from {user.id})",
+        )
         await i.followup.send(
             f"✅ Found and deleted {len(deleted)} messages from {user}."
         )
@@ -190,6 +552,14 @@ class Moderator(commands.Cog):
         await i.channel.set_permissions(
             role, overwrite=overwrite, reason=f"{i.user.name}: {reason}"
         )
+        self.journal.record(
+            "disablethreads",
+            i.guild.id,
+            i.user.id,
+            i.channel.id,
+            reason,
+            details=f"role {role.id}",
+        )
         await i.followup.send(
             f"✅ Disabled permissions for `{role.name}` to create public and private threads."
         )
@@ -226,6 +596,9 @@ class Moderator(commands.Cog):
         await i.channel.edit(
             slowmode_delay=seconds, reason=f"{i.user.name} set slowmode"
         )
+        self.journal.record(
+            "slowmode", i.guild.id, i.user.id, i.channel.id, duration=int(seconds)
+        )
         await i.followup.send(
             f"✅ Slowmode set to {amount} {'seconds' if unit == 1 else unit.name}.",
             ephemeral=True,
@@ -241,6 +614,7 @@ class Moderator(commands.Cog):
         role="The role to remove permissions from (default: @everyone)",
         reason="The reason for locking the channel (optional)",
         silent="Keep the lock message private (default: False)",
+        duration="Minutes until the channel is unlocked automatically (default: never)",
     )
     async def lock(
         self,
@@ -248,26 +622,50 @@ class Moderator(commands.Cog):
         role: discord.Role = None,
         reason: str = None,
         silent: bool = False,
+        duration: app_commands.Range[int, 0, 40320] = 0,
     ):
         role = role or i.guild.default_role
 
-        overwrite = i.channel.overwrites_for(role)
-        overwrite.send_messages = False
-        overwrite.create_public_threads = False
-        overwrite.create_private_threads = False
+        allow, deny = self.save_overwrite(i.channel, role)
+        overwrite = self.locked_overwrite(i.channel.overwrites_for(role))
 
         # reason string that appears in audit log
         log_reason = reason or f"{i.user.name}: No reason specified"
         await i.response.defer(ephemeral=True)
 
         # allow bot to send messages
-        await i.channel.set_permissions(
-            i.guild.me,
-            reason="Added self permissions for locked channel",
-            view_channel=True,
-            send_messages=True,
-        )
+        if not self.has_self_overwrite(i.channel):
+            await i.channel.set_permissions(
+                i.guild.me,
+                reason="Added self permissions for locked channel",
+                view_channel=True,
+                send_messages=True,
+            )
         await i.channel.set_permissions(role, reason=log_reason, overwrite=overwrite)
+        self.journal.record(
+            "lock",
+            i.guild.id,
+            i.user.id,
+            i.channel.id,
+            reason,
+            duration * 60 or None,
+            details=f"role {role.id}",
+        )
+        # if the role is already on a timer, keep the overwrite from before that lock
+        pending = await self.scheduler.cancel(
+            "unlock", i.guild.id, i.channel.id, role=role.id
+        )
+        if pending:
+            allow, deny = pending[0].payload["allow"], pending[0].payload["deny"]
+        if duration:
+            unlock_at = datetime.now(UTC).timestamp() + duration * 60
+            await self.scheduler.schedule(
+                "unlock",
+                unlock_at,
+                i.guild.id,
+                i.channel.id,
+                {"role": role.id, "allow": allow, "deny": deny, "silent": silent},
+            )
         embed = discord.Embed(
             title="Channel Locked",
             color=0xFF0000,
@@ -280,12 +678,145 @@ class Moderator(commands.Cog):
             embed.description = (
                 f"🔒 This channel was locked for `{role.name}` by a moderator."
             )
+        if duration:
+            embed.add_field(name="Unlocks", value=f"<t:{unlock_at:.0f}:R>")
         if not silent:
             await i.channel.send(embed=embed)
         await i.followup.send(
             f"✅ Removed permissions for `{role.name}` to send messages and create threads in this channel."
+            + (f" It will be unlocked <t:{unlock_at:.0f}:R>." if duration else "")
+        )
+
+    # lockdown
+    @app_commands.command(
+        name="lockdown", description="Make every text channel in the server read-only"
+    )
+    @app_commands.default_permissions(manage_channels=True)
+    @app_commands.checks.has_permissions(manage_channels=True)
+    @app_commands.checks.bot_has_permissions(manage_channels=True)
+    @app_commands.checks.cooldown(1, 60, key=lambda i: i.guild)
+    @app_commands.describe(
+        role="The role to remove permissions from (default: @everyone)",
+        reason="The reason for the lockdown (optional)",
+    )
+    async def lockdown(
+        self, i: discord.Interaction, role: discord.Role = None, reason: str = None
+    ):
+        role = role or i.guild.default_role
+        log_reason = reason or f"{i.user.name}: No reason specified"
+        await i.response.defer(ephemeral=True)
+
+        if await self.bot.db.execute(
+            "SELECT 1 FROM lockdown_snapshots WHERE guild_id = ? LIMIT 1",
+            (i.guild.id,),
+        ):
+            raise ValueError(
+                "This server is already locked down. Use `/unlock all:True` to end it first."
+            )
+
+        # snapshot every overwrite we are about to change, skipping channels
+        # that are already locked or that we can't edit
+        targets, snapshot, skipped = [], [], 0
+        for channel in i.guild.text_channels:
+            if not channel.permissions_for(i.guild.me).manage_roles:
+                skipped += 1
+                continue
+            current = channel.overwrites_for(role)
+            locked = self.locked_overwrite(current)
+            if locked == current:
+                skipped += 1
+                continue
+            allow, deny = self.save_overwrite(channel, role)
+            targets.append((channel, locked))
+            snapshot.append((i.guild.id, channel.id, role.id, allow, deny))
+
+        if not targets:
+            raise ValueError(f"There are no channels to lock for `{role.name}`.")
+
+        # persist the snapshot before editing, so an unlock works even if the
+        # bot restarts halfway through
+        await self.bot.db.executemany(
+            "INSERT INTO lockdown_snapshots VALUES (?, ?, ?, ?, ?)", snapshot
         )
 
+        async def lock_channel(target):
+            channel, overwrite = target
+            await channel.set_permissions(role, overwrite=overwrite, reason=log_reason)
+
+        results = await WorkerPool().run(targets, lock_channel)
+        failed = [r.item[0] for r in results if not r.ok]
+        self.journal.record(
+            "lockdown",
+            i.guild.id,
+            i.user.id,
+            reason=reason,
+            details=f"role {role.id}, {len(targets) - len(failed)} channels",
+        )
+        if failed:
+            # nothing changed in these channels, so there is nothing to restore
+            await self.bot.db.executemany(
+                "DELETE FROM lockdown_snapshots WHERE guild_id = ? AND channel_id = ?",
+                [(i.guild.id, channel.id) for channel in failed],
+            )
+
+        msg = f"✅ Locked {len(targets) - len(failed)} channels for `{role.name}`."
+        if skipped:
+            msg += f"\nSkipped {skipped} channels that were already locked or that I can't edit."
+        if failed:
+            msg += "\n❌ Failed to lock: " + self.format_failures(
+                [channel.mention for channel in failed]
+            )
+        await i.followup.send(msg)
+
+    async def end_lockdown(self, i: discord.Interaction, reason: str = None):
+        """Restores every overwrite saved by /lockdown in the guild."""
+
+        log_reason = reason or f"{i.user.name}: No reason specified"
+        rows = await self.bot.db.execute(
+            "SELECT channel_id, role_id, allow, deny FROM lockdown_snapshots WHERE guild_id = ?",
+            (i.guild.id,),
+        )
+        if not rows:
+            raise ValueError("This server is not locked down.")
+
+        targets, cleared = [], []
+        for channel_id, role_id, allow, deny in rows:
+            channel = i.guild.get_channel(channel_id)
+            role = i.guild.get_role(role_id)
+            if channel is None or role is None:
+                cleared.append(channel_id)
+                continue
+            targets.append((channel, role, allow, deny))
+
+        async def restore_channel(target):
+            return await self.restore_overwrite(*target, log_reason)
+
+        results = await WorkerPool().run(targets, restore_channel)
+        cleared += [r.item[0].id for r in results if r.ok]
+        failed = [r.item[0] for r in results if not r.ok]
+        restored = sum(r.value is True for r in results)
+        self.journal.record(
+            "unlock all",
+            i.guild.id,
+            i.user.id,
+            reason=reason,
+            details=f"{restored} channels",
+        )
+        # keep failed channels in the snapshot so the unlock can be retried
+        await self.bot.db.executemany(
+            "DELETE FROM lockdown_snapshots WHERE guild_id = ? AND channel_id = ?",
+            [(i.guild.id, channel_id) for channel_id in cleared],
+        )
+
+        msg = f"✅ Restored permissions in {restored} channels."
+        if failed:
+            msg += (
+                "\n❌ Failed to restore: "
+                + self.format_failures([channel.mention for channel in failed])
+                + "\nRun `/unlock all:True` again to retry them."
+            )
+        await i.followup.send(msg)
+
     # unlock
     @app_commands.command(
         name="unlock", description="Undo the lock command (allow users to message)"
@@ -298,14 +829,22 @@ class Moderator(commands.Cog):
         role="The role to reset permissions for (default: @everyone)",
         reason="The reason for unlocking the channel (optional)",
         silent="Keep the unlock message private (default: False)",
+        all_channels="Undo a server-wide /lockdown instead (default: False)",
     )
+    @app_commands.rename(all_channels="all")
     async def unlock(
         self,
         i: discord.Interaction,
         role: discord.Role = None,
         reason: str = None,
         silent: bool = False,
+        all_channels: bool = False,
     ):
+        if all_channels:
+            await i.response.defer(ephemeral=True)
+            await self.end_lockdown(i, reason)
+            return
+
         role = role or i.guild.default_role
 
         overwrite = i.channel.overwrites_for(role)
@@ -318,18 +857,28 @@ class Moderator(commands.Cog):
         await i.response.defer(ephemeral=True)
 
         # allow bot to send messages
-        await i.channel.set_permissions(
-            i.guild.me,
-            reason="Added self permissions to send messages",
-            view_channel=True,
-            send_messages=True,
-        )
+        if not self.has_self_overwrite(i.channel):
+            await i.channel.set_permissions(
+                i.guild.me,
+                reason="Added self permissions to send messages",
+                view_channel=True,
+                send_messages=True,
+            )
 
         await i.channel.set_permissions(
             role,
             reason=log_reason,
             overwrite=overwrite,
         )
+        await self.scheduler.cancel("unlock", i.guild.id, i.channel.id, role=role.id)
+        self.journal.record(
+            "unlock",
+            i.guild.id,
+            i.user.id,
+            i.channel.id,
+            reason,
+            details=f"role {role.id}",
+        )
         embed = discord.Embed(
             title="Channel Unlocked",
             color=self.bot.colour,
@@ -389,6 +938,14 @@ class Moderator(commands.Cog):
             timedelta(minutes=total_minutes) if total_minutes else None,
             reason=log_reason,
         )
+        self.journal.record(
+            "timeout" if total_minutes else "remove timeout",
+            i.guild.id,
+            i.user.id,
+            user.id,
+            reason,
+            total_minutes * 60 or None,
+        )
 
         embed = discord.Embed(
             title="User Timed Out",
@@ -419,6 +976,7 @@ class Moderator(commands.Cog):
         hours="The number of hours of messages to delete (default: 1 day, 0 hours)",
         reason="The reason for banning the user (optional)",
         silent="Disable publicly sending the ban message & DMing the user (default: False)",
+        duration="Hours until the user is unbanned automatically (default: permanent)",
     )
     async def ban(
         self,
@@ -428,6 +986,7 @@ class Moderator(commands.Cog):
         hours: int = 0,
         reason: str = None,
         silent: bool = False,
+        duration: app_commands.Range[int, 0, 8760] = 0,
     ):
         if user == i.user:
             raise ValueError("You cannot ban yourself.")
@@ -438,6 +997,7 @@ class Moderator(commands.Cog):
 
         # reason string that appears in audit log
         log_reason = reason or f"{i.user.name}: No reason specified"
+        unban_at = datetime.now(UTC).timestamp() + duration * 3600
 
         try:
             if not silent:
@@ -445,6 +1005,8 @@ class Moderator(commands.Cog):
                     description=f"You have been banned from {i.guild.name}.",
                     color=0xFF0000,
                 )
+                if duration:
+                    dm_embed.description += f" The ban expires <t:{unban_at:.0f}:R>."
                 if reason:
                     if len(reason) > 1024:
                         reason = reason[:1021] + "..."
@@ -459,6 +1021,18 @@ class Moderator(commands.Cog):
             reason=log_reason,
             delete_message_seconds=days * 86400 + hours * 3600,
         )
+        self.journal.record(
+            "ban" if not duration else "temporary ban",
+            i.guild.id,
+            i.user.id,
+            user.id,
+            reason,
+            duration * 3600 or None,
+        )
+        # a new ban replaces any pending unban
+        await self.scheduler.cancel("unban", i.guild.id, user.id)
+        if duration:
+            await self.scheduler.schedule("unban", unban_at, i.guild.id, user.id)
 
         embed = discord.Embed(
             title="User Banned",
@@ -469,9 +1043,285 @@ class Moderator(commands.Cog):
         embed.add_field(name="Reason", value=reason, inline=False)
         if days:
             embed.add_field(name="Messages Deleted", value=f"{days} days", inline=False)
+        if duration:
+            embed.add_field(name="Expires", value=f"<t:{unban_at:.0f}:R>", inline=False)
 
         await i.response.send_message(embed=embed, ephemeral=silent)
 
+    async def resolve_mass_targets(
+        self,
+        i: discord.Interaction,
+        users: str | None,
+        file: discord.Attachment | None,
+        joined_within: int | None,
+    ) -> list[int]:
+        """Collects user IDs from a text list, a text file and/or a join-time window."""
+
+        ids = set(USER_ID_RE.findall(users or ""))
+        if file is not None:
+            if file.size > 1_000_000:
+                raise ValueError("The file must be smaller than 1 MB.")
+            ids.update(USER_ID_RE.findall((await file.read()).decode(errors="ignore")))
+        targets = {int(user_id) for user_id in ids}
+
+        if joined_within:
+            if not self.bot.intents.members:
+                raise ValueError(
+                    "Selecting members by join time needs the Server Members intent, which is disabled for this bot."
+                )
+            since = datetime.now(UTC) - timedelta(minutes=joined_within)
+            async for member in i.guild.fetch_members(limit=None):
+                if member.joined_at and member.joined_at >= since and not member.bot:
+                    targets.add(member.id)
+
+        targets -= {i.user.id, i.guild.me.id, i.guild.owner_id}
+        if not targets:
+            raise ValueError(
+                "No users to act on. Give user IDs or mentions, a text file of IDs, or a join window."
+            )
+        if len(targets) > MASS_ACTION_LIMIT:
+            raise ValueError(
+                f"You can only act on up to {MASS_ACTION_LIMIT} users at once ({len(targets)} given)."
+            )
+        return sorted(targets)
+
+    @staticmethod
+    async def confirm_mass_action(i: discord.Interaction, action: str) -> bool:
+        view = Confirm(i.user)
+        await i.edit_original_response(
+            content=f"⚠️ Are you sure you want to {action}? Respond within 60 seconds.",
+            view=view,
+        )
+        await view.wait()
+        if not view.accepted:
+            await i.edit_original_response(content="Cancelled.", view=None)
+            return False
+        return True
+
+    @staticmethod
+    async def send_mass_report(
+        i: discord.Interaction, title: str, results: dict[int, str], ok: str
+    ) -> None:
+        """Edits the progress message into a summary with a per-user report attached."""
+
+        succeeded = sum(status == ok for status in results.values())
+        report = "\n".join(
+            f"{user_id}\t{status}" for user_id, status in results.items()
+        )
+        await i.edit_original_response(
+            content=f"✅ {title}: {succeeded} succeeded, {len(results) - succeeded} failed.",
+            view=None,
+            attachments=[
+                discord.File(io.BytesIO(report.encode()), filename="report.txt")
+            ],
+        )
+
+    async def bulk_ban(
+        self,
+        guild: discord.Guild,
+        user_ids: list[int],
+        reason: str,
+        delete_message_seconds: int,
+        progress: ProgressReporter,
+    ) -> dict[int, str]:
+        results = {}
+        for start in range(0, len(user_ids), BULK_BAN_CHUNK):
+            chunk = user_ids[start : start + BULK_BAN_CHUNK]
+            try:
+                result = await guild.bulk_ban(
+                    [discord.Object(user_id) for user_id in chunk],
+                    reason=reason,
+                    delete_message_seconds=delete_message_seconds,
+                )
+            except discord.HTTPException as e:
+                # Discord rejects the whole request if none of the users could be banned
+                results.update(dict.fromkeys(chunk, f"failed: {e.text or e.status}"))
+            else:
+                results.update((user.id, "banned") for user in result.banned)
+                results.update(
+                    (user.id, "failed: not bannable or already banned")
+                    for user in result.failed
+                )
+            await progress(len(results), len(user_ids))
+        return results
+
+    # massban
+    @app_commands.command(name="massban", description="Ban many users at once")
+    @app_commands.default_permissions(ban_members=True)
+    @app_commands.checks.has_permissions(ban_members=True)
+    @app_commands.checks.bot_has_permissions(ban_members=True)
+    @app_commands.checks.cooldown(1, 30, key=lambda i: i.guild)
+    @app_commands.describe(
+        users="User IDs or mentions, separated by spaces or commas",
+        file="A text file containing user IDs",
+        joined_within="Also ban members who joined in the last N minutes",
+        days="The number of days of messages to delete (default: 1)",
+        reason="The reason for banning the users (optional)",
+    )
+    async def massban(
+        self,
+        i: discord.Interaction,
+        users: str = None,
+        file: discord.Attachment = None,
+        joined_within: app_commands.Range[int, 1, 10080] = None,
+        days: app_commands.Range[int, 0, 7] = 1,
+        reason: str = None,
+    ):
+        log_reason = reason or f"{i.user.name}: No reason specified"
+        await i.response.defer(ephemeral=True)
+        user_ids = await self.resolve_mass_targets(i, users, file, joined_within)
+        if not await self.confirm_mass_action(i, f"ban **{len(user_ids)}** users"):
+            return
+
+        progress = ProgressReporter(
+            lambda text: i.edit_original_response(content=text, view=None)
+        )
+        await progress(0, len(user_ids))
+        # the bulk endpoint also needs Manage Server; fall back to one ban per user
+        if i.app_permissions.manage_guild:
+            results = await self.bulk_ban(
+                i.guild, user_ids, log_reason, days * 86400, progress
+            )
+        else:
+
+            async def ban_user(user_id: int):
+                await i.guild.ban(
+                    discord.Object(user_id),
+                    reason=log_reason,
+                    delete_message_seconds=days * 86400,
+                )
+
+            results = {
+                r.item: "banned" if r.ok else f"failed: {r.error}"
+                for r in await WorkerPool().run(user_ids, ban_user, progress)
+            }
+
+        for user_id, status in results.items():
+            if status == "banned":
+                self.journal.record(
+                    "ban", i.guild.id, i.user.id, user_id, reason, details="massban"
+                )
+        await self.send_mass_report(i, "Mass ban finished", results, "banned")
+
+    # masstimeout
+    @app_commands.command(
+        name="masstimeout",
+        description="Time out many members at once (or remove timeouts)",
+    )
+    @app_commands.default_permissions(moderate_members=True)
+    @app_commands.checks.has_permissions(moderate_members=True)
+    @app_commands.checks.bot_has_permissions(moderate_members=True)
+    @app_commands.checks.cooldown(1, 30, key=lambda i: i.guild)
+    @app_commands.describe(
+        users="User IDs or mentions, separated by spaces or commas",
+        file="A text file containing user IDs",
+        joined_within="Also time out members who joined in the last N minutes",
+        minutes="The number of minutes to time out the members (default: 0)",
+        hours="The number of hours to time out the members (default: 0)",
+        days="The number of days to time out the members (default: 0)",
+        reason="The reason for timing out the members (optional)",
+    )
+    async def masstimeout(
+        self,
+        i: discord.Interaction,
+        users: str = None,
+        file: discord.Attachment = None,
+        joined_within: app_commands.Range[int, 1, 10080] = None,
+        minutes: int = 0,
+        hours: int = 0,
+        days: int = 0,
+        reason: str = None,
+    ):
+        total_minutes = days * 1440 + hours * 60 + minutes
+        if not 0 <= total_minutes <= 40320:
+            raise ValueError("Timeout duration must be between 0 and 28 days.")
+
+        log_reason = reason or f"{i.user.name}: No reason specified"
+        await i.response.defer(ephemeral=True)
+        user_ids = await self.resolve_mass_targets(i, users, file, joined_within)
+        action = "time out" if total_minutes else "remove the timeout of"
+        if not await self.confirm_mass_action(
+            i, f"{action} **{len(user_ids)}** members"
+        ):
+            return
+
+        until = (
+            (datetime.now(UTC) + timedelta(minutes=total_minutes)).isoformat()
+            if total_minutes
+            else None
+        )
+
+        # edit the member directly instead of fetching a Member object first,
+        # so each user costs a single request
+        async def timeout_user(user_id: int):
+            await self.bot.http.edit_member(
+                i.guild.id,
+                user_id,
+                reason=log_reason,
+                communication_disabled_until=until,
+            )
+
+        progress = ProgressReporter(
+            lambda text: i.edit_original_response(content=text, view=None)
+        )
+        await progress(0, len(user_ids))
+        results = {
+            r.item: "done" if r.ok else f"failed: {r.error}"
+            for r in await WorkerPool().run(user_ids, timeout_user, progress)
+        }
+        for user_id, status in results.items():
+            if status == "done":
+                self.journal.record(
+                    "timeout" if total_minutes else "remove timeout",
+                    i.guild.id,
+                    i.user.id,
+                    user_id,
+                    reason,
+                    total_minutes * 60 or None,
+                    details="masstimeout",
+                )
+        await self.send_mass_report(i, "Mass timeout finished", results, "done")
+
+    # modlog
+    @app_commands.command(
+        name="modlog", description="Show the moderation history of a user"
+    )
+    @app_commands.default_permissions(moderate_members=True)
+    @app_commands.checks.has_permissions(moderate_members=True)
+    @app_commands.checks.cooldown(2, 10, key=lambda i: i.channel)
+    @app_commands.describe(user="Member/User ID to look up")
+    async def modlog(self, i: discord.Interaction, user: discord.User):
+        rows = await self.journal.history(i.guild.id, user.id)
+        if not rows:
+            await i.response.send_message(
+                f"{user.mention} has no recorded moderation history.", ephemeral=True
+            )
+            return
+
+        lines = []
+        for created_at, action, actor_id, reason, duration, details in rows:
+            line = f"<t:{created_at:.0f}:d> **{action}** by <@{actor_id}>"
+            if duration:
+                line += f" for {timedelta(seconds=duration)}"
+            if details:
+                line += f" ({details})"
+            if reason:
+                line += f": {reason[:100]}"
+            lines.append(line)
+
+        embed = discord.Embed(
+            title=f"Moderation history of {user.name}",
+            colour=self.bot.colour,
+            description="",
+        )
+        for index, line in enumerate(lines):
+            if len(embed.description) + len(line) > 4000:
+                embed.description += f"...and {len(lines) - index} older entries"
+                break
+            embed.description += line + "\n"
+        embed.set_footer(text=f"{len(rows)} entries | User ID: {user.id}")
+        await i.response.send_message(embed=embed, ephemeral=True)
+
 
 async def setup(bot):
     await bot.add_cog(Moderator(bot))
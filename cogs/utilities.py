@@ -1,16 +1,240 @@
-from urllib.parse import quote_plus
+import asyncio
+import io
+import logging
+import os
+import re
+import time
+from urllib.parse import quote_plus, urlparse
 
 import aiohttp
 import discord
 from discord import app_commands
 from discord.ext import commands
 
+from config import config
 from main import Bot
+from utils import emojis, units
+from utils.cache import LRUCache
+from utils.github import GitHubClient
+from utils.lyrics import LyricsStore, Song
+from utils.package_index import PackageIndex
+from utils.tracing import span
+from utils.weather import WeatherService
+from utils.workers import ProgressReporter, WorkerPool
+
+MAX_CONVERSIONS = 25
+MAX_ARCHIVE_SIZE = 25 * 1024 * 1024
+MAX_EMOJI_LINKS = 50
+# per link, so one that hangs can't hold up the whole import
+EMOJI_FETCH_TIMEOUT = aiohttp.ClientTimeout(total=10)
+# repositories fetched per /github search, all paged through from one request
+GITHUB_RESULTS = 30
+# how long a search is answered from memory before asking GitHub again
+GITHUB_RESULTS_TTL = 600
+
+
+def lyrics_page(song: Song, page: int) -> tuple[discord.Embed, discord.ui.View]:
+    """Renders one page of a song. Only the page being shown is ever built."""
+
+    embed = discord.Embed(
+        title=song.title,
+        url=song.url,
+        colour=Bot.colour,
+        description=song.page(page),
+    )
+    if song.thumbnail:
+        embed.set_thumbnail(url=song.thumbnail)
+
+    view = discord.ui.View(timeout=None)
+    if song.pages > 1:
+        embed.set_footer(text=f"Page {page + 1}/{song.pages}")
+        # on the first and last page, the disabled button points at the
+        # current page so the two custom IDs stay different
+        first, last = page == 0, page == song.pages - 1
+        view.add_item(LyricsPage(song.id, page - (not first), "◀", disabled=first))
+        view.add_item(LyricsPage(song.id, page + (not last), "▶", disabled=last))
+    return embed, view
+
+
+class LyricsPage(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"lyrics:(?P<song>[0-9]+):(?P<page>[0-9]+)",
+):
+    """Shows a page of a song, which is looked up by the ID in the custom ID."""
+
+    def __init__(self, song_id: int, page: int, label: str, disabled: bool = False):
+        super().__init__(
+            discord.ui.Button(
+                label=label,
+                style=discord.ButtonStyle.secondary,
+                disabled=disabled,
+                custom_id=f"lyrics:{song_id}:{page}",
+            )
+        )
+        self.song_id = song_id
+        self.page = page
+
+    @classmethod
+    async def from_custom_id(cls, i: discord.Interaction, item, match: re.Match):
+        return cls(int(match["song"]), int(match["page"]), item.label)
+
+    async def callback(self, i: discord.Interaction):
+        song = await i.client.get_cog("Utilities").lyrics_store.get(self.song_id)
+        if song is None or self.page >= song.pages:
+            await i.response.send_message(
+                "❌ These lyrics are no longer available, use /lyrics again.",
+                ephemeral=True,
+            )
+            return
+        embed, view = lyrics_page(song, self.page)
+        await i.response.edit_message(embed=embed, view=view)
+
+
+def github_page(
+    query: str, repos: list[dict], index: int
+) -> tuple[discord.Embed, discord.ui.View]:
+    repo = repos[index]
+    embed = discord.Embed(
+        title=repo["full_name"],
+        url=repo["html_url"],
+        colour=Bot.colour,
+        description=repo["description"],
+    )
+    embed.set_thumbnail(url=repo["owner"]["avatar_url"])
+    embed.add_field(name="Stars", value=f"{repo['stargazers_count']:,}")
+    embed.add_field(name="Forks", value=f"{repo['forks_count']:,}")
+    embed.add_field(name="Open issues", value=f"{repo['open_issues_count']:,}")
+    if repo["language"]:
+        embed.add_field(name="Language", value=repo["language"])
+    if repo["license"]:
+        embed.add_field(name="License", value=repo["license"]["name"])
+    updated = discord.utils.parse_time(repo["pushed_at"])
+    embed.add_field(name="Last push", value=discord.utils.format_dt(updated, "R"))
+    embed.set_footer(text=f"Result {index + 1}/{len(repos)}")
+
+    view = discord.ui.View(timeout=None)
+    if len(repos) > 1:
+        first, last = index == 0, index == len(repos) - 1
+        view.add_item(GitHubResult(query, index - (not first), "◀", disabled=first))
+        view.add_item(GitHubResult(query, index + (not last), "▶", disabled=last))
+    return embed, view
+
+
+class GitHubResult(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"github:(?P<index>[0-9]+):(?P<query>.+)",
+):
+    """Shows another result of a /github search, from the cached results."""
+
+    def __init__(self, query: str, index: int, label: str, disabled: bool = False):
+        super().__init__(
+            discord.ui.Button(
+                label=label,
+                style=discord.ButtonStyle.secondary,
+                disabled=disabled,
+                custom_id=f"github:{index}:{query}",
+            )
+        )
+        self.query = query
+        self.index = index
+
+    @classmethod
+    async def from_custom_id(cls, i: discord.Interaction, item, match: re.Match):
+        return cls(match["query"], int(match["index"]), item.label)
+
+    async def callback(self, i: discord.Interaction):
+        # once the cached results expire, the search may wait for GitHub's rate
+        # limit for longer than Discord waits for a response
+        await i.response.defer()
+        # errors in dynamic items are only logged, they never reach the tree's
+        # error handler, so they are shown to the user here
+        try:
+            repos = await i.client.get_cog("Utilities").github_search(self.query)
+        except ValueError as e:
+            await i.followup.send(f"❌ {e}", ephemeral=True)
+            return
+        except Exception:
+            logging.exception(
+                f"Failed to page through GitHub results for {self.query!r}"
+            )
+            await i.followup.send(
+                "❌ Couldn't retrieve data. Try again later.", ephemeral=True
+            )
+            return
+
+        if self.index >= len(repos):
+            await i.followup.send(
+                "❌ This result is no longer available, use /github again.",
+                ephemeral=True,
+            )
+            return
+        embed, view = github_page(self.query, repos, self.index)
+        await i.edit_original_response(embed=embed, view=view)
+
+
+def pypi_embed(json: dict) -> discord.Embed:
+    embed = discord.Embed(
+        title=json["info"]["name"],
+        colour=0x0073B7,
+        url=json["info"]["package_url"],
+    )
+
+    if json["info"]["summary"] != "UNKNOWN":
+        embed.description = json["info"]["summary"]
+
+    if json["info"]["home_page"]:
+        embed.add_field(name="Homepage", value=json["info"]["home_page"])
+
+    embed.add_field(name="Version", value=json["info"]["version"])
+    embed.add_field(name="Author", value=json["info"]["author"])
+
+    if json["info"]["license"]:
+        if len(json["info"]["license"]) <= 1024:
+            embed.add_field(name="License", value=json["info"]["license"])
+        else:
+            embed.add_field(
+                name="License",
+                value=json["info"]["license"][:30] + "...",
+                inline=False,
+            )
+    return embed
 
 
 class Utilities(commands.Cog):
     def __init__(self, bot):
         self.bot: Bot = bot
+        self.lyrics_store = LyricsStore(bot.db)
+        self.weather_service = WeatherService(bot.db)
+        self.github_client = GitHubClient(config.get("github_token"))
+        # (time fetched, repositories) by search query
+        self.github_results = LRUCache(128)
+        # package names for autocomplete, if indexes have been built
+        self.package_indexes: dict[str, PackageIndex] = {}
+        for registry in ("pypi", "npm"):
+            path = os.path.join(
+                config.get("package_index_dir", "indexes"), f"{registry}.idx"
+            )
+            if os.path.exists(path):
+                self.package_indexes[registry] = PackageIndex(path, registry)
+
+    async def cog_load(self):
+        await self.lyrics_store.create_schema()
+        await self.weather_service.create_schema()
+        self.bot.add_dynamic_items(LyricsPage, GitHubResult)
+
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(LyricsPage, GitHubResult)
+        for index in self.package_indexes.values():
+            index.close()
+
+    def package_choices(self, registry: str, current: str):
+        index = self.package_indexes.get(registry)
+        if index is None:
+            return []
+        # Discord rejects the whole response if a choice is over 100
+        # characters, and npm names can be up to 214
+        names = [name for name in index.search(current, 50) if len(name) <= 100]
+        return [app_commands.Choice(name=name, value=name) for name in names[:25]]
 
     # weather
     @app_commands.command(name="weather", description="Get weather information")
@@ -20,15 +244,7 @@ class Utilities(commands.Cog):
     @app_commands.checks.cooldown(1, 20, key=lambda i: i.channel)
     async def weather(self, i: discord.Interaction, location: str):
         await i.response.defer()
-        async with self.bot.session.get(
-            f"https://api.popcat.xyz/weather?q={location}"
-        ) as r:
-            try:
-                json = await r.json()
-            except aiohttp.ContentTypeError:
-                raise ValueError("Invalid location")
-
-        data = json[0]
+        data = await self.weather_service.get(self.bot.session, location)
 
         embed = discord.Embed(
             colour=self.bot.colour, description=data["current"]["skytext"]
@@ -63,141 +279,85 @@ class Utilities(commands.Cog):
 
         await i.followup.send(embed=embed)
 
-    # group for /convert
-    convert = app_commands.Group(name="convert", description="Convert units")
-
-    # convert temperature
-    @convert.command(
-        name="temperature",
-        description="Convert temperatures between Fahrenheit and Celsius",
-    )
+    # convert
+    @app_commands.command(name="convert", description="Convert between units")
     @app_commands.describe(
-        temperature="The temperature to convert",
-        target="Convert to Fahrenheit or Celsius?",
+        value="The value to convert, or several separated by spaces or semicolons",
+        source="The unit to convert from",
+        target="The unit to convert to",
     )
-    @app_commands.choices(
-        target=[
-            app_commands.Choice(name="Celsius", value=0),
-            app_commands.Choice(name="Fahrenheit", value=1),
-        ]
-    )
-    async def convert_temp(
-        self,
-        i: discord.Interaction,
-        temperature: float,
-        target: app_commands.Choice[int],
+    @app_commands.rename(source="from", target="to")
+    async def convert(
+        self, i: discord.Interaction, value: str, source: str, target: str
     ):
-        if target.value == 0:
-            await i.response.send_message(
-                f"{temperature}°F = **{((temperature - 32) / 1.8):.2f}°C**"
+        source, target = units.find(source), units.find(target)
+        try:
+            # commas are thousands separators, so 1,000 is one value
+            values = [
+                float(v.replace(",", ""))
+                for v in re.split(r"[;\s]+", value.strip())
+                if v
+            ]
+        except ValueError:
+            raise ValueError(
+                "Values must be numbers, separated by spaces or semicolons."
             )
-        else:
-            await i.response.send_message(
-                f"{temperature}°C = **{((temperature * 9 / 5) + 32):.2f}°F**"
+        if not 1 <= len(values) <= MAX_CONVERSIONS:
+            raise ValueError(f"You can convert 1 to {MAX_CONVERSIONS} values at once.")
+
+        results = units.convert(values, source, target)
+        await i.response.send_message(
+            "\n".join(
+                f"{v:,.6g} {source.symbol} = **{r:,.6g} {target.symbol}**"
+                for v, r in zip(values, results)
             )
+        )
 
-    # convert distance
-    @convert.command(
-        name="distance",
-        description="Convert distances between Kilometres and Miles",
-    )
-    @app_commands.describe(
-        distance="The distance to convert",
-        target="Convert to Miles or Kilometres?",
-    )
-    @app_commands.choices(
-        target=[
-            app_commands.Choice(name="Miles", value=0),
-            app_commands.Choice(name="Kilometres", value=1),
+    @staticmethod
+    def unit_choices(current: str, other: str | None) -> list[app_commands.Choice]:
+        # once the other unit is picked, only suggest units it converts to
+        other = units.LOOKUP.get(other.lower()) if other else None
+        return [
+            app_commands.Choice(name=f"{unit.name} ({unit.symbol})", value=unit.symbol)
+            for unit in units.suggest(current, other and other.dimension)
         ]
-    )
-    async def convert_distance(
-        self,
-        i: discord.Interaction,
-        distance: float,
-        target: app_commands.Choice[int],
-    ):
-        if target.value == 0:
-            await i.response.send_message(
-                f"{distance} km = **{(distance / 1.609344):.3f} mi**"
-            )
-        else:
-            await i.response.send_message(
-                f"{distance} mi = **{(distance * 1.609344):.3f} km**"
-            )
 
-    # convert length
-    @convert.command(
-        name="length", description="Convert lengths between Centimetres and Inches"
-    )
-    @app_commands.describe(
-        length="The length to convert",
-        target="Convert to Centimetres or Inches?",
-    )
-    @app_commands.choices(
-        target=[
-            app_commands.Choice(name="Inches", value=0),
-            app_commands.Choice(name="Centimetres", value=1),
-        ]
-    )
-    async def convert_length(
-        self,
-        i: discord.Interaction,
-        length: float,
-        target: app_commands.Choice[int],
-    ):
-        if target.value == 0:
-            await i.response.send_message(f"{length} cm = **{(length / 2.54):.2f} in**")
-        else:
-            await i.response.send_message(f"{length} in = **{(length * 2.54):.2f} cm**")
+    @convert.autocomplete("source")
+    async def convert_source_autocomplete(self, i: discord.Interaction, current: str):
+        return self.unit_choices(current, i.namespace.to)
 
-    # convert weight
-    @convert.command(
-        name="weight", description="Convert weights between Kilograms and Pounds"
-    )
-    @app_commands.describe(
-        weight="The weight to convert",
-        target="Convert to Pounds or Kilograms?",
-    )
-    @app_commands.choices(
-        target=[
-            app_commands.Choice(name="Pounds", value=0),
-            app_commands.Choice(name="Kilograms", value=1),
-        ]
-    )
-    async def convert_weight(
-        self,
-        i: discord.Interaction,
-        weight: float,
-        target: app_commands.Choice[int],
-    ):
-        if target.value == 0:
-            await i.response.send_message(
-                f"{weight} kg = **{(weight * 2.20462):.2f} lbs**"
-            )
-        else:
-            await i.response.send_message(
-                f"{weight} lbs = **{(weight / 2.20462):.2f} kg**"
-            )
+    @convert.autocomplete("target")
+    async def convert_target_autocomplete(self, i: discord.Interaction, current: str):
+        return self.unit_choices(current, getattr(i.namespace, "from"))
+
+    async def github_search(self, query: str) -> list[dict]:
+        cached = self.github_results.get(query)
+        if cached is not None and time.time() - cached[0] < GITHUB_RESULTS_TTL:
+            return cached[1]
+        repos = await self.github_client.search_repositories(
+            self.bot.session, query, GITHUB_RESULTS
+        )
+        self.github_results[query] = (time.time(), repos)
+        return repos
 
     # github
     @app_commands.command(name="github", description="Search GitHub repositories")
     @app_commands.describe(query="The query to search for")
     @app_commands.checks.cooldown(1, 10, key=lambda i: i.channel)
-    async def github(self, i: discord.Interaction, query: str):
-        async with self.bot.session.get(
-            f"https://api.github.com/search/repositories?q={query}"
-        ) as r:
-            json = await r.json()
+    async def github(
+        self,
+        i: discord.Interaction,
+        # the query has to fit in the custom IDs of the result buttons
+        query: app_commands.Range[str, 1, 80],
+    ):
+        # a search may wait a few seconds for GitHub's rate limit to reset
+        await i.response.defer()
+        repos = await self.github_search(query)
+        if not repos:
+            raise ValueError("No matching repositories found.")
 
-        if json["total_count"] == 0:
-            await i.response.send_message(
-                "❌ No matching repositories found.", ephemeral=True
-            )
-        else:
-            await i.response.send_message(
-                f'First result for your query:\n{json["items"][0]["html_url"]}'
-            )
+        embed, view = github_page(query, repos, 0)
+        await i.followup.send(embed=embed, view=view)
 
     # pypi
     @app_commands.command(name="pypi", description="Get info for a PyPI package")
@@ -208,35 +368,17 @@ class Utilities(commands.Cog):
             if r.status == 404:
                 raise ValueError("Package does not exist. Check for spelling errors.")
 
-            json = await r.json()
-
-        embed = discord.Embed(
-            title=json["info"]["name"],
-            colour=0x0073B7,
-            url=json["info"]["package_url"],
-        )
-
-        if json["info"]["summary"] != "UNKNOWN":
-            embed.description = json["info"]["summary"]
-
-        if json["info"]["home_page"]:
-            embed.add_field(name="Homepage", value=json["info"]["home_page"])
-
-        embed.add_field(name="Version", value=json["info"]["version"])
-        embed.add_field(name="Author", value=json["info"]["author"])
-
-        if json["info"]["license"]:
-            if len(json["info"]["license"]) <= 1024:
-                embed.add_field(name="License", value=json["info"]["license"])
-            else:
-                embed.add_field(
-                    name="License",
-                    value=json["info"]["license"][:30] + "...",
-                    inline=False,
-                )
+            with span("pypi.json"):
+                json = await r.json()
 
+        with span("pypi.embed"):
+            embed = pypi_embed(json)
         await i.response.send_message(embed=embed)
 
+    @pypi.autocomplete("package")
+    async def pypi_autocomplete(self, i: discord.Interaction, current: str):
+        return self.package_choices("pypi", current)
+
     # npm
     @app_commands.command(name="npm", description="Get info for a NPM package")
     @app_commands.describe(package="The package to look for")
@@ -277,12 +419,23 @@ class Utilities(commands.Cog):
 
         await i.response.send_message(embed=embed)
 
+    @npm.autocomplete("package")
+    async def npm_autocomplete(self, i: discord.Interaction, current: str):
+        return self.package_choices("npm", current)
+
     # lyrics
     @app_commands.command(name="lyrics", description="Get lyrics for a song")
-    @app_commands.describe(query="The query to search for")
+    @app_commands.describe(query="The song's title, or a line from it")
     @app_commands.checks.cooldown(1, 10, key=lambda i: i.channel)
     async def lyrics(self, i: discord.Interaction, query: str):
         await i.response.defer()
+        # songs that were fetched before are served from the local index
+        song = await self.lyrics_store.search(query)
+        if song is not None:
+            embed, view = lyrics_page(song, 0)
+            await i.followup.send(embed=embed, view=view)
+            return
+
         async with self.bot.session.get(
             f"https://some-random-api.com/lyrics?title={quote_plus(query)}"
         ) as r:
@@ -292,30 +445,40 @@ class Utilities(commands.Cog):
             await i.followup.send("❌ " + json["error"])
             return
 
-        embed = discord.Embed(
-            title=json["title"],
-            url=json["links"]["genius"],
-            colour=self.bot.colour,
+        song = await self.lyrics_store.save(
+            json["title"],
+            json["links"]["genius"],
+            json.get("thumbnail", {}).get("genius"),
+            json["lyrics"],
         )
-        if "thumbnail" in json and "genius" in json["thumbnail"]:
-            embed.set_thumbnail(url=json["thumbnail"]["genius"])
-        if len(json["lyrics"]) > 4096:
-            embed.description = json["lyrics"][:4093] + "..."
-        else:
-            embed.description = json["lyrics"]
+        embed, view = lyrics_page(song, 0)
+        await i.followup.send(embed=embed, view=view)
+
+    @lyrics.autocomplete("query")
+    async def lyrics_autocomplete(self, i: discord.Interaction, current: str):
+        titles = await self.lyrics_store.suggest(current)
+        return [
+            app_commands.Choice(name=title[:100], value=title[:100]) for title in titles
+        ]
 
-        await i.followup.send(embed=embed)
+    # group for /emoji
+    emoji_group = app_commands.Group(
+        name="emoji",
+        description="Add emojis to the server",
+        allowed_installs=app_commands.AppInstallationType(guild=True, user=False),
+        allowed_contexts=app_commands.AppCommandContext(
+            guild=True, dm_channel=False, private_channel=False
+        ),
+        default_permissions=discord.Permissions(create_expressions=True),
+    )
 
-    # create emoji
-    @app_commands.command(name="emoji", description="Create an emoji from a link")
-    @app_commands.allowed_installs(guilds=True, users=False)
-    @app_commands.allowed_contexts(guilds=True, dms=False, private_channels=False)
-    @app_commands.default_permissions(create_expressions=True)
+    # emoji create
+    @emoji_group.command(name="create", description="Create an emoji from a link")
     @app_commands.checks.has_permissions(create_expressions=True)
     @app_commands.checks.bot_has_permissions(create_expressions=True)
     @app_commands.checks.cooldown(2, 10, key=lambda i: i.channel)
     @app_commands.describe(url="The link to the emoji", name="The name of the emoji")
-    async def emoji(self, i: discord.Interaction, url: str, name: str):
+    async def emoji_create(self, i: discord.Interaction, url: str, name: str):
         await i.response.defer(ephemeral=True)
         try:
             async with self.bot.session.get(url) as r:
@@ -357,6 +520,131 @@ class Utilities(commands.Cog):
 
         await i.followup.send(f"✅ Created emoji {emoji}")
 
+    async def fetch_emoji_image(self, url: str) -> emojis.Candidate:
+        name = emojis.emoji_name(urlparse(url).path)
+        try:
+            async with self.bot.session.get(url, timeout=EMOJI_FETCH_TIMEOUT) as r:
+                if r.status != 200:
+                    return emojis.Candidate(name, url, error=f"HTTP {r.status}")
+                # stop reading as soon as the image is too big
+                data = b""
+                while len(data) <= emojis.MAX_EMOJI_SIZE:
+                    chunk = await r.content.read(64 * 1024)
+                    if not chunk:
+                        break
+                    data += chunk
+        except TimeoutError:
+            return emojis.Candidate(name, url, error="timed out")
+        except (aiohttp.ClientError, ValueError):
+            return emojis.Candidate(name, url, error="invalid URL")
+        return emojis.validate(name, url, data)
+
+    # emoji import
+    @emoji_group.command(
+        name="import", description="Create many emojis from a ZIP file or links"
+    )
+    @app_commands.checks.has_permissions(create_expressions=True)
+    @app_commands.checks.bot_has_permissions(create_expressions=True)
+    @app_commands.checks.cooldown(1, 60, key=lambda i: i.guild)
+    @app_commands.describe(
+        archive="A ZIP file of images, named after the emojis",
+        urls="Links to images, separated by spaces",
+    )
+    async def emoji_import(
+        self,
+        i: discord.Interaction,
+        archive: discord.Attachment = None,
+        urls: str = None,
+    ):
+        if archive is None and not urls:
+            raise ValueError("Attach a ZIP file or enter some links.")
+        if archive is not None and archive.size > MAX_ARCHIVE_SIZE:
+            raise ValueError("The ZIP file must be smaller than 25 MB.")
+        links = urls.split() if urls else []
+        if len(links) > MAX_EMOJI_LINKS:
+            raise ValueError(f"You can import at most {MAX_EMOJI_LINKS} links at once.")
+        await i.response.defer(ephemeral=True)
+
+        candidates = []
+        if archive is not None:
+            candidates += await asyncio.to_thread(
+                emojis.extract_zip, await archive.read()
+            )
+        if links:
+            # downloads run concurrently, a few at a time
+            results = await WorkerPool(limit=8).run(links, self.fetch_emoji_image)
+            candidates += [
+                (
+                    r.value
+                    if r.ok
+                    else emojis.Candidate(
+                        emojis.emoji_name(urlparse(r.item).path),
+                        r.item,
+                        error=str(r.error) or type(r.error).__name__,
+                    )
+                )
+                for r in results
+            ]
+        if not candidates:
+            raise ValueError("No images were found.")
+
+        candidates = emojis.dedupe_names(
+            candidates, {emoji.name for emoji in i.guild.emojis}
+        )
+        # static and animated emojis have separate limits
+        free = {
+            animated: i.guild.emoji_limit
+            - sum(emoji.animated == animated for emoji in i.guild.emojis)
+            for animated in (False, True)
+        }
+        report: dict[str, str] = {}
+        uploads = []
+        for candidate in candidates:
+            if candidate.error:
+                report[candidate.source] = f"skipped: {candidate.error}"
+                continue
+            animated = emojis.image_type(candidate.image) == "gif"
+            if free[animated] <= 0:
+                report[candidate.source] = (
+                    "skipped: the server's emoji limit is reached"
+                )
+                continue
+            free[animated] -= 1
+            uploads.append(candidate)
+
+        async def upload(candidate: emojis.Candidate):
+            emoji = await i.guild.create_custom_emoji(
+                name=candidate.name,
+                image=candidate.image,
+                reason=f"Imported by {i.user}",
+            )
+            report[candidate.source] = f"created {emoji}"
+
+        progress = ProgressReporter(lambda text: i.edit_original_response(content=text))
+        await progress(0, len(uploads))
+        # emoji creation has a tight per-server rate limit, so upload one at a
+        # time and let the pool wait out any 429s
+        results = await WorkerPool(limit=1).run(uploads, upload, progress)
+        for result in results:
+            if not result.ok:
+                error = getattr(result.error, "text", None) or result.error
+                report[result.item.source] = f"failed: {error}"
+
+        created = sum(status.startswith("created") for status in report.values())
+        await i.edit_original_response(
+            content=f"✅ Created {created} emojis, {len(report) - created} skipped or failed.",
+            attachments=[
+                discord.File(
+                    io.BytesIO(
+                        "\n".join(
+                            f"{source}\t{status}" for source, status in report.items()
+                        ).encode()
+                    ),
+                    filename="report.txt",
+                )
+            ],
+        )
+
 
 async def setup(bot):
     await bot.add_cog(Utilities(bot))
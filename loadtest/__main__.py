@@ -0,0 +1,400 @@
+"""Load tests the bot against a fake Discord and stub upstream APIs.
+
+    python -m loadtest --rate 50 --duration 60
+
+Interactions for every slash command (and autocomplete) arrive at random, at
+the given mean rate, whether or not the bot keeps up. The report gives each
+command's latency to its initial response and to its final message, the
+overall throughput, and the bot's memory use, worker processes included.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from aiohttp import web
+
+from loadtest.fake_discord import RESPONSE_DEADLINE, FakeDiscord, Interaction
+from loadtest.interactions import InteractionFactory, Template, templates
+from loadtest.upstreams import Behaviour, Upstreams
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def behaviour(value: str, default: Behaviour) -> tuple[str, Behaviour]:
+    """Parses host=latency[,error_rate] for --upstream."""
+
+    try:
+        host, settings = value.split("=", 1)
+        latency, _, error_rate = settings.partition(",")
+        return host, default._replace(
+            latency=float(latency),
+            error_rate=float(error_rate) if error_rate else default.error_rate,
+        )
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"{value!r} is not in the form host=latency[,error_rate]"
+        ) from None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m loadtest", description=__doc__.split("\n")[0]
+    )
+    load = parser.add_argument_group("load")
+    load.add_argument(
+        "--rate", type=float, default=20, help="interactions per second (mean)"
+    )
+    load.add_argument("--duration", type=float, default=60, help="seconds")
+    load.add_argument(
+        "--warmup", type=float, default=5, help="seconds of load not measured"
+    )
+    load.add_argument(
+        "--drain",
+        type=float,
+        default=15,
+        help="seconds to wait for responses after the load stops",
+    )
+    load.add_argument(
+        "--commands", type=re.compile, help="only commands matching this regex"
+    )
+    load.add_argument("--seed", type=int, help="random seed, to repeat a run")
+
+    world = parser.add_argument_group("fake Discord")
+    world.add_argument("--guilds", type=int, default=50)
+    world.add_argument("--channels", type=int, default=5, help="per guild")
+    world.add_argument("--users", type=int, default=500)
+    world.add_argument("--shards", type=int, default=2)
+
+    upstream = parser.add_argument_group("upstream APIs")
+    upstream.add_argument(
+        "--latency", type=float, default=80, help="mean latency in ms"
+    )
+    upstream.add_argument("--jitter", type=float, default=40, help="in ms")
+    upstream.add_argument(
+        "--error-rate", type=float, default=0, help="fraction of 503 responses"
+    )
+    upstream.add_argument(
+        "--upstream",
+        action="append",
+        default=[],
+        metavar="HOST=LATENCY[,ERROR_RATE]",
+        help="override the latency and error rate of one host, repeatable",
+    )
+
+    bot = parser.add_argument_group("bot")
+    bot.add_argument("--process-workers", type=int, default=2)
+    bot.add_argument("--trace-sample-rate", type=float, default=0)
+    bot.add_argument("--debug", action="store_true", help="log the bot at DEBUG")
+
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args()
+
+
+def rss(pid: int) -> int | None:
+    """Resident memory of a process and its descendants in bytes, from /proc."""
+
+    if not os.path.exists(f"/proc/{pid}"):
+        # not Linux, or the process already exited
+        return None
+    total = 0
+    pending = [pid]
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{task}/children") as f:
+                    pending += map(int, f.read().split())
+        except FileNotFoundError:
+            # exited while being measured
+            continue
+    return total
+
+
+def percentiles(values: list[float]) -> dict[str, float | None]:
+    """p50, p95 and p99 in ms."""
+
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    if len(values) == 1:
+        values = values * 2
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49] * 1000, 1),
+        "p95": round(cuts[94] * 1000, 1),
+        "p99": round(cuts[98] * 1000, 1),
+    }
+
+
+def summarise(interactions: list[Interaction]) -> dict:
+    ok = errors = late = timeouts = 0
+    acks, dones = [], []
+    for interaction in interactions:
+        if interaction.acked_at is None or interaction.done_at is None:
+            timeouts += 1
+            continue
+        acks.append(interaction.acked_at - interaction.sent_at)
+        dones.append(interaction.done_at - interaction.sent_at)
+        if interaction.error:
+            errors += 1
+        elif acks[-1] > RESPONSE_DEADLINE:
+            # Discord would have shown "The application did not respond"
+            late += 1
+        else:
+            ok += 1
+    return {
+        "count": len(interactions),
+        "ok": ok,
+        "errors": errors,
+        "late": late,
+        "timeouts": timeouts,
+        "ack": percentiles(acks),
+        "done": percentiles(dones),
+    }
+
+
+async def start(app: web.Application) -> tuple[web.AppRunner, int]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, runner.addresses[0][1]
+
+
+async def generate(
+    discord: FakeDiscord,
+    chosen: list[Template],
+    rate: float,
+    duration: float,
+    tokens: list[str],
+) -> None:
+    """Sends interactions at random, `rate` a second on average.
+
+    The token of each one sent is added to `tokens`.
+    """
+
+    factory = InteractionFactory(discord)
+    pending = set()
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        template = random.choice(chosen)
+        payload = factory.payload(template)
+        task = asyncio.create_task(discord.dispatch_interaction(template.name, payload))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        tokens.append(payload["token"])
+        # arrivals don't wait for responses, like real users
+        await asyncio.sleep(random.expovariate(rate))
+    await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    discord = FakeDiscord(args.guilds, args.channels, args.users, args.shards)
+    default = Behaviour(args.latency, args.jitter, args.error_rate)
+    upstreams = Upstreams(
+        default, dict(behaviour(value, default) for value in args.upstream)
+    )
+    discord_runner, discord_port = await start(discord.app)
+    upstream_runner, upstream_port = await start(upstreams.app)
+
+    # the bot runs in its own process, so its memory is measured on its own
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "loadtest.bot",
+        f"--discord-port={discord_port}",
+        f"--upstream-port={upstream_port}",
+        f"--error-channel={discord.error_channel}",
+        f"--process-workers={args.process_workers}",
+        f"--trace-sample-rate={args.trace_sample_rate}",
+        *(["--debug"] if args.debug else []),
+        cwd=ROOT,
+        # the report is the only thing on stdout, so --json can be piped
+        stdout=sys.stderr,
+    )
+    try:
+        started = time.perf_counter()
+
+        async def ready():
+            await discord.all_ready.wait()
+            await discord.commands_synced.wait()
+
+        ready_task = asyncio.create_task(ready())
+        exit_task = asyncio.create_task(process.wait())
+        await asyncio.wait(
+            (ready_task, exit_task), timeout=120, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not ready_task.done():
+            ready_task.cancel()
+            raise SystemExit("The bot exited or didn't get ready within 2 minutes")
+        startup = time.perf_counter() - started
+
+        chosen = templates(discord.commands)
+        if args.commands:
+            chosen = [t for t in chosen if args.commands.search(t.name)]
+        if not chosen:
+            raise SystemExit("No commands to load test")
+
+        memory = []
+
+        async def sample_memory():
+            while True:
+                memory.append(rss(process.pid))
+                await asyncio.sleep(1)
+
+        sampler = asyncio.create_task(sample_memory())
+        idle_rss = rss(process.pid)
+
+        print(
+            f"Ready in {startup:.1f}s, {len(chosen)} commands, "
+            f"sending {args.rate:g}/s for {args.warmup + args.duration:g}s...",
+            file=sys.stderr,
+        )
+        warmup = []
+        await generate(discord, chosen, args.rate, args.warmup, warmup)
+        discord.requests.clear()
+        tokens = []
+        load_started = time.perf_counter()
+        await generate(discord, chosen, args.rate, args.duration, tokens)
+        load_time = time.perf_counter() - load_started
+
+        # wait for the last responses, up to --drain
+        deadline = time.perf_counter() + args.drain
+        while time.perf_counter() < deadline and any(
+            discord.interactions[token].done_at is None for token in tokens
+        ):
+            await asyncio.sleep(0.25)
+        sampler.cancel()
+        final_rss = rss(process.pid)
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), 15)
+            except TimeoutError:
+                process.kill()
+        await discord_runner.cleanup()
+        await upstream_runner.cleanup()
+
+    interactions = [discord.interactions[token] for token in tokens]
+    by_command: dict[str, list[Interaction]] = {}
+    for interaction in interactions:
+        by_command.setdefault(interaction.command, []).append(interaction)
+    completed = sum(i.done_at is not None for i in interactions)
+    memory = [m for m in memory if m is not None]
+
+    return {
+        "startup": round(startup, 2),
+        "duration": round(load_time, 2),
+        "rate": args.rate,
+        "overall": summarise(interactions),
+        "commands": {
+            command: summarise(group) for command, group in sorted(by_command.items())
+        },
+        "throughput": round(completed / load_time, 2),
+        "rss": {
+            "idle": idle_rss,
+            "peak": max(memory, default=None),
+            "final": final_rss,
+        },
+        "rest_calls": dict(discord.requests.most_common()),
+        "rest_calls_per_interaction": round(
+            sum(discord.requests.values()) / max(len(interactions), 1), 2
+        ),
+        "unhandled_routes": dict(discord.unhandled.most_common()),
+        "upstream_requests": dict(upstreams.requests.most_common()),
+        "upstream_errors": dict(upstreams.errors.most_common()),
+        "error_reports": dict(Counter(discord.error_reports).most_common()),
+    }
+
+
+def megabytes(value: int | None) -> str:
+    return "n/a" if value is None else f"{value / 1024 / 1024:.1f} MB"
+
+
+def milliseconds(value: float | None) -> str:
+    return "-" if value is None else f"{value:.0f}"
+
+
+def print_report(report: dict) -> None:
+    header = (
+        f"{'command':<36}{'count':>7}{'ok':>7}{'error':>7}{'late':>6}{'lost':>6}"
+        f"{'ack p50':>9}{'p95':>7}{'p99':>7}{'done p50':>10}{'p95':>7}{'p99':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    rows = list(report["commands"].items()) + [("overall", report["overall"])]
+    for command, stats in rows:
+        if command == "overall":
+            print("-" * len(header))
+        ack, done = stats["ack"], stats["done"]
+        print(
+            f"{command[:35]:<36}{stats['count']:>7}{stats['ok']:>7}"
+            f"{stats['errors']:>7}{stats['late']:>6}{stats['timeouts']:>6}"
+            f"{milliseconds(ack['p50']):>9}{milliseconds(ack['p95']):>7}"
+            f"{milliseconds(ack['p99']):>7}{milliseconds(done['p50']):>10}"
+            f"{milliseconds(done['p95']):>7}{milliseconds(done['p99']):>7}"
+        )
+
+    print()
+    print(f"Latencies in ms. Late: initial response after {RESPONSE_DEADLINE:g}s.")
+    print(
+        f"Throughput: {report['throughput']:g} interactions/s "
+        f"at {report['rate']:g}/s offered, over {report['duration']:g}s"
+    )
+    rss = report["rss"]
+    print(
+        f"RSS: {megabytes(rss['idle'])} idle, {megabytes(rss['peak'])} peak, "
+        f"{megabytes(rss['final'])} at the end"
+    )
+    print(f"Discord REST calls per interaction: {report['rest_calls_per_interaction']}")
+    if report["upstream_requests"]:
+        print(
+            "Upstream requests: "
+            + ", ".join(
+                f"{host} {count} ({report['upstream_errors'].get(host, 0)} failed)"
+                for host, count in report["upstream_requests"].items()
+            )
+        )
+    if report["error_reports"]:
+        print("Unhandled errors reported:")
+        for description, count in report["error_reports"].items():
+            print(f"  {count} x {description}")
+    if report["unhandled_routes"]:
+        # routes the fake Discord answered with {}, worth implementing
+        print(
+            "Routes not implemented by the fake Discord: "
+            + ", ".join(report["unhandled_routes"])
+        )
+
+
+def main() -> None:
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    try:
+        report = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        return
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
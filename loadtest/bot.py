@@ -0,0 +1,86 @@
+"""Runs the bot against the fake Discord and the stub upstreams.
+
+Started by `python -m loadtest` in its own process, so the memory it reports
+is the bot's alone. The config is made here rather than read from config.py,
+so a load test never uses the real token or database.
+"""
+
+import argparse
+import logging
+import sys
+import tempfile
+from pathlib import Path
+from types import ModuleType
+
+from aiohttp import ClientSession
+
+from loadtest.network import LocalConnector
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m loadtest.bot")
+    parser.add_argument("--discord-port", type=int, required=True)
+    parser.add_argument("--upstream-port", type=int, required=True)
+    parser.add_argument("--error-channel", type=int, required=True)
+    parser.add_argument("--process-workers", type=int, default=2)
+    parser.add_argument("--trace-sample-rate", type=float, default=0.0)
+    parser.add_argument("--debug", action="store_true")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    workdir = Path(tempfile.mkdtemp(prefix="1bot-loadtest-"))
+
+    # main and the cogs import config from config.py, so it goes in first
+    module = ModuleType("config")
+    module.config = {
+        "token": "loadtest.token",
+        "error_channel": args.error_channel,
+        "database": str(workdir / "1bot.db"),
+        "process_workers": args.process_workers,
+        "package_index_dir": str(workdir / "indexes"),
+        "trace_sample_rate": args.trace_sample_rate,
+        "trace_file": str(workdir / "traces.jsonl"),
+        "topgg_token": "loadtest",
+    }
+    sys.modules["config"] = module
+
+    from main import Bot
+    from utils.tracing import trace_config
+
+    def connector() -> LocalConnector:
+        return LocalConnector(args.discord_port, args.upstream_port)
+
+    class LoadTestBot(Bot):
+        async def login(self, token: str) -> None:
+            # a connector needs the event loop, which starts in run()
+            self.http.connector = connector()
+            await super().login(token)
+
+        async def before_identify_hook(self, shard_id, *, initial=False) -> None:
+            # the fake Discord has no identify rate limit to wait out
+            pass
+
+        async def setup_hook(self) -> None:
+            await super().setup_hook()
+            await self.session.close()
+            self.session = ClientSession(
+                connector=connector(),
+                trace_configs=[trace_config()] if self.tracer else None,
+            )
+            # the load generator makes its interactions from the synced commands
+            await self.tree.sync()
+
+    bot = LoadTestBot()
+    if args.trace_sample_rate:
+        print(f"Writing traces to {workdir / 'traces.jsonl'}", file=sys.stderr)
+    bot.run(
+        module.config["token"],
+        log_level=logging.DEBUG if args.debug else logging.WARNING,
+        root_logger=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
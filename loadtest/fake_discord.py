@@ -0,0 +1,537 @@
+"""A stand-in for Discord's REST API, gateway and CDN.
+
+It implements enough of each for the bot to log in, connect every shard,
+receive the guilds, sync its commands, and answer interactions, which the
+load generator injects through the gateway. Every interaction is timed from
+its INTERACTION_CREATE to its initial response and to its final message.
+"""
+
+import asyncio
+import json
+import re
+import time
+from collections import Counter
+from datetime import UTC, datetime
+
+from aiohttp import WSMsgType, web
+
+from loadtest.upstreams import png
+
+# every permission, as Discord sends it
+ALL_PERMISSIONS = str((1 << 53) - 1)
+DISCORD_EPOCH = 1420070400000
+HEARTBEAT_INTERVAL = 41250
+# a response after this long fails on real Discord
+RESPONSE_DEADLINE = 3.0
+ID_RE = re.compile(r"\d{15,}")
+# the interaction token, or anything else that long, in a webhook route
+TOKEN_RE = re.compile(r"[A-Za-z0-9_.-]{60,}")
+
+
+def now() -> str:
+    return datetime.now(UTC).isoformat()
+
+
+def json_response(data, status: int = 200) -> web.Response:
+    # discord.py only parses a body typed exactly application/json, without
+    # the charset aiohttp's json_response adds
+    return web.Response(
+        body=json.dumps(data, separators=(",", ":")).encode(),
+        status=status,
+        headers={"Content-Type": "application/json"},
+    )
+
+
+class Interaction:
+    """Timing and outcome of one injected interaction."""
+
+    __slots__ = (
+        "command",
+        "channel_id",
+        "sent_at",
+        "acked_at",
+        "done_at",
+        "deferred",
+        "error",
+    )
+
+    def __init__(self, command: str, channel_id: int):
+        self.command = command
+        self.channel_id = channel_id
+        self.sent_at = time.perf_counter()
+        self.acked_at: float | None = None
+        self.done_at: float | None = None
+        self.deferred = False
+        self.error = False
+
+
+class FakeDiscord:
+    def __init__(
+        self, guilds: int, channels: int, users: int, shards: int, port: int = 0
+    ):
+        self.shard_count = shards
+        self.port = port
+        self._next_id = 0
+        self.application_id = self.snowflake()
+        self.bot_user = self.user(self.application_id, "LoadTestBot", bot=True)
+        self.owner = self.user(self.snowflake(), "owner")
+        # half of them with an avatar, the rest with a default one
+        self.users = [
+            self.user(self.snowflake(), f"user{n}", avatar=n % 2 == 0)
+            for n in range(users)
+        ]
+        self.guilds = {}
+        for n in range(guilds):
+            guild_id = self.snowflake()
+            self.guilds[guild_id] = {
+                "id": guild_id,
+                "name": f"Guild {n}",
+                "channels": [self.snowflake() for _ in range(channels)],
+            }
+        self.channel_guilds = {
+            channel_id: guild_id
+            for guild_id, guild in self.guilds.items()
+            for channel_id in guild["channels"]
+        }
+        self.error_channel = next(iter(self.channel_guilds))
+
+        self.commands: list[dict] = []
+        self.commands_synced = asyncio.Event()
+        self.ready_shards: set[int] = set()
+        self.all_ready = asyncio.Event()
+        self.sockets: dict[int, web.WebSocketResponse] = {}
+        self.sequences: Counter[int] = Counter()
+
+        self.interactions: dict[str, Interaction] = {}
+        self.requests: Counter[str] = Counter()
+        self.unhandled: Counter[str] = Counter()
+        self.error_reports: list[str] = []
+
+        self.app = web.Application(middlewares=[self.count_requests])
+        api = "/api/v{version:\\d+}"
+        for method, path, handler in (
+            ("GET", "/users/@me", self.get_current_user),
+            ("GET", "/oauth2/applications/@me", self.get_application),
+            ("GET", "/gateway", self.get_gateway),
+            ("GET", "/gateway/bot", self.get_gateway),
+            ("PUT", "/applications/{app}/commands", self.sync_commands),
+            ("GET", "/applications/{app}/commands", self.get_commands),
+            ("POST", "/interactions/{id}/{token}/callback", self.interaction_callback),
+            ("POST", "/webhooks/{app}/{token}", self.followup),
+            ("GET", "/webhooks/{app}/{token}/messages/{message}", self.followup),
+            ("PATCH", "/webhooks/{app}/{token}/messages/{message}", self.followup),
+            ("DELETE", "/webhooks/{app}/{token}/messages/{message}", self.no_content),
+            ("GET", "/channels/{channel}", self.get_channel),
+            ("PATCH", "/channels/{channel}", self.get_channel),
+            ("PUT", "/channels/{channel}/permissions/{target}", self.no_content),
+            ("GET", "/channels/{channel}/messages", self.empty_list),
+            ("POST", "/channels/{channel}/messages", self.create_message),
+            ("POST", "/users/@me/channels", self.create_dm),
+            ("GET", "/guilds/{guild}", self.get_guild),
+            ("GET", "/guilds/{guild}/members/{user}", self.get_member),
+            ("PATCH", "/guilds/{guild}/members/{user}", self.get_member),
+            ("POST", "/guilds/{guild}/emojis", self.create_emoji),
+            ("PUT", "/guilds/{guild}/bans/{user}", self.no_content),
+            ("POST", "/guilds/{guild}/bulk-ban", self.bulk_ban),
+        ):
+            self.app.router.add_route(method, api + path, handler)
+        self.app.router.add_route("*", api + "/{path:.*}", self.fallback)
+        self.app.router.add_get("/", self.gateway)
+        # anything else is the CDN
+        self.app.router.add_get("/{path:.*}", self.cdn)
+
+    # payloads
+
+    def snowflake(self) -> int:
+        self._next_id += 1
+        return (int(time.time() * 1000) - DISCORD_EPOCH) << 22 | self._next_id
+
+    @staticmethod
+    def user(user_id: int, name: str, bot: bool = False, avatar: bool = False) -> dict:
+        return {
+            "id": str(user_id),
+            "username": name,
+            "global_name": name,
+            "discriminator": "0",
+            "avatar": f"{user_id:032x}" if avatar else None,
+            "bot": bot,
+            "public_flags": 0,
+        }
+
+    def shard_of(self, guild_id: int) -> int:
+        return (guild_id >> 22) % self.shard_count
+
+    def channel(self, channel_id: int) -> dict:
+        guild_id = self.channel_guilds.get(channel_id)
+        return {
+            "id": str(channel_id),
+            "type": 0,
+            "guild_id": str(guild_id) if guild_id else None,
+            "name": f"channel-{channel_id % 1000}",
+            "position": 0,
+            "permission_overwrites": [],
+            "nsfw": False,
+            "parent_id": None,
+            "topic": None,
+            "last_message_id": None,
+            "rate_limit_per_user": 0,
+            "flags": 0,
+        }
+
+    def member(self, user: dict, permissions: bool = False) -> dict:
+        member = {
+            "user": user,
+            "roles": [],
+            "joined_at": now(),
+            "deaf": False,
+            "mute": False,
+            "flags": 0,
+        }
+        if permissions:
+            member["permissions"] = ALL_PERMISSIONS
+        return member
+
+    def role(self, guild_id: int) -> dict:
+        return {
+            "id": str(guild_id),
+            "name": "@everyone",
+            "permissions": ALL_PERMISSIONS,
+            "position": 0,
+            "color": 0,
+            "hoist": False,
+            "managed": False,
+            "mentionable": False,
+            "flags": 0,
+        }
+
+    def guild(self, guild_id: int) -> dict:
+        guild = self.guilds[guild_id]
+        return {
+            "id": str(guild_id),
+            "name": guild["name"],
+            "icon": None,
+            "owner_id": self.owner["id"],
+            "roles": [self.role(guild_id)],
+            "emojis": [],
+            "stickers": [],
+            "features": [],
+            "channels": [self.channel(channel) for channel in guild["channels"]],
+            "members": [self.member(self.bot_user)],
+            "member_count": len(self.users) + 1,
+            "approximate_member_count": len(self.users) + 1,
+            "threads": [],
+            "presences": [],
+            "voice_states": [],
+            "stage_instances": [],
+            "guild_scheduled_events": [],
+            "large": False,
+            "unavailable": False,
+            "joined_at": now(),
+            "verification_level": 1,
+            "default_message_notifications": 0,
+            "explicit_content_filter": 0,
+            "mfa_level": 0,
+            "nsfw_level": 0,
+            "premium_tier": 0,
+            "premium_subscription_count": 0,
+            "preferred_locale": "en-US",
+            "system_channel_id": None,
+            "afk_timeout": 300,
+        }
+
+    def message(
+        self, channel_id: int, data: dict, message_id: int | None = None
+    ) -> dict:
+        return {
+            "id": str(message_id or self.snowflake()),
+            "channel_id": str(channel_id),
+            "author": self.bot_user,
+            "content": data.get("content") or "",
+            "timestamp": now(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": data.get("embeds") or [],
+            "components": data.get("components") or [],
+            "pinned": False,
+            "type": 0,
+            "flags": data.get("flags") or 0,
+            "application_id": str(self.application_id),
+            "webhook_id": str(self.application_id),
+        }
+
+    # gateway
+
+    async def send(self, shard_id: int, event: str, data: dict) -> None:
+        ws = self.sockets.get(shard_id)
+        if ws is None or ws.closed:
+            raise ConnectionError(f"Shard {shard_id} is not connected")
+        self.sequences[shard_id] += 1
+        await ws.send_str(
+            json.dumps(
+                {"op": 0, "t": event, "s": self.sequences[shard_id], "d": data},
+                separators=(",", ":"),
+            )
+        )
+
+    async def gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        await ws.send_json({"op": 10, "d": {"heartbeat_interval": HEARTBEAT_INTERVAL}})
+
+        shard_id = None
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            payload = json.loads(message.data)
+            op = payload["op"]
+            if op == 1:
+                await ws.send_json({"op": 11})
+            elif op == 2:
+                shard_id = payload["d"].get("shard", [0, 1])[0]
+                await self.identify(shard_id, ws)
+            elif op == 6:
+                # sessions can't be resumed, so the shard identifies again
+                await ws.send_json({"op": 9, "d": False})
+        if shard_id is not None and self.sockets.get(shard_id) is ws:
+            del self.sockets[shard_id]
+        return ws
+
+    async def identify(self, shard_id: int, ws: web.WebSocketResponse) -> None:
+        self.sockets[shard_id] = ws
+        self.sequences[shard_id] = 0
+        guilds = [
+            guild_id for guild_id in self.guilds if self.shard_of(guild_id) == shard_id
+        ]
+        await self.send(
+            shard_id,
+            "READY",
+            {
+                "v": 10,
+                "user": self.bot_user,
+                "guilds": [{"id": str(guild), "unavailable": True} for guild in guilds],
+                "session_id": f"session-{shard_id}",
+                "resume_gateway_url": "wss://gateway.discord.gg",
+                "shard": [shard_id, self.shard_count],
+                "application": {"id": str(self.application_id), "flags": 0},
+                "private_channels": [],
+            },
+        )
+        for guild_id in guilds:
+            await self.send(shard_id, "GUILD_CREATE", self.guild(guild_id))
+        self.ready_shards.add(shard_id)
+        if len(self.ready_shards) == self.shard_count:
+            self.all_ready.set()
+
+    async def dispatch_interaction(self, command: str, payload: dict) -> None:
+        """Sends an interaction to the bot and starts timing it."""
+
+        guild_id = int(payload["guild_id"])
+        self.interactions[payload["token"]] = Interaction(
+            command, int(payload["channel_id"])
+        )
+        await self.send(self.shard_of(guild_id), "INTERACTION_CREATE", payload)
+
+    # REST
+
+    @web.middleware
+    async def count_requests(self, request: web.Request, handler):
+        resource = request.match_info.route.resource
+        if resource is not None and request.path.startswith("/api/"):
+            route = resource.canonical.split("}", 1)[-1]
+            if route != "/{path}":
+                self.requests[f"{request.method} {route}"] += 1
+        return await handler(request)
+
+    async def fallback(self, request: web.Request) -> web.Response:
+        route = TOKEN_RE.sub("{token}", ID_RE.sub("{id}", request.match_info["path"]))
+        self.unhandled[f"{request.method} /{route}"] += 1
+        self.requests[f"{request.method} /{route}"] += 1
+        if request.method in ("DELETE", "PUT"):
+            return web.Response(status=204)
+        return json_response({})
+
+    async def no_content(self, request: web.Request) -> web.Response:
+        return web.Response(status=204)
+
+    async def empty_list(self, request: web.Request) -> web.Response:
+        return json_response([])
+
+    async def get_current_user(self, request: web.Request) -> web.Response:
+        return json_response(self.bot_user)
+
+    async def get_application(self, request: web.Request) -> web.Response:
+        return json_response(
+            {
+                "id": str(self.application_id),
+                "name": "LoadTestBot",
+                "icon": None,
+                "description": "",
+                "bot_public": True,
+                "bot_require_code_grant": False,
+                "owner": self.owner,
+                "team": None,
+                "verify_key": "0" * 64,
+                "flags": 0,
+                "approximate_guild_count": len(self.guilds),
+                "approximate_user_install_count": 0,
+            }
+        )
+
+    async def get_gateway(self, request: web.Request) -> web.Response:
+        return json_response(
+            {
+                "url": "wss://gateway.discord.gg",
+                "shards": self.shard_count,
+                "session_start_limit": {
+                    "total": 1000,
+                    "remaining": 1000,
+                    "reset_after": 0,
+                    "max_concurrency": 16,
+                },
+            }
+        )
+
+    async def sync_commands(self, request: web.Request) -> web.Response:
+        commands = await request.json()
+        for command in commands:
+            # context menus are sent without one, but always come back with one
+            command.setdefault("description", "")
+            command.update(
+                id=str(self.snowflake()),
+                application_id=str(self.application_id),
+                version=str(self.snowflake()),
+            )
+        self.commands = commands
+        self.commands_synced.set()
+        return json_response(commands)
+
+    async def get_commands(self, request: web.Request) -> web.Response:
+        return json_response(self.commands)
+
+    async def read_payload(self, request: web.Request) -> dict:
+        if request.content_type.startswith("multipart/"):
+            form = await request.post()
+            return json.loads(form.get("payload_json") or "{}")
+        if request.can_read_body:
+            return await request.json()
+        return {}
+
+    @staticmethod
+    def is_error(data: dict) -> bool:
+        """Whether a message is one of the errors the Errors cog sends."""
+
+        if (data.get("content") or "").startswith("❌"):
+            return True
+        return any(
+            (embed.get("title") or "").startswith("❌")
+            for embed in data.get("embeds") or []
+        )
+
+    async def interaction_callback(self, request: web.Request) -> web.Response:
+        payload = await self.read_payload(request)
+        kind, data = payload.get("type"), payload.get("data") or {}
+        interaction = self.interactions.get(request.match_info["token"])
+        if interaction is not None and interaction.acked_at is None:
+            interaction.acked_at = time.perf_counter()
+            # 5 and 6 are deferrals, the final message comes later
+            interaction.deferred = kind in (5, 6)
+            if not interaction.deferred:
+                interaction.done_at = interaction.acked_at
+                interaction.error = self.is_error(data)
+
+        if "with_response" not in request.query:
+            return web.Response(status=204)
+        channel_id = interaction.channel_id if interaction else self.error_channel
+        message = self.message(channel_id, data)
+        response = {
+            "interaction": {
+                "id": request.match_info["id"],
+                "type": 2,
+                "response_message_id": message["id"],
+                "response_message_loading": kind == 5,
+                "response_message_ephemeral": bool((data.get("flags") or 0) & 64),
+            }
+        }
+        if kind in (4, 7):
+            response["resource"] = {"type": kind, "message": message}
+        return json_response(response)
+
+    async def followup(self, request: web.Request) -> web.Response:
+        interaction = self.interactions.get(request.match_info["token"])
+        data = await self.read_payload(request) if request.method != "GET" else {}
+        if (
+            request.method != "GET"
+            and interaction is not None
+            and interaction.done_at is None
+        ):
+            interaction.done_at = time.perf_counter()
+            interaction.error = self.is_error(data)
+
+        channel_id = interaction.channel_id if interaction else self.error_channel
+        # a followup is a new message, "@original" is the response
+        message_id = request.match_info.get("message", "")
+        return json_response(
+            self.message(
+                channel_id, data, int(message_id) if message_id.isdigit() else None
+            )
+        )
+
+    async def get_channel(self, request: web.Request) -> web.Response:
+        return json_response(self.channel(int(request.match_info["channel"])))
+
+    async def create_message(self, request: web.Request) -> web.Response:
+        channel_id = int(request.match_info["channel"])
+        data = await self.read_payload(request)
+        if channel_id == self.error_channel:
+            # unhandled exceptions are reported to the error channel
+            embed = (data.get("embeds") or [{}])[0]
+            self.error_reports.append(embed.get("description") or "")
+        return json_response(self.message(channel_id, data))
+
+    async def create_dm(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        return json_response(
+            {
+                "id": str(self.snowflake()),
+                "type": 1,
+                "recipients": [self.user(int(data["recipient_id"]), "user")],
+                "last_message_id": None,
+            }
+        )
+
+    async def get_guild(self, request: web.Request) -> web.Response:
+        guild_id = int(request.match_info["guild"])
+        if guild_id not in self.guilds:
+            return json_response({"message": "Unknown Guild", "code": 10004}, 404)
+        return json_response(self.guild(guild_id))
+
+    async def get_member(self, request: web.Request) -> web.Response:
+        user = self.user(int(request.match_info["user"]), "user")
+        return json_response(self.member(user))
+
+    async def create_emoji(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        return json_response(
+            {
+                "id": str(self.snowflake()),
+                "name": data["name"],
+                "roles": [],
+                "require_colons": True,
+                "managed": False,
+                "animated": False,
+                "available": True,
+            }
+        )
+
+    async def bulk_ban(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        return json_response(
+            {"banned_users": data.get("user_ids", []), "failed_users": []}
+        )
+
+    async def cdn(self, request: web.Request) -> web.Response:
+        return web.Response(body=png(256), content_type="image/png")
@@ -0,0 +1,229 @@
+"""Synthetic interactions for every slash command the bot synced.
+
+Templates are made from the command payloads the bot sends to the fake
+Discord on sync, so a new command is load-tested without changes here.
+Required options get a value that makes sense for their type, and options
+listed in SAMPLES get a realistic one, so commands run their real path
+rather than failing validation.
+"""
+
+import random
+import secrets
+from collections.abc import Callable
+from typing import NamedTuple
+
+from loadtest.fake_discord import ALL_PERMISSIONS, FakeDiscord
+
+SUB_COMMAND, SUB_COMMAND_GROUP = 1, 2
+STRING, INTEGER, BOOLEAN, USER, CHANNEL, ROLE, MENTIONABLE, NUMBER, ATTACHMENT = range(
+    3, 12
+)
+
+
+def _user_ids(discord: FakeDiscord, count: int = 5) -> str:
+    return " ".join(user["id"] for user in random.sample(discord.users, count))
+
+
+# (command, option) -> value, or a function of the fake Discord returning one
+SAMPLES: dict[tuple[str, str], str | int | Callable[[FakeDiscord], str]] = {
+    ("8ball", "question"): "Will this scale?",
+    ("quote", "quote"): "Premature optimization is the root of all evil",
+    ("text", "text"): "Hello world, this is a load test",
+    ("megamind", "text"): "load tests",
+    ("dice", "dice"): "4d6kh3",
+    ("weather", "location"): "London",
+    ("convert", "value"): "10, 20.5, 42",
+    ("convert", "from"): "km",
+    ("convert", "to"): "mi",
+    ("github", "query"): "discord bot",
+    ("pypi", "package"): "requests",
+    ("npm", "package"): "react",
+    ("lyrics", "query"): "never gonna give you up",
+    ("emoji create", "url"): "https://files.loadtest/emoji.png",
+    ("emoji create", "name"): "loadtest",
+    (
+        "emoji import",
+        "urls",
+    ): "https://files.loadtest/a.png https://files.loadtest/b.png",
+    ("massban", "users"): _user_ids,
+    ("masstimeout", "users"): _user_ids,
+    ("masstimeout", "minutes"): 5,
+    ("timeout", "minutes"): 5,
+}
+
+
+class Template(NamedTuple):
+    name: str
+    # 2 for a command, 4 for autocomplete
+    type: int
+    command: dict
+    # the subcommand group and subcommand names, if any
+    path: tuple[str, ...]
+    options: tuple[dict, ...]
+    focused: dict | None = None
+
+    @property
+    def qualified_name(self) -> str:
+        return " ".join((self.command["name"],) + self.path)
+
+
+def templates(commands: list[dict]) -> list[Template]:
+    """A template per slash command, and per option with autocomplete."""
+
+    result = []
+
+    def walk(command: dict, path: tuple[str, ...], options: list[dict]):
+        nested = [
+            option
+            for option in options
+            if option["type"] in (SUB_COMMAND, SUB_COMMAND_GROUP)
+        ]
+        if nested:
+            for option in nested:
+                walk(command, path + (option["name"],), option.get("options", []))
+            return
+        template = Template(
+            " ".join((command["name"],) + path), 2, command, path, tuple(options)
+        )
+        result.append(template)
+        name = template.name
+        for option in options:
+            if option.get("autocomplete"):
+                result.append(
+                    Template(
+                        f"{name} [{option['name']} autocomplete]",
+                        4,
+                        command,
+                        path,
+                        tuple(options),
+                        option,
+                    )
+                )
+
+    for command in commands:
+        # only slash commands, not context menus
+        if command.get("type", 1) == 1:
+            walk(command, (), command.get("options", []))
+    return result
+
+
+class InteractionFactory:
+    def __init__(self, discord: FakeDiscord):
+        self.discord = discord
+        self.guild_ids = list(discord.guilds)
+
+    def value(self, template: Template, option: dict, context: dict):
+        sample = SAMPLES.get((template.qualified_name, option["name"]))
+        if callable(sample):
+            return sample(self.discord)
+        if sample is not None:
+            return sample
+        if option.get("choices"):
+            return option["choices"][0]["value"]
+
+        kind = option["type"]
+        if kind == STRING:
+            return "loadtest".ljust(option.get("min_length") or 0, "x")
+        if kind in (INTEGER, NUMBER):
+            value = option.get("min_value", 1)
+            return min(value, option.get("max_value", value))
+        if kind == BOOLEAN:
+            return False
+        if kind in (USER, MENTIONABLE):
+            user = context["target"]
+            context["resolved"].setdefault("users", {})[user["id"]] = user
+            context["resolved"].setdefault("members", {})[user["id"]] = {
+                key: value
+                for key, value in self.discord.member(user).items()
+                if key != "user"
+            }
+            return user["id"]
+        if kind == CHANNEL:
+            channel = self.discord.channel(context["channel_id"])
+            channel["permissions"] = ALL_PERMISSIONS
+            context["resolved"].setdefault("channels", {})[channel["id"]] = channel
+            return channel["id"]
+        if kind == ROLE:
+            role = self.discord.role(context["guild_id"])
+            context["resolved"].setdefault("roles", {})[role["id"]] = role
+            return role["id"]
+        if kind == ATTACHMENT:
+            attachment_id = str(self.discord.snowflake())
+            context["resolved"].setdefault("attachments", {})[attachment_id] = {
+                "id": attachment_id,
+                "filename": "loadtest.png",
+                "size": 1024,
+                "url": "https://files.loadtest/loadtest.png",
+                "proxy_url": "https://files.loadtest/loadtest.png",
+                "content_type": "image/png",
+            }
+            return attachment_id
+        raise ValueError(f"Unknown option type {kind} in {template.name}")
+
+    def payload(self, template: Template) -> dict:
+        discord = self.discord
+        guild_id = random.choice(self.guild_ids)
+        channel_id = random.choice(discord.guilds[guild_id]["channels"])
+        user, target = random.sample(discord.users, 2)
+        context = {
+            "guild_id": guild_id,
+            "channel_id": channel_id,
+            "target": target,
+            "resolved": {},
+        }
+
+        options = []
+        for option in template.options:
+            if option is template.focused:
+                value = str(self.value(template, option, context))[:3]
+                options.append(
+                    {
+                        "name": option["name"],
+                        "type": option["type"],
+                        "value": value,
+                        "focused": True,
+                    }
+                )
+            elif option.get("required") or (
+                (template.qualified_name, option["name"]) in SAMPLES
+            ):
+                options.append(
+                    {
+                        "name": option["name"],
+                        "type": option["type"],
+                        "value": self.value(template, option, context),
+                    }
+                )
+
+        # wrap the options in their subcommand, then their group
+        for depth, name in reversed(list(enumerate(template.path))):
+            kind = SUB_COMMAND if depth == len(template.path) - 1 else SUB_COMMAND_GROUP
+            options = [{"name": name, "type": kind, "options": options}]
+
+        channel = discord.channel(channel_id)
+        return {
+            "id": str(discord.snowflake()),
+            "application_id": str(discord.application_id),
+            "type": template.type,
+            "token": secrets.token_urlsafe(96),
+            "version": 1,
+            "guild_id": str(guild_id),
+            "guild": {"id": str(guild_id), "locale": "en-US", "features": []},
+            "channel_id": str(channel_id),
+            "channel": channel,
+            "member": discord.member(user, permissions=True),
+            "app_permissions": ALL_PERMISSIONS,
+            "locale": "en-US",
+            "guild_locale": "en-US",
+            "entitlements": [],
+            "authorizing_integration_owners": {"0": str(guild_id)},
+            "context": 0,
+            "attachment_size_limit": 25 * 1024 * 1024,
+            "data": {
+                "id": template.command["id"],
+                "name": template.command["name"],
+                "type": 1,
+                "options": options,
+                "resolved": context["resolved"],
+            },
+        }
@@ -0,0 +1,60 @@
+import socket
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+
+# hosts served by the fake Discord server, every other host goes to the stub
+# upstream server, so a load test never reaches the internet
+DISCORD_HOSTS = frozenset(
+    {
+        "discord.com",
+        "gateway.discord.gg",
+        "cdn.discordapp.com",
+        "media.discordapp.net",
+    }
+)
+
+
+class LocalResolver(AbstractResolver):
+    """Resolves Discord's hosts to the fake Discord server, and the rest to the stubs."""
+
+    def __init__(self, discord_port: int, upstream_port: int):
+        self.discord_port = discord_port
+        self.upstream_port = upstream_port
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> list[dict]:
+        local = self.discord_port if host in DISCORD_HOSTS else self.upstream_port
+        return [
+            {
+                "hostname": host,
+                "host": "127.0.0.1",
+                "port": local,
+                "family": socket.AF_INET,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST,
+            }
+        ]
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalConnector(aiohttp.TCPConnector):
+    """Sends every request to the local servers, in plain HTTP.
+
+    The URLs stay the same, https and wss included, and the Host header still
+    names the real host, which is how the local servers tell the APIs apart.
+    """
+
+    def __init__(self, discord_port: int, upstream_port: int):
+        super().__init__(
+            resolver=LocalResolver(discord_port, upstream_port),
+            use_dns_cache=False,
+            limit=0,
+        )
+
+    def _get_ssl_context(self, req):
+        # no TLS, so the local servers don't need certificates
+        return None
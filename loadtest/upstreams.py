@@ -0,0 +1,242 @@
+"""Stand-ins for the third-party APIs the cogs call.
+
+Each API answers with a payload in the shape the cogs read, after a
+configurable delay, and fails with a 503 at a configurable rate. Requests are
+told apart by their Host header, see loadtest.network.
+"""
+
+import asyncio
+import random
+import re
+from collections import Counter
+from functools import lru_cache
+from io import BytesIO
+from typing import NamedTuple
+
+from aiohttp import web
+from PIL import Image
+
+
+class Behaviour(NamedTuple):
+    """How an upstream responds: mean latency and jitter in ms, and error rate."""
+
+    latency: float = 80.0
+    jitter: float = 40.0
+    error_rate: float = 0.0
+
+    def delay(self) -> float:
+        return max(0.0, random.gauss(self.latency, self.jitter)) / 1000
+
+
+@lru_cache(maxsize=8)
+def png(size: int = 128, colour: tuple[int, int, int] = (255, 112, 0)) -> bytes:
+    """A PNG image, for avatars, emojis and any other image a cog downloads."""
+
+    output = BytesIO()
+    Image.new("RGB", (size, size), colour).save(output, "PNG")
+    return output.getvalue()
+
+
+def _weather(request: web.Request, match: re.Match) -> web.Response:
+    location = request.query.get("q", "London").split(",")[0].strip().title()
+    return web.json_response(
+        [
+            {
+                "location": {
+                    "name": location,
+                    "degreetype": "C",
+                    "timezone": "0",
+                    "alert": "",
+                },
+                "current": {
+                    "temperature": "14",
+                    "feelslike": "12",
+                    "skytext": "Partly Cloudy",
+                    "date": "2026-10-19",
+                    "observationtime": "12:00:00",
+                    "observationpoint": location,
+                    "winddisplay": "11 km/h West",
+                    "humidity": "72",
+                    "imageUrl": "https://files.loadtest/weather.png",
+                },
+            }
+        ]
+    )
+
+
+def _pickupline(request: web.Request, match: re.Match) -> web.Response:
+    return web.json_response({"pickupline": "Are you a load test? You raise my p99."})
+
+
+def _animal(request: web.Request, match: re.Match) -> web.Response:
+    animal = match["animal"]
+    return web.json_response(
+        {
+            "image": f"https://files.loadtest/{animal}.png",
+            "fact": f"A {animal} fact, generated for the load test.",
+        }
+    )
+
+
+def _lyrics(request: web.Request, match: re.Match) -> web.Response:
+    title = request.query.get("title", "song")
+    verse = "this line is a stand-in for the real lyrics of the song\n"
+    return web.json_response(
+        {
+            "title": title.title(),
+            "author": "Load Test",
+            "lyrics": verse * 120,
+            "thumbnail": {"genius": "https://files.loadtest/cover.png"},
+            "links": {"genius": f"https://genius.com/{title.replace(' ', '-')}"},
+        }
+    )
+
+
+def _xkcd(request: web.Request, match: re.Match) -> web.Response:
+    number = int(match["number"] or 3000)
+    return web.json_response(
+        {
+            "num": number,
+            "safe_title": f"Comic {number}",
+            "img": f"https://files.loadtest/xkcd/{number}.png",
+        }
+    )
+
+
+def _pypi(request: web.Request, match: re.Match) -> web.Response:
+    name = match["package"]
+    return web.json_response(
+        {
+            "info": {
+                "name": name,
+                "package_url": f"https://pypi.org/project/{name}/",
+                "summary": "A package served by the load test.",
+                "home_page": f"https://example.com/{name}",
+                "version": "1.0.0",
+                "author": "Load Test",
+                "license": "MIT",
+            }
+        }
+    )
+
+
+def _npm(request: web.Request, match: re.Match) -> web.Response:
+    name = match["package"]
+    return web.json_response(
+        {
+            "name": name,
+            "description": "A package served by the load test.",
+            "version": "1.0.0",
+            "homepage": f"https://example.com/{name}",
+            "author": {"name": "Load Test"},
+            "repository": {"url": f"https://github.com/loadtest/{name}"},
+            "maintainers": [{"name": "loadtest"}],
+            "license": "MIT",
+        }
+    )
+
+
+def _github_search(request: web.Request, match: re.Match) -> web.Response:
+    query = request.query.get("q", "")
+    count = int(request.query.get("per_page", 30))
+    items = [
+        {
+            "full_name": f"loadtest/{query}-{n}",
+            "html_url": f"https://github.com/loadtest/{query}-{n}",
+            "description": "A repository served by the load test.",
+            "owner": {"avatar_url": "https://files.loadtest/owner.png"},
+            "stargazers_count": 1000 - n,
+            "forks_count": 100,
+            "open_issues_count": 10,
+            "language": "Python",
+            "license": {"name": "MIT License"},
+            "pushed_at": "2026-10-01T12:00:00Z",
+        }
+        for n in range(count)
+    ]
+    return web.json_response(
+        {"total_count": count, "items": items},
+        headers={
+            "X-RateLimit-Remaining": "1000",
+            "X-RateLimit-Reset": "4102444800",
+        },
+    )
+
+
+def _dadjoke(request: web.Request, match: re.Match) -> web.Response:
+    return web.json_response({"joke": "I only know one load test joke. It scales."})
+
+
+def _memes(request: web.Request, match: re.Match) -> web.Response:
+    count = int(match["count"])
+    return web.json_response(
+        {
+            "count": count,
+            "memes": [
+                {
+                    # unique, so the seen-meme filters fill up like they would
+                    "postLink": f"https://redd.it/{random.getrandbits(48):x}",
+                    "title": "A meme",
+                    "url": "https://files.loadtest/meme.png",
+                    "ups": 1000,
+                    "nsfw": False,
+                }
+                for _ in range(count)
+            ],
+        }
+    )
+
+
+def _image(request: web.Request, match: re.Match) -> web.Response:
+    return web.Response(body=png(), content_type="image/png")
+
+
+# host -> [(path pattern, handler)], all GET
+ROUTES = {
+    "api.popcat.xyz": [
+        (r"/weather", _weather),
+        (r"/pickuplines", _pickupline),
+    ],
+    "some-random-api.com": [
+        (r"/animal/(?P<animal>\w+)", _animal),
+        (r"/lyrics", _lyrics),
+    ],
+    "xkcd.com": [(r"/(?:(?P<number>\d+)/)?info\.0\.json", _xkcd)],
+    "pypi.org": [(r"/pypi/(?P<package>[^/]+)/json", _pypi)],
+    "registry.npmjs.org": [(r"/(?P<package>[^/]+)", _npm)],
+    "api.github.com": [(r"/search/repositories", _github_search)],
+    "icanhazdadjoke.com": [(r"/", _dadjoke)],
+    "meme-api.com": [(r"/gimme/(?P<count>\d+)", _memes)],
+    # any other host serves images, for the links given to /emoji
+    None: [(r"/.*", _image)],
+}
+COMPILED = {
+    host: [(re.compile(path), handler) for path, handler in routes]
+    for host, routes in ROUTES.items()
+}
+
+
+class Upstreams:
+    def __init__(self, default: Behaviour, overrides: dict[str, Behaviour]):
+        self.default = default
+        self.overrides = overrides
+        self.requests: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self.app = web.Application()
+        self.app.router.add_route("*", "/{path:.*}", self.dispatch)
+
+    async def dispatch(self, request: web.Request) -> web.StreamResponse:
+        host = request.host.split(":")[0]
+        behaviour = self.overrides.get(host, self.default)
+        self.requests[host] += 1
+
+        await asyncio.sleep(behaviour.delay())
+        if random.random() < behaviour.error_rate:
+            self.errors[host] += 1
+            return web.json_response({"message": "injected error"}, status=503)
+
+        for pattern, handler in COMPILED.get(host, COMPILED[None]):
+            match = pattern.fullmatch(request.path)
+            if match is not None:
+                return handler(request, match)
+        return web.json_response({"message": "not stubbed"}, status=404)
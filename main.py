@@ -1,5 +1,6 @@
 import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import UTC, datetime
 
 import discord
@@ -7,21 +8,30 @@ from aiohttp import ClientSession
 from discord.ext import commands
 
 from config import config
+from utils.database import Database
+from utils.tracing import TracedCommandTree, Tracer, trace_config
 
 
 class Bot(commands.AutoShardedBot):
     error_channel: discord.TextChannel
     session: ClientSession
+    db: Database
+    process_pool: ProcessPoolExecutor
     launch_time: int
+    tracer: Tracer | None = None
     colour = 0xFF7000
 
     def __init__(self, *args, **kwargs):
+        intents = discord.Intents.default()
+        # privileged, must also be enabled in the developer portal
+        intents.members = bool(config.get("members_intent"))
+        tracing = bool(config.get("trace_sample_rate"))
         super().__init__(
             *args,
             **kwargs,
             command_prefix=commands.when_mentioned,
             help_command=None,
-            intents=discord.Intents.default(),
+            intents=intents,
             case_insensitive=True,
             allowed_mentions=discord.AllowedMentions(everyone=False),
             allowed_installs=discord.app_commands.AppInstallationType(
@@ -30,16 +40,33 @@ class Bot(commands.AutoShardedBot):
             allowed_contexts=discord.app_commands.AppCommandContext(
                 guild=True, dm_channel=True, private_channel=True
             ),
+            # without tracing, none of its hooks are installed
+            tree_cls=(
+                TracedCommandTree if tracing else discord.app_commands.CommandTree
+            ),
+            http_trace=trace_config() if tracing else None,
         )
 
     async def setup_hook(self) -> None:
+        # cogs create their tables when they load, so connect first
+        self.db = Database(config.get("database", "1bot.db"))
+        await self.db.connect()
+        # for CPU-bound work such as image rendering, off the event loop
+        self.process_pool = ProcessPoolExecutor(config.get("process_workers", 2))
+        if config.get("trace_sample_rate"):
+            self.tracer = Tracer(
+                config.get("trace_file", "traces.jsonl"), config["trace_sample_rate"]
+            )
+
         await self.load_extension("jishaku")
         for cog in os.listdir("./cogs"):
             if cog.endswith(".py"):
                 await self.load_extension(f"cogs.{cog[:-3]}")
 
         self.error_channel = await self.fetch_channel(config["error_channel"])
-        self.session = ClientSession()
+        self.session = ClientSession(
+            trace_configs=[trace_config()] if self.tracer else None
+        )
         self.launch_time = round(datetime.now(UTC).timestamp())
 
     async def on_ready(self) -> None:
@@ -49,6 +76,12 @@ class Bot(commands.AutoShardedBot):
         if hasattr(self, "session"):
             await self.session.close()
         await super().close()
+        if hasattr(self, "db"):
+            await self.db.close()
+        if hasattr(self, "process_pool"):
+            self.process_pool.shutdown(cancel_futures=True)
+        if self.tracer is not None:
+            self.tracer.close()
 
 
 bot = Bot()
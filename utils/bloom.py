@@ -0,0 +1,77 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """A fixed-size set that can only answer "probably seen" or "never seen".
+
+    The bit array is sized so that, up to `capacity` items, a lookup for an
+    unseen item wrongly reports it as seen with probability `error_rate`.
+    """
+
+    __slots__ = ("capacity", "size", "hashes", "count", "bits")
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for n in range(self.hashes):
+            yield (first + n * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] >> (position & 7) & 1
+            for position in self._positions(item)
+        )
+
+
+class RotatingBloomFilter:
+    """Remembers recent items in a few generations of Bloom filters.
+
+    New items go into the newest generation. `rotate` drops the oldest
+    generation, so an item is forgotten between `generations - 1` and
+    `generations` rotations after it was added. A generation that fills up
+    rotates early, so the error rate holds however busy it gets, and memory
+    stays fixed at `generations` filters. Each generation gets a share of
+    `error_rate`, since a lookup checks all of them.
+    """
+
+    __slots__ = ("capacity", "error_rate", "generations", "filters")
+
+    def __init__(self, capacity: int, error_rate: float, generations: int = 3):
+        self.capacity = capacity
+        self.error_rate = error_rate / generations
+        self.generations = generations
+        self.filters = [BloomFilter(capacity, self.error_rate)]
+
+    def rotate(self) -> None:
+        self.filters.append(BloomFilter(self.capacity, self.error_rate))
+        del self.filters[: -self.generations]
+
+    def is_empty(self) -> bool:
+        return not any(bloom.count for bloom in self.filters)
+
+    def add(self, item: str) -> None:
+        if self.filters[-1].count >= self.capacity:
+            self.rotate()
+        self.filters[-1].add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return any(item in bloom for bloom in self.filters)
+
+    def memory(self) -> int:
+        """The size of the bit arrays, in bytes."""
+        return sum(len(bloom.bits) for bloom in self.filters)
@@ -0,0 +1,60 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Database:
+    """A small async wrapper around a single SQLite connection.
+
+    All queries run on one dedicated thread, so the connection is never shared
+    between threads and the event loop is never blocked on disk I/O.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> None:
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+
+    def _execute(self, sql: str, params) -> list[tuple]:
+        with self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _executemany(self, sql: str, seq_of_params) -> None:
+        with self._conn:
+            self._conn.executemany(sql, seq_of_params)
+
+    def _executescript(self, script: str) -> None:
+        with self._conn:
+            self._conn.executescript(script)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    async def connect(self) -> None:
+        await self._run(self._connect)
+
+    async def execute(self, sql: str, params=()) -> list[tuple]:
+        """Run a single statement in its own transaction and return all rows."""
+        return await self._run(self._execute, sql, params)
+
+    async def executemany(self, sql: str, seq_of_params) -> None:
+        """Run a statement once per parameter set, in a single transaction."""
+        await self._run(self._executemany, sql, list(seq_of_params))
+
+    async def executescript(self, script: str) -> None:
+        """Run several statements at once, e.g. a cog's schema."""
+        await self._run(self._executescript, script)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,265 @@
+"""Dice notation parsing, rolling and distributions.
+
+An expression is a sum of constants and groups of dice, where a group is:
+
+- `NdS`: N dice with S sides (N defaults to 1)
+- `NdSkhK` or `NdSkK`: keep the K highest dice, `NdSklK`: keep the K lowest
+- `NdS!`: exploding dice, where every maximum roll adds another roll to that die
+
+Modifiers can be combined, as in `4d6!kh3`.
+"""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+MAX_DICE = 1000
+MAX_SIDES = 1_000_000
+MAX_TERMS = 20
+# an exploding die stops after this many extra rolls
+MAX_EXPLOSIONS = 100
+# groups with more dice than this are summed without listing every roll
+SHOWN_ROLLS = 50
+# distributions with more possible totals than this are sampled instead
+MAX_EXACT_OUTCOMES = 20_000
+MONTE_CARLO_TRIALS = 100_000
+# dice rolled in total while sampling, which bounds memory and time
+MAX_SAMPLES = 2_000_000
+
+# `!` may come before or after the keep modifier
+TERM_RE = re.compile(r"([+-])(?:(\d*)d(\d+)(!)?(?:(kh|kl|k)(\d+))?(!)?|(\d+))")
+
+
+class Dice(NamedTuple):
+    sign: int
+    count: int
+    sides: int
+    keep: int | None
+    keep_lowest: bool
+    explode: bool
+
+    def __str__(self) -> str:
+        text = f"{self.count}d{self.sides}{'!' if self.explode else ''}"
+        if self.keep is not None:
+            text += f"{'kl' if self.keep_lowest else 'kh'}{self.keep}"
+        return text
+
+
+class Expression(NamedTuple):
+    dice: tuple[Dice, ...]
+    constant: int
+    text: str
+
+    def is_simple(self) -> bool:
+        """Whether every total has a closed-form probability (no keep or explode)."""
+        return all(d.keep is None and not d.explode for d in self.dice)
+
+
+class Stats(NamedTuple):
+    exact: bool
+    mean: float
+    std: float
+    minimum: int
+    maximum: int
+    # 5th, 25th, 50th, 75th and 95th percentiles
+    percentiles: tuple[int, ...]
+    # (lowest total, highest total, probability) of each bucket
+    histogram: list[tuple[int, int, float]]
+
+
+def parse(text: str) -> Expression:
+    """Parses dice notation such as `8d20+5`. Raises ValueError if it's invalid."""
+    return _parse(re.sub(r"\s+", "", text.lower()))
+
+
+# TTRPG players roll the same few expressions over and over
+@lru_cache(maxsize=512)
+def _parse(text: str) -> Expression:
+    if not text:
+        raise ValueError("Enter dice to roll, for example `2d6`.")
+    if text[0] not in "+-":
+        text = "+" + text
+
+    dice, constant, position = [], 0, 0
+    while position < len(text):
+        match = TERM_RE.match(text, position)
+        if match is None:
+            raise ValueError(f"Invalid dice notation at `{text[position:][:20]}`.")
+        sign, count, sides, explode, keep_mode, keep, explode_after, number = (
+            match.groups()
+        )
+        sign = -1 if sign == "-" else 1
+        if number is not None:
+            constant += sign * int(number)
+        else:
+            dice.append(
+                _dice(
+                    sign,
+                    int(count or 1),
+                    int(sides),
+                    keep_mode,
+                    keep,
+                    explode or explode_after,
+                )
+            )
+        position = match.end()
+
+    if not dice:
+        raise ValueError("The expression must roll at least one die.")
+    if len(dice) > MAX_TERMS:
+        raise ValueError(f"The expression can have at most {MAX_TERMS} dice groups.")
+    if sum(d.count for d in dice) > MAX_DICE:
+        raise ValueError(f"You can roll at most {MAX_DICE:,} dice at once.")
+
+    normalized = "".join(f"{'-' if d.sign < 0 else '+'}{d}" for d in dice) + (
+        f"{constant:+}" if constant else ""
+    )
+    return Expression(tuple(dice), constant, normalized.lstrip("+"))
+
+
+def _dice(
+    sign: int, count: int, sides: int, keep_mode: str | None, keep, explode
+) -> Dice:
+    if not 1 <= count <= MAX_DICE:
+        raise ValueError(f"The number of dice must be between 1 and {MAX_DICE:,}.")
+    if not 1 <= sides <= MAX_SIDES:
+        raise ValueError(f"Dice must have between 1 and {MAX_SIDES:,} sides.")
+    if explode and sides == 1:
+        raise ValueError("A 1-sided die can't explode.")
+    if keep is not None:
+        keep = int(keep)
+        if not 1 <= keep <= count:
+            raise ValueError(f"You can keep between 1 and {count} of {count} dice.")
+    return Dice(sign, count, sides, keep, keep_mode == "kl", bool(explode))
+
+
+def _roll(dice: Dice, rng: np.random.Generator, trials: int | None = None):
+    """Rolls a group of dice, one row per trial if `trials` is set.
+
+    Exploded dice are returned as the sum of all their rolls.
+    """
+
+    shape = dice.count if trials is None else (trials, dice.count)
+    rolls = rng.integers(1, dice.sides + 1, size=shape)
+    if dice.explode:
+        exploding = rolls == dice.sides
+        for _ in range(MAX_EXPLOSIONS):
+            count = np.count_nonzero(exploding)
+            if not count:
+                break
+            extra = rng.integers(1, dice.sides + 1, size=count)
+            rolls[exploding] += extra
+            exploding[exploding] = extra == dice.sides
+    return rolls
+
+
+def _kept(dice: Dice, rolls: np.ndarray) -> np.ndarray:
+    """Returns the indexes of the dice that are kept in a single roll."""
+
+    if dice.keep is None or dice.keep == dice.count:
+        return np.arange(dice.count)
+    if dice.keep_lowest:
+        return np.argpartition(rolls, dice.keep - 1)[: dice.keep]
+    return np.argpartition(rolls, dice.count - dice.keep)[dice.count - dice.keep :]
+
+
+def roll(expression: Expression, rng: np.random.Generator) -> tuple[int, list[str]]:
+    """Rolls an expression once.
+
+    Returns the total and a breakdown of each dice group, where dropped
+    dice are struck through and big groups only show their sum.
+    """
+
+    total, breakdown = expression.constant, []
+    for dice in expression.dice:
+        rolls = _roll(dice, rng)
+        kept = _kept(dice, rolls)
+        subtotal = int(rolls[kept].sum())
+        total += dice.sign * subtotal
+
+        sign = "-" if dice.sign < 0 else ""
+        if dice.count > SHOWN_ROLLS:
+            breakdown.append(f"{sign}{dice}: {subtotal:,}")
+            continue
+        mask = np.zeros(dice.count, dtype=bool)
+        mask[kept] = True
+        shown = ", ".join(
+            str(value) if keep else f"~~{value}~~"
+            for value, keep in zip(rolls.tolist(), mask.tolist())
+        )
+        breakdown.append(f"{sign}{dice}: [{shown}]")
+    return total, breakdown
+
+
+def _exact(expression: Expression) -> tuple[np.ndarray, np.ndarray]:
+    pmf, offset = np.ones(1), expression.constant
+    for dice in expression.dice:
+        # the sum of N dice, by convolving the face distribution by squaring
+        face, group, count = np.full(dice.sides, 1 / dice.sides), np.ones(1), dice.count
+        while count:
+            if count & 1:
+                group = np.convolve(group, face)
+            count >>= 1
+            if count:
+                face = np.convolve(face, face)
+        if dice.sign < 0:
+            group = group[::-1]
+            offset -= dice.count * dice.sides
+        else:
+            offset += dice.count
+        pmf = np.convolve(pmf, group)
+    return np.arange(offset, offset + len(pmf)), pmf
+
+
+def _sampled(expression: Expression, rng: np.random.Generator):
+    dice_count = sum(d.count for d in expression.dice)
+    trials = min(MONTE_CARLO_TRIALS, MAX_SAMPLES // dice_count)
+    if trials < 1000:
+        raise ValueError("That expression rolls too many dice to compute its stats.")
+
+    totals = np.full(trials, expression.constant, dtype=np.int64)
+    for dice in expression.dice:
+        rolls = _roll(dice, rng, trials)
+        if dice.keep is not None:
+            rolls.sort(axis=1)
+            rolls = (
+                rolls[:, : dice.keep] if dice.keep_lowest else rolls[:, -dice.keep :]
+            )
+        totals += dice.sign * rolls.sum(axis=1)
+    values, counts = np.unique(totals, return_counts=True)
+    return values, counts / trials
+
+
+def stats(expression: Expression, buckets: int = 12) -> Stats:
+    """Computes the distribution of an expression's total.
+
+    Simple expressions with few enough possible totals are computed exactly,
+    everything else is sampled with Monte Carlo trials.
+    """
+
+    outcomes = 1 + sum(d.count * (d.sides - 1) for d in expression.dice)
+    exact = expression.is_simple() and outcomes <= MAX_EXACT_OUTCOMES
+    if exact:
+        values, probabilities = _exact(expression)
+    else:
+        values, probabilities = _sampled(expression, np.random.default_rng())
+
+    mean = float(values @ probabilities)
+    std = float(np.sqrt(((values - mean) ** 2) @ probabilities))
+    cdf = np.cumsum(probabilities)
+    percentiles = tuple(
+        int(values[min(np.searchsorted(cdf, q), len(values) - 1)])
+        for q in (0.05, 0.25, 0.5, 0.75, 0.95)
+    )
+
+    minimum, maximum = int(values[0]), int(values[-1])
+    # equally wide buckets, so the bars keep the shape of the distribution
+    width = -(-(maximum - minimum + 1) // buckets)
+    weights = np.bincount((values - minimum) // width, probabilities)
+    histogram = [
+        (minimum + n * width, min(minimum + (n + 1) * width - 1, maximum), float(w))
+        for n, w in enumerate(weights)
+    ]
+    return Stats(exact, mean, std, minimum, maximum, percentiles, histogram)
@@ -0,0 +1,119 @@
+import os
+import re
+import zipfile
+import zlib
+from io import BytesIO
+from typing import NamedTuple
+
+# Discord's limit for emoji images
+MAX_EMOJI_SIZE = 256 * 1024
+# the most emojis a server can have of each kind, so no import needs more
+MAX_IMPORT = 250
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+
+
+class Candidate(NamedTuple):
+    """An image to be uploaded as an emoji, or the reason it can't be."""
+
+    name: str
+    source: str
+    image: bytes | None = None
+    error: str | None = None
+
+
+def image_type(data: bytes) -> str | None:
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def emoji_name(path: str) -> str:
+    """Turns a file name or URL path into a valid emoji name."""
+    stem = os.path.splitext(os.path.basename(path.rstrip("/")))[0]
+    name = re.sub(r"[^A-Za-z0-9_]+", "_", stem).strip("_")[:32]
+    return name if len(name) >= 2 else f"emoji_{name}".rstrip("_")
+
+
+def validate(name: str, source: str, data: bytes) -> Candidate:
+    if len(data) > MAX_EMOJI_SIZE:
+        return Candidate(name, source, error="larger than 256 KB")
+    if image_type(data) is None:
+        return Candidate(name, source, error="not a PNG, JPEG, GIF or WEBP image")
+    return Candidate(name, source, data)
+
+
+def extract_zip(data: bytes) -> list[Candidate]:
+    """Reads the images in a ZIP archive.
+
+    Each member is decompressed in chunks and abandoned as soon as it goes
+    over the emoji size limit, so a huge (or malicious) member costs no more
+    than 256 KB of memory. Blocking, run it in a thread.
+    """
+
+    try:
+        archive = zipfile.ZipFile(BytesIO(data))
+    except zipfile.BadZipFile:
+        raise ValueError("The attachment is not a valid ZIP archive.")
+
+    candidates = []
+    with archive:
+        members = [
+            member
+            for member in archive.infolist()
+            if not member.is_dir()
+            and member.filename.lower().endswith(IMAGE_EXTENSIONS)
+            # skip metadata that macOS adds to archives
+            and not member.filename.startswith("__MACOSX/")
+        ]
+        for member in members[:MAX_IMPORT]:
+            name = emoji_name(member.filename)
+            if member.file_size > MAX_EMOJI_SIZE:
+                candidates.append(
+                    Candidate(name, member.filename, error="larger than 256 KB")
+                )
+                continue
+            try:
+                with archive.open(member) as file:
+                    image = b""
+                    while len(image) <= MAX_EMOJI_SIZE:
+                        chunk = file.read(64 * 1024)
+                        if not chunk:
+                            break
+                        image += chunk
+            except (
+                zipfile.BadZipFile,
+                zlib.error,
+                EOFError,
+                RuntimeError,
+                NotImplementedError,
+            ) as e:
+                # corrupt, truncated, encrypted or using an unsupported
+                # compression method
+                candidates.append(
+                    Candidate(name, member.filename, error=str(e) or "corrupt")
+                )
+                continue
+            candidates.append(validate(name, member.filename, image))
+    return candidates
+
+
+def dedupe_names(candidates: list[Candidate], taken: set[str]) -> list[Candidate]:
+    """Renames candidates so no two emojis, new or existing, share a name."""
+
+    renamed = []
+    taken = {name.lower() for name in taken}
+    for candidate in candidates:
+        name, number = candidate.name, 1
+        while name.lower() in taken:
+            number += 1
+            suffix = f"_{number}"
+            name = candidate.name[: 32 - len(suffix)] + suffix
+        taken.add(name.lower())
+        renamed.append(candidate._replace(name=name))
+    return renamed
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from contextlib import suppress
+
+from aiohttp import ClientSession
+
+from utils.cache import LRUCache
+
+API = "https://api.github.com"
+# requests kept back from each rate limit bucket, so one busy command can't
+# use up the whole quota
+RESERVE = 1
+# how long a request may wait for the rate limit to reset before it is refused
+MAX_WAIT = 15
+
+
+class RateLimit:
+    __slots__ = ("remaining", "reset", "updated")
+
+    def __init__(self):
+        self.remaining: int | None = None
+        self.reset = 0.0
+        # set whenever a response reports the bucket
+        self.updated = asyncio.Event()
+
+
+class GitHubClient:
+    """A small client for the GitHub REST API.
+
+    Responses are cached with their ETag and revalidated with If-None-Match,
+    and a 304 is answered from the cache. GitHub doesn't count 304s against
+    the quota of authenticated requests. The client also tracks each rate
+    limit bucket from the X-RateLimit-* headers, and waits for a reset or
+    refuses a request before the bucket runs out, not after.
+    """
+
+    def __init__(self, token: str | None = None):
+        self.headers = {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self._etags = LRUCache(256)
+        self._limits: dict[str, RateLimit] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def _acquire(self, resource: str) -> None:
+        """Takes one request from a bucket's quota, waiting for a reset if needed."""
+
+        # requests to a bucket that is used up queue behind each other
+        async with self._locks.setdefault(resource, asyncio.Lock()):
+            while True:
+                limit = self._limits.get(resource)
+                if limit is None or limit.remaining is None:
+                    return
+                if limit.remaining > RESERVE:
+                    limit.remaining -= 1
+                    return
+
+                wait = limit.reset - time.time()
+                if wait > MAX_WAIT:
+                    raise ValueError(
+                        "GitHub's rate limit has been reached."
+                        f" Try again <t:{limit.reset:.0f}:R>."
+                    )
+                if wait <= 0:
+                    # the bucket has been refilled, but only a response says
+                    # by how much, so this request goes alone and the ones
+                    # behind it wait for its answer
+                    limit.reset = time.time() + MAX_WAIT
+                    return
+                limit.updated.clear()
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(limit.updated.wait(), wait)
+
+    def _update_limit(self, resource: str, headers) -> None:
+        if "X-RateLimit-Remaining" not in headers:
+            return
+        limit = self._limits.setdefault(resource, RateLimit())
+        limit.remaining = int(headers["X-RateLimit-Remaining"])
+        limit.reset = float(headers["X-RateLimit-Reset"])
+        limit.updated.set()
+
+    async def get(
+        self, session: ClientSession, path: str, params: dict, resource: str = "core"
+    ) -> dict:
+        """GETs an API path. `resource` is the rate limit bucket it counts against."""
+
+        key = (path, tuple(sorted(params.items())))
+        cached = self._etags.get(key)
+        headers = dict(self.headers)
+        if cached is not None:
+            headers["If-None-Match"] = cached[0]
+
+        await self._acquire(resource)
+        async with session.get(API + path, params=params, headers=headers) as r:
+            self._update_limit(resource, r.headers)
+            if r.status == 304:
+                return cached[1]
+            if r.status in (403, 429) and r.headers.get("X-RateLimit-Remaining") == "0":
+                raise ValueError(
+                    "GitHub's rate limit has been reached."
+                    f" Try again <t:{r.headers['X-RateLimit-Reset']}:R>."
+                )
+            if not r.ok:
+                raise ValueError("Couldn't retrieve data. Try again later.")
+            json = await r.json()
+            if "ETag" in r.headers:
+                self._etags[key] = (r.headers["ETag"], json)
+            return json
+
+    async def search_repositories(
+        self, session: ClientSession, query: str, count: int = 30
+    ) -> list[dict]:
+        json = await self.get(
+            session,
+            "/search/repositories",
+            {"q": query, "per_page": count},
+            resource="search",
+        )
+        return json["items"]
@@ -0,0 +1,105 @@
+"""Bitboard engine for N-in-a-row games such as Connect Four and Gomoku.
+
+Each player's stones are one integer bitmask, where the cell at (row, column)
+is bit `row * width + column` and row 0 is the top of the board.
+"""
+
+# right, down, down-right and down-left; each line is checked in one direction
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+class GridGame:
+    __slots__ = ("width", "height", "k", "full", "windows")
+
+    def __init__(self, width: int, height: int, k: int):
+        self.width = width
+        self.height = height
+        self.k = k
+        self.full = (1 << width * height) - 1
+        # every k-long window through each cell, so a win check after a move
+        # only looks at the at most 4 * k lines that move could have completed
+        self.windows: tuple[tuple[int, ...], ...] = tuple(
+            tuple(self._windows_through(cell)) for cell in range(width * height)
+        )
+
+    def _windows_through(self, cell: int):
+        row, column = divmod(cell, self.width)
+        for dr, dc in DIRECTIONS:
+            for offset in range(self.k):
+                start_row, start_column = row - dr * offset, column - dc * offset
+                end_row = start_row + dr * (self.k - 1)
+                end_column = start_column + dc * (self.k - 1)
+                if not (
+                    0 <= start_row < self.height
+                    and 0 <= end_row < self.height
+                    and 0 <= start_column < self.width
+                    and 0 <= end_column < self.width
+                ):
+                    continue
+                mask = 0
+                for step in range(self.k):
+                    mask |= 1 << self.index(
+                        start_row + dr * step, start_column + dc * step
+                    )
+                yield mask
+
+    def index(self, row: int, column: int) -> int:
+        return row * self.width + column
+
+    def wins(self, stones: int, cell: int) -> bool:
+        """Whether `stones` contain a line of k through `cell`, the last move."""
+        return any(stones & window == window for window in self.windows[cell])
+
+    def first_to_move(self, first: int, second: int) -> bool:
+        """Whether it is the first player's turn, given both players' stones."""
+        return first.bit_count() == second.bit_count()
+
+    def is_free(self, board: int, cell: int) -> bool:
+        return not board >> cell & 1
+
+    def drop(self, board: int, column: int) -> int | None:
+        """Returns the cell a stone dropped in a column lands on, or None if it is full."""
+        for row in range(self.height - 1, -1, -1):
+            cell = self.index(row, column)
+            if self.is_free(board, cell):
+                return cell
+        return None
+
+    def free_rows(self, board: int, column: int) -> list[int]:
+        return [
+            row
+            for row in range(self.height)
+            if self.is_free(board, self.index(row, column))
+        ]
+
+    def free_columns(self, board: int) -> list[int]:
+        return [
+            column
+            for column in range(self.width)
+            if any(
+                self.is_free(board, self.index(row, column))
+                for row in range(self.height)
+            )
+        ]
+
+    def play(self, first: int, second: int, cell: int) -> tuple[int, int, int | None]:
+        """Places a stone for the player to move.
+
+        Returns both players' new stones and the result: None while the game
+        goes on, 1 or 2 for the winning player, or 0 for a draw.
+        """
+        if self.first_to_move(first, second):
+            first |= 1 << cell
+            if self.wins(first, cell):
+                return first, second, 1
+        else:
+            second |= 1 << cell
+            if self.wins(second, cell):
+                return first, second, 2
+        if first | second == self.full:
+            return first, second, 0
+        return first, second, None
+
+
+CONNECT_FOUR = GridGame(7, 6, 4)
+GOMOKU = GridGame(9, 9, 5)
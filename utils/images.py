@@ -0,0 +1,237 @@
+"""Image rendering, run in the bot's process pool.
+
+Renderers take and return plain bytes so they can be pickled to a worker
+process. Fonts and static layers are cached per worker process.
+"""
+
+import asyncio
+import colorsys
+from concurrent.futures import Executor
+from functools import lru_cache
+from io import BytesIO
+
+import discord
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from config import config
+from utils.cache import LRUCache
+
+# avatar images by asset key, which changes whenever the avatar does
+AVATARS = LRUCache(256)
+# embed colours by avatar asset key
+COLOURS = LRUCache(4096)
+# avatar asset key -> the analysis in progress, shared by every lookup of it
+ANALYSES: dict[str, asyncio.Task] = {}
+
+# a cold colour lookup is a download and a pool round trip, and the commands
+# that use it reply without deferring, so it gives up after this many seconds
+COLOUR_TIMEOUT = 1.0
+
+# avatars are downsampled to at most this many pixels a side for colour analysis
+PALETTE_SAMPLE = 64
+
+QUOTE_SIZE = (1000, 400)
+# the avatar fills a square on the left, the text is laid out in the rest
+QUOTE_TEXT_BOX = (430, 40, 960, 320)
+
+
+async def read_avatar(asset: discord.Asset) -> bytes:
+    """Downloads a 256px PNG of an avatar, or returns the cached copy."""
+
+    data = AVATARS.get(asset.key)
+    if data is None:
+        data = await asset.replace(size=256, format="png").read()
+        AVATARS[asset.key] = data
+    return data
+
+
+def dominant_colours(avatar: bytes, count: int = 5) -> list[tuple[int, float]]:
+    """An avatar's most common colours, as (RGB integer, share of pixels).
+
+    Pixels are quantized to 4 bits per channel, and each of the 4096 buckets
+    is counted in one pass with np.bincount. A bucket's colour is the mean of
+    its pixels, not the corner of the bucket.
+    """
+
+    with Image.open(BytesIO(avatar)) as picture:
+        picture = picture.convert("RGBA")
+        picture.thumbnail((PALETTE_SAMPLE, PALETTE_SAMPLE), Image.Resampling.BILINEAR)
+        pixels = np.asarray(picture).reshape(-1, 4)
+    # transparent pixels aren't part of the avatar as anyone sees it
+    pixels = pixels[pixels[:, 3] >= 128, :3].astype(np.intp)
+    if not len(pixels):
+        return []
+
+    buckets = (pixels[:, 0] >> 4) << 8 | (pixels[:, 1] >> 4) << 4 | pixels[:, 2] >> 4
+    counts = np.bincount(buckets, minlength=4096)
+    top = np.argsort(counts)[::-1][:count]
+    top = top[counts[top] > 0]
+    sums = np.stack(
+        [np.bincount(buckets, pixels[:, c], minlength=4096)[top] for c in range(3)],
+        axis=1,
+    )
+    means = np.rint(sums / counts[top, None]).astype(int)
+    return [
+        ((r << 16) | (g << 8) | b, int(counts[n]) / len(pixels))
+        for (r, g, b), n in zip(means.tolist(), top.tolist())
+    ]
+
+
+def accent_colour(avatar: bytes) -> int | None:
+    """The colour of an avatar that suits an embed best, as an RGB integer.
+
+    Greys, near-blacks and near-whites are the most common colours of many
+    avatars but make a dull embed, so common colours are weighed by how
+    saturated they are, and only used if nothing colourful is left.
+    """
+
+    palette = dominant_colours(avatar)
+    if not palette:
+        return None
+    best, best_score = palette[0][0], 0.0
+    for colour, share in palette:
+        _, saturation, value = colorsys.rgb_to_hsv(
+            *(channel / 255 for channel in colour.to_bytes(3, "big"))
+        )
+        if value < 0.2 or saturation < 0.25:
+            continue
+        score = share * saturation
+        if score > best_score:
+            best, best_score = colour, score
+    return best
+
+
+async def _analyse_avatar(asset: discord.Asset, pool: Executor) -> int | None:
+    avatar = await read_avatar(asset)
+    colour = await asyncio.get_running_loop().run_in_executor(
+        pool, accent_colour, avatar
+    )
+    COLOURS[asset.key] = colour
+    return colour
+
+
+async def avatar_colour(
+    asset: discord.Asset,
+    pool: Executor,
+    default: int,
+    timeout: float | None = COLOUR_TIMEOUT,
+) -> int:
+    """An avatar's accent colour for embeds, analysed in `pool` on a cache miss.
+
+    `default` is used when the avatar can't be read, has no usable colour, or
+    takes longer than `timeout` seconds. A lookup that times out carries on in
+    the background, so the colour is cached for next time.
+    """
+
+    if asset.key in COLOURS:
+        colour = COLOURS.get(asset.key)
+        return default if colour is None else colour
+
+    task = ANALYSES.get(asset.key)
+    if task is None:
+        task = ANALYSES[asset.key] = asyncio.ensure_future(_analyse_avatar(asset, pool))
+        task.add_done_callback(lambda _: ANALYSES.pop(asset.key, None))
+        # retrieve the exception of a lookup nobody waits for any more
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    try:
+        colour = await asyncio.wait_for(asyncio.shield(task), timeout)
+    except (TimeoutError, discord.HTTPException, OSError, RuntimeError):
+        # RuntimeError includes BrokenProcessPool and a pool that was shut
+        # down. Nothing is cached on an error, so it is tried again next time.
+        return default
+    return default if colour is None else colour
+
+
+@lru_cache(maxsize=16)
+def font(size: int) -> ImageFont.FreeTypeFont:
+    path = config.get("quote_font")
+    if path:
+        return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=1)
+def quote_template() -> Image.Image:
+    """A black layer that fades in over the avatar, from clear to opaque."""
+
+    height = QUOTE_SIZE[1]
+    fade_start, fade_end = height // 3, height
+    alpha = Image.frombytes("L", (256, 1), bytes(range(256)))
+    alpha = alpha.resize((fade_end - fade_start, height))
+    mask = Image.new("L", QUOTE_SIZE, 255)
+    mask.paste(Image.new("L", (fade_start, height), 0), (0, 0))
+    mask.paste(alpha, (fade_start, 0))
+    layer = Image.new("RGBA", QUOTE_SIZE, (0, 0, 0, 255))
+    layer.putalpha(mask)
+    return layer
+
+
+def break_word(word: str, face: ImageFont.FreeTypeFont, width: int) -> list[str]:
+    """Splits a word wider than `width` into pieces that fit, a character at a time."""
+    pieces, piece = [], ""
+    for char in word:
+        if piece and face.getlength(piece + char) > width:
+            pieces.append(piece)
+            piece = char
+        else:
+            piece += char
+    pieces.append(piece)
+    return pieces
+
+
+def wrap(text: str, face: ImageFont.FreeTypeFont, width: int) -> list[str]:
+    lines, line = [], ""
+    words = (
+        piece
+        for word in text.split()
+        for piece in (
+            break_word(word, face, width) if face.getlength(word) > width else (word,)
+        )
+    )
+    for word in words:
+        candidate = f"{line} {word}" if line else word
+        if line and face.getlength(candidate) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def render_quote(avatar: bytes, text: str, name: str) -> bytes:
+    """Renders a quote image and returns it as PNG."""
+
+    height = QUOTE_SIZE[1]
+    image = Image.new("RGBA", QUOTE_SIZE, (0, 0, 0, 255))
+    with Image.open(BytesIO(avatar)) as picture:
+        picture = ImageOps.grayscale(picture.convert("RGB")).resize((height, height))
+    image.paste(picture, (0, 0))
+    image.alpha_composite(quote_template())
+
+    left, top, right, bottom = QUOTE_TEXT_BOX
+    # use the biggest font size that fits the box
+    for size in range(48, 15, -4):
+        face = font(size)
+        lines = wrap(text, face, right - left)
+        line_height = size * 5 // 4
+        if len(lines) * line_height <= bottom - top:
+            break
+
+    draw = ImageDraw.Draw(image)
+    y = top + (bottom - top - len(lines) * line_height) // 2
+    for line in lines:
+        x = left + (right - left - face.getlength(line)) / 2
+        draw.text((x, y), line, font=face, fill="white")
+        y += line_height
+
+    signature = f"- {name}"
+    name_face = font(28)
+    x = left + (right - left - name_face.getlength(signature)) / 2
+    draw.text((x, bottom + 20), signature, font=name_face, fill=(170, 170, 170))
+
+    output = BytesIO()
+    image.convert("RGB").save(output, "PNG", optimize=False)
+    return output.getvalue()
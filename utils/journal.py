@@ -0,0 +1,97 @@
+import time
+
+from utils.database import Database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mod_journal (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    guild_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    actor_id INTEGER NOT NULL,
+    -- a user ID for bans and timeouts, a channel ID for locks and purges
+    target_id INTEGER,
+    reason TEXT,
+    -- seconds, for timeouts, temporary bans and timed locks
+    duration INTEGER,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS mod_journal_guild_target
+    ON mod_journal (guild_id, target_id, created_at);
+CREATE INDEX IF NOT EXISTS mod_journal_guild_time
+    ON mod_journal (guild_id, created_at);
+CREATE TRIGGER IF NOT EXISTS mod_journal_no_update BEFORE UPDATE ON mod_journal
+BEGIN
+    SELECT RAISE(ABORT, 'mod_journal is append-only');
+END;
+CREATE TRIGGER IF NOT EXISTS mod_journal_no_delete BEFORE DELETE ON mod_journal
+BEGIN
+    SELECT RAISE(ABORT, 'mod_journal is append-only');
+END;
+"""
+
+
+class ModerationJournal:
+    """Append-only record of moderator actions.
+
+    `record` only appends to an in-memory buffer, so commands never wait on the
+    database. The owner is expected to call `flush` periodically, which writes
+    everything buffered so far in a single transaction.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._buffer: list[tuple] = []
+
+    async def create_schema(self) -> None:
+        await self.db.executescript(SCHEMA)
+
+    def record(
+        self,
+        action: str,
+        guild_id: int,
+        actor_id: int,
+        target_id: int | None = None,
+        reason: str | None = None,
+        duration: int | None = None,
+        details: str | None = None,
+    ) -> None:
+        self._buffer.append(
+            (
+                time.time(),
+                guild_id,
+                action,
+                actor_id,
+                target_id,
+                reason,
+                duration,
+                details,
+            )
+        )
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        try:
+            await self.db.executemany(
+                "INSERT INTO mod_journal (created_at, guild_id, action, actor_id,"
+                " target_id, reason, duration, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+        except Exception:
+            # keep the entries for the next attempt
+            self._buffer[:0] = batch
+            raise
+
+    async def history(self, guild_id: int, target_id: int) -> list[tuple]:
+        """Returns every action taken on a target in a guild, newest first."""
+
+        # make sure entries from the last few seconds are included
+        await self.flush()
+        return await self.db.execute(
+            "SELECT created_at, action, actor_id, reason, duration, details"
+            " FROM mod_journal WHERE guild_id = ? AND target_id = ?"
+            " ORDER BY created_at DESC",
+            (guild_id, target_id),
+        )
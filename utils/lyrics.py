@@ -0,0 +1,227 @@
+import re
+import time
+from typing import NamedTuple
+
+from utils.cache import LRUCache
+from utils.database import Database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lyrics (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL UNIQUE,
+    thumbnail TEXT,
+    lyrics TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    -- last time the song was fetched or found in the index, for eviction
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lyrics_used_at ON lyrics (used_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS lyrics_fts USING fts5 (
+    title, lyrics, content = 'lyrics', content_rowid = 'id'
+);
+CREATE TRIGGER IF NOT EXISTS lyrics_fts_insert AFTER INSERT ON lyrics BEGIN
+    INSERT INTO lyrics_fts (rowid, title, lyrics)
+        VALUES (new.id, new.title, new.lyrics);
+END;
+CREATE TRIGGER IF NOT EXISTS lyrics_fts_delete AFTER DELETE ON lyrics BEGIN
+    INSERT INTO lyrics_fts (lyrics_fts, rowid, title, lyrics)
+        VALUES ('delete', old.id, old.title, old.lyrics);
+END;
+CREATE TRIGGER IF NOT EXISTS lyrics_fts_update AFTER UPDATE OF title, lyrics ON lyrics
+BEGIN
+    INSERT INTO lyrics_fts (lyrics_fts, rowid, title, lyrics)
+        VALUES ('delete', old.id, old.title, old.lyrics);
+    INSERT INTO lyrics_fts (rowid, title, lyrics)
+        VALUES (new.id, new.title, new.lyrics);
+END;
+"""
+
+# databases made before the index have the table without used_at
+MIGRATION = """
+ALTER TABLE lyrics ADD COLUMN used_at REAL NOT NULL DEFAULT 0;
+UPDATE lyrics SET used_at = fetched_at;
+"""
+
+PAGE_LENGTH = 2000
+# once the stored lyrics add up to more characters than this, the songs that
+# were used least recently are evicted
+MAX_INDEX_SIZE = 20_000_000
+# a query with at least this many words may match a line of the lyrics,
+# shorter ones only match whole titles
+MIN_LINE_WORDS = 5
+# titles containing every word of the query, checked for the exact title
+TITLE_CANDIDATES = 20
+
+
+def fts_terms(query: str) -> list[str]:
+    """Splits a query into quoted FTS5 strings, so no word is read as syntax."""
+    return ['"' + word.replace('"', '""') + '"' for word in query.split()]
+
+
+def normalize(text: str) -> str:
+    """Lowercase words without punctuation, to compare titles."""
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+
+def paginate(text: str, limit: int = PAGE_LENGTH) -> tuple[int, ...]:
+    """Splits text into pages of at most `limit` characters.
+
+    Pages break between stanzas where possible, then between lines. Returns
+    the offset each page starts at, followed by the length of the text, so
+    page n is `text[offsets[n]:offsets[n + 1]]`.
+    """
+
+    offsets = [0]
+    while len(text) - offsets[-1] > limit:
+        start = offsets[-1]
+        end = start + limit
+        for separator in ("\n\n", "\n"):
+            cut = text.rfind(separator, start + 1, end)
+            if cut != -1:
+                end = cut + len(separator)
+                break
+        offsets.append(end)
+    offsets.append(len(text))
+    return tuple(offsets)
+
+
+class Song(NamedTuple):
+    id: int
+    title: str
+    url: str
+    thumbnail: str | None
+    lyrics: str
+    offsets: tuple[int, ...]
+
+    @property
+    def pages(self) -> int:
+        return len(self.offsets) - 1
+
+    def page(self, number: int) -> str:
+        return self.lyrics[self.offsets[number] : self.offsets[number + 1]].strip()
+
+
+class LyricsStore:
+    """Songs that have been looked up, so their pages can be shown again later.
+
+    Songs are stored in SQLite and referenced from components by ID. Recently
+    used songs stay in memory along with their page offsets, so turning a
+    page is a slice of a cached string.
+
+    Stored songs are also indexed with FTS5, so a song that was fetched once
+    can be found again by its title or a line of its lyrics without asking
+    the API.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._cache = LRUCache(64)
+
+    async def create_schema(self) -> None:
+        columns = await self.db.execute("SELECT name FROM pragma_table_info('lyrics')")
+        migrate = bool(columns) and ("used_at",) not in columns
+        if migrate:
+            await self.db.executescript(MIGRATION)
+        await self.db.executescript(SCHEMA)
+        if migrate:
+            # the triggers only index songs stored from now on
+            await self.db.execute(
+                "INSERT INTO lyrics_fts (lyrics_fts) VALUES ('rebuild')"
+            )
+
+    def _song(self, row: tuple) -> Song:
+        song = Song(*row, paginate(row[4]))
+        self._cache[song.id] = song
+        return song
+
+    async def save(
+        self, title: str, url: str, thumbnail: str | None, lyrics: str
+    ) -> Song:
+        now = time.time()
+        rows = await self.db.execute(
+            "INSERT INTO lyrics (title, url, thumbnail, lyrics, fetched_at, used_at)"
+            " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET"
+            " title = excluded.title, thumbnail = excluded.thumbnail,"
+            " lyrics = excluded.lyrics, fetched_at = excluded.fetched_at,"
+            " used_at = excluded.used_at"
+            " RETURNING id, title, url, thumbnail, lyrics",
+            (title, url, thumbnail, lyrics, now, now),
+        )
+        song = self._song(rows[0])
+        await self.evict()
+        return song
+
+    async def evict(self) -> None:
+        rows = await self.db.execute(
+            "DELETE FROM lyrics WHERE id IN (SELECT id FROM ("
+            " SELECT id, SUM(length(lyrics)) OVER (ORDER BY used_at DESC) AS total"
+            " FROM lyrics) WHERE total > ?) RETURNING id",
+            (MAX_INDEX_SIZE,),
+        )
+        for (song_id,) in rows:
+            self._cache.pop(song_id)
+
+    async def search(self, query: str) -> Song | None:
+        """Finds a stored song by its whole title, or a line only it has.
+
+        Anything looser would answer "hello" with whichever stored song has
+        that word in its title, so every other query goes to the API.
+        """
+
+        terms = fts_terms(query)
+        if not terms:
+            return None
+        song_id = None
+        rows = await self.db.execute(
+            "SELECT rowid, title FROM lyrics_fts WHERE lyrics_fts MATCH ?"
+            " ORDER BY rank LIMIT ?",
+            ("title : (" + " ".join(terms) + ")", TITLE_CANDIDATES),
+        )
+        key = normalize(query)
+        for rowid, title in rows:
+            if normalize(title) == key:
+                song_id = rowid
+                break
+
+        if song_id is None and len(terms) >= MIN_LINE_WORDS:
+            rows = await self.db.execute(
+                "SELECT rowid FROM lyrics_fts WHERE lyrics_fts MATCH ? LIMIT 2",
+                ("lyrics : " + " + ".join(terms),),
+            )
+            # a line in more than one song doesn't say which one was meant
+            if len(rows) == 1:
+                song_id = rows[0][0]
+
+        if song_id is None:
+            return None
+        await self.db.execute(
+            "UPDATE lyrics SET used_at = ? WHERE id = ?", (time.time(), song_id)
+        )
+        return await self.get(song_id)
+
+    async def suggest(self, query: str, limit: int = 25) -> list[str]:
+        """Titles of stored songs with words starting with the words typed so far."""
+
+        terms = fts_terms(query)
+        if not terms:
+            rows = await self.db.execute(
+                "SELECT title FROM lyrics ORDER BY used_at DESC LIMIT ?", (limit,)
+            )
+        else:
+            rows = await self.db.execute(
+                "SELECT title FROM lyrics_fts WHERE lyrics_fts MATCH ?"
+                " ORDER BY rank LIMIT ?",
+                ("title : (" + " ".join(term + "*" for term in terms) + ")", limit),
+            )
+        return [title for (title,) in rows]
+
+    async def get(self, song_id: int) -> Song | None:
+        song = self._cache.get(song_id)
+        if song is not None:
+            return song
+        rows = await self.db.execute(
+            "SELECT id, title, url, thumbnail, lyrics FROM lyrics WHERE id = ?",
+            (song_id,),
+        )
+        return self._song(rows[0]) if rows else None
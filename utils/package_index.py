@@ -0,0 +1,140 @@
+"""Package name index for /pypi and /npm autocomplete.
+
+An index is a single file that is memory-mapped, so it costs no start-up time
+and its pages are shared with the OS cache:
+
+    magic, count          8 bytes + uint32
+    offsets               uint32 * (count + 1), into names
+    ranks                 uint32 * count, 0 for the most downloaded package
+    names                 UTF-8, sorted, without separators
+
+Names are sorted, so the names starting with a prefix are one contiguous
+range, found with two binary searches. The most popular names in that range
+are picked with NumPy.
+
+Indexes are built offline from a snapshot of a registry's package names:
+
+    python -m utils.package_index pypi snapshot.txt indexes/pypi.idx
+
+where each line of the snapshot is a name, optionally followed by a tab and
+its download count.
+"""
+
+import bisect
+import mmap
+import re
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b"PKGIDX1\0"
+HEADER = struct.Struct("<8sI")
+
+
+def normalize(name: str, registry: str) -> str:
+    if registry == "pypi":
+        # PEP 503, which pypi.org also accepts in URLs
+        return re.sub(r"[-_.]+", "-", name).lower()
+    return name.lower()
+
+
+class _Names:
+    """Sequence view of the names in an index, for bisect."""
+
+    __slots__ = ("data", "offsets", "base")
+
+    def __init__(self, data: mmap.mmap, offsets: np.ndarray, base: int):
+        self.data = data
+        self.offsets = offsets
+        self.base = base
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.data[self.base + start : self.base + end]
+
+
+class PackageIndex:
+    def __init__(self, path: str, registry: str):
+        self.registry = registry
+        with open(path, "rb") as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a package index")
+
+        position = HEADER.size
+        offsets = np.frombuffer(self._data, "<u4", count + 1, position)
+        position += offsets.nbytes
+        self._ranks = np.frombuffer(self._data, "<u4", count, position)
+        position += self._ranks.nbytes
+        self._names = _Names(self._data, offsets, position)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def search(self, prefix: str, limit: int = 25) -> list[str]:
+        """The most downloaded packages whose name starts with `prefix`."""
+
+        key = normalize(prefix.strip(), self.registry).encode()
+        start = bisect.bisect_left(self._names, key)
+        # 0xFF never occurs in UTF-8, so this sorts after every name with the prefix
+        end = bisect.bisect_left(self._names, key + b"\xff", start)
+        if start == end:
+            return []
+
+        ranks = self._ranks[start:end]
+        if len(ranks) > limit:
+            top = np.argpartition(ranks, limit)[:limit]
+            top = top[np.argsort(ranks[top])]
+        else:
+            top = np.argsort(ranks)
+        names = [self._names[start + int(n)].decode() for n in top]
+        # an exact match is probably what's being typed, so it goes first
+        if self._names[start] == key:
+            exact = key.decode()
+            names = [exact] + [name for name in names if name != exact][: limit - 1]
+        return names
+
+    def close(self) -> None:
+        self._data.close()
+
+
+def build(packages: dict[str, int], path: str) -> None:
+    """Writes an index of package names to their download counts."""
+
+    names = sorted(packages)
+    encoded = [name.encode() for name in names]
+    offsets = np.zeros(len(names) + 1, "<u4")
+    offsets[1:] = np.cumsum([len(name) for name in encoded])
+    # rank by downloads, most first, then by name
+    order = sorted(range(len(names)), key=lambda n: (-packages[names[n]], n))
+    ranks = np.empty(len(names), "<u4")
+    ranks[order] = np.arange(len(names))
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(names)))
+        file.write(offsets.tobytes())
+        file.write(ranks.tobytes())
+        file.write(b"".join(encoded))
+
+
+def read_snapshot(path: str, registry: str) -> dict[str, int]:
+    packages: dict[str, int] = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            name, _, downloads = line.strip().partition("\t")
+            if not name:
+                continue
+            name = normalize(name, registry)
+            packages[name] = max(packages.get(name, 0), int(downloads or 0))
+    return packages
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("pypi", "npm"):
+        sys.exit("usage: python -m utils.package_index pypi|npm SNAPSHOT OUTPUT")
+    build(read_snapshot(sys.argv[2], sys.argv[1]), sys.argv[3])
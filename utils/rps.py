@@ -0,0 +1,117 @@
+"""Rock Paper Scissors outcomes and tournament brackets."""
+
+import random
+from array import array
+
+ROCK, PAPER, SCISSORS = 0, 1, 2
+NOT_CHOSEN = 3
+CHOICES = (("Rock", "🪨"), ("Paper", "📄"), ("Scissors", "✂️"))
+
+# match outcomes, from the point of view of the first player
+TIE, FIRST, SECOND, NEITHER = 0, 1, 2, 3
+
+
+def _outcome(first: int, second: int) -> int:
+    if first == NOT_CHOSEN and second == NOT_CHOSEN:
+        return NEITHER
+    if second == NOT_CHOSEN:
+        return FIRST
+    if first == NOT_CHOSEN:
+        return SECOND
+    return (TIE, FIRST, SECOND)[(first - second) % 3]
+
+
+# OUTCOMES[first * 4 + second], where a player who didn't choose forfeits
+OUTCOMES = bytes(_outcome(first, second) for first in range(4) for second in range(4))
+
+NO_OPPONENT = 0xFFFF
+
+
+class Bracket:
+    """A single-elimination tournament, played in rounds of simultaneous matches.
+
+    Players are numbered by slot, and all per-player state lives in flat
+    arrays indexed by slot, so even a few hundred players only cost a few
+    bytes each.
+    """
+
+    __slots__ = ("ids", "slots", "alive", "picks", "opponent", "results", "pending")
+
+    def __init__(self, user_ids: list[int]):
+        count = len(user_ids)
+        self.ids = array("Q", user_ids)
+        self.slots = {user_id: slot for slot, user_id in enumerate(user_ids)}
+        self.alive = bytearray(b"\x01") * count
+        self.picks = bytearray([NOT_CHOSEN]) * count
+        self.opponent = array("H", [NO_OPPONENT]) * count
+        # (winner, loser, winner's pick, loser's pick) for matches decided this round
+        self.results: list[tuple[int, int, int, int]] = []
+        # matches in the current round that are not decided yet
+        self.pending = 0
+
+    def remaining(self) -> int:
+        return self.alive.count(1)
+
+    def winner(self) -> int | None:
+        if self.remaining() != 1:
+            return None
+        return self.ids[self.alive.index(1)]
+
+    def start_round(self, rng: random.Random) -> int | None:
+        """Pairs up the players still in. Returns the slot that gets a bye, if any."""
+
+        slots = [slot for slot, alive in enumerate(self.alive) if alive]
+        rng.shuffle(slots)
+        bye = slots.pop() if len(slots) % 2 else None
+        for first, second in zip(slots[::2], slots[1::2]):
+            self.opponent[first] = second
+            self.opponent[second] = first
+            self.picks[first] = self.picks[second] = NOT_CHOSEN
+        self.results = []
+        self.pending = len(slots) // 2
+        return bye
+
+    def pick(self, slot: int, choice: int) -> int | None:
+        """Records a player's pick.
+
+        Returns None until the opponent has picked too, then the outcome from
+        this player's point of view. On a tie both picks are cleared so the
+        match is replayed.
+        """
+
+        opponent = self.opponent[slot]
+        self.picks[slot] = choice
+        if self.picks[opponent] == NOT_CHOSEN:
+            return None
+
+        outcome = OUTCOMES[choice * 4 + self.picks[opponent]]
+        if outcome == TIE:
+            self.picks[slot] = self.picks[opponent] = NOT_CHOSEN
+        else:
+            self._decide(slot if outcome == FIRST else opponent)
+        return outcome
+
+    def finish_round(self, rng: random.Random) -> None:
+        """Decides every match still open when the round's time runs out.
+
+        A player who picked beats one who didn't; ties and matches where
+        nobody picked are decided by a coin flip.
+        """
+
+        for slot, opponent in enumerate(self.opponent):
+            if opponent == NO_OPPONENT or opponent < slot:
+                continue
+            outcome = OUTCOMES[self.picks[slot] * 4 + self.picks[opponent]]
+            if outcome == FIRST:
+                self._decide(slot)
+            elif outcome == SECOND:
+                self._decide(opponent)
+            else:
+                self._decide(rng.choice((slot, opponent)))
+
+    def _decide(self, winner: int) -> None:
+        loser = self.opponent[winner]
+        self.alive[loser] = 0
+        self.opponent[winner] = self.opponent[loser] = NO_OPPONENT
+        self.results.append((winner, loser, self.picks[winner], self.picks[loser]))
+        self.pending -= 1
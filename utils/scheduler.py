@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import NamedTuple
+
+from utils.database import Database
+from utils.workers import WorkerPool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_actions (
+    id INTEGER PRIMARY KEY,
+    due REAL NOT NULL,
+    action TEXT NOT NULL,
+    guild_id INTEGER NOT NULL,
+    target_id INTEGER NOT NULL,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS scheduled_actions_target
+    ON scheduled_actions (action, guild_id, target_id);
+"""
+
+
+class ScheduledAction(NamedTuple):
+    due: float
+    id: int
+    action: str
+    guild_id: int
+    target_id: int
+    payload: dict | None
+
+
+class Scheduler:
+    """Runs actions (like lifting a temporary ban) at a later time.
+
+    Pending actions are stored in SQLite and mirrored in an in-memory heap, so a
+    single task can sleep until the earliest one is due no matter how many are
+    pending. Every action due within `coalesce` seconds of the earliest one
+    fires in the same tick, through a WorkerPool.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        wait_until_ready: Callable[[], Awaitable] | None = None,
+        coalesce: float = 1.0,
+    ):
+        self.db = db
+        self.wait_until_ready = wait_until_ready
+        self.coalesce = coalesce
+        self.pool = WorkerPool(limit=10)
+        self._handlers: dict[str, Callable[[ScheduledAction], Awaitable]] = {}
+        self._heap: list[ScheduledAction] = []
+        self._cancelled: set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _from_row(row: tuple) -> ScheduledAction:
+        return ScheduledAction(*row[:5], json.loads(row[5]) if row[5] else None)
+
+    def register(
+        self, action: str, handler: Callable[[ScheduledAction], Awaitable]
+    ) -> None:
+        self._handlers[action] = handler
+
+    async def start(self) -> None:
+        await self.db.executescript(SCHEMA)
+        rows = await self.db.execute(
+            "SELECT due, id, action, guild_id, target_id, payload FROM scheduled_actions"
+        )
+        self._heap = [self._from_row(row) for row in rows]
+        heapq.heapify(self._heap)
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    def __len__(self) -> int:
+        return len(self._heap) - len(self._cancelled)
+
+    async def schedule(
+        self,
+        action: str,
+        due: float,
+        guild_id: int,
+        target_id: int,
+        payload: dict | None = None,
+    ) -> None:
+        """Schedule an action to run at the `due` UNIX timestamp."""
+
+        rows = await self.db.execute(
+            "INSERT INTO scheduled_actions (due, action, guild_id, target_id, payload)"
+            " VALUES (?, ?, ?, ?, ?) RETURNING id",
+            (
+                due,
+                action,
+                guild_id,
+                target_id,
+                json.dumps(payload) if payload else None,
+            ),
+        )
+        entry = ScheduledAction(due, rows[0][0], action, guild_id, target_id, payload)
+        heapq.heappush(self._heap, entry)
+        # only wake the runner if the new action is now the earliest one
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    async def cancel(
+        self, action: str, guild_id: int, target_id: int, **payload
+    ) -> list[ScheduledAction]:
+        """Cancel pending actions of a kind for a target and return them.
+
+        Keyword arguments only cancel the actions whose payload has those
+        values, for targets that can have several pending, like a channel
+        locked for more than one role.
+        """
+
+        query = "DELETE FROM scheduled_actions WHERE action = ? AND guild_id = ? AND target_id = ?"
+        params = [action, guild_id, target_id]
+        for key, value in payload.items():
+            query += " AND json_extract(payload, ?) = ?"
+            params += [f"$.{key}", value]
+        rows = await self.db.execute(
+            query + " RETURNING due, id, action, guild_id, target_id, payload",
+            params,
+        )
+        cancelled = [self._from_row(row) for row in rows]
+        # entries are dropped from the heap lazily, when they reach the top
+        self._cancelled.update(entry.id for entry in cancelled)
+        return cancelled
+
+    def _pop_due(self) -> list[ScheduledAction]:
+        batch = []
+        cutoff = time.time() + self.coalesce
+        while self._heap and self._heap[0].due <= cutoff:
+            entry = heapq.heappop(self._heap)
+            if entry.id in self._cancelled:
+                self._cancelled.discard(entry.id)
+            else:
+                batch.append(entry)
+        return batch
+
+    async def _dispatch(self, entry: ScheduledAction) -> None:
+        handler = self._handlers.get(entry.action)
+        if handler is None:
+            raise LookupError(f"No handler registered for '{entry.action}'")
+        await handler(entry)
+
+    async def _run(self) -> None:
+        if self.wait_until_ready is not None:
+            await self.wait_until_ready()
+
+        while True:
+            timeout = self._heap[0].due - time.time() if self._heap else None
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+            batch = self._pop_due()
+            if not batch:
+                continue
+
+            # an exception here would end the task, and with it every pending
+            # action, so errors are logged and the loop carries on
+            try:
+                await self._fire(batch)
+            except Exception:
+                logging.exception("Failed to run scheduled actions")
+
+    async def _fire(self, batch: list[ScheduledAction]) -> None:
+        # the pool catches each action's errors, so one can't stop the others
+        for result in await self.pool.run(batch, self._dispatch):
+            if not result.ok:
+                logging.error(
+                    f"Scheduled action '{result.item.action}' (ID {result.item.id}) failed: {result.error}"
+                )
+        self._cancelled.difference_update(entry.id for entry in batch)
+        # failed actions are not retried, they usually fail because the
+        # guild, channel or ban no longer exists
+        await self.db.executemany(
+            "DELETE FROM scheduled_actions WHERE id = ?",
+            [(entry.id,) for entry in batch],
+        )
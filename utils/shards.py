@@ -0,0 +1,156 @@
+import math
+import statistics
+import time
+from collections import Counter, deque
+
+import discord
+
+# seconds between samples of every shard
+SAMPLE_INTERVAL = 30
+# samples kept per shard, one hour's worth
+HISTORY = 120
+# a shard is flagged as degraded when it is down, or its latency is over
+# DEGRADED_FACTOR times the median, clamped to DEGRADED_LATENCY (seconds)
+DEGRADED_FACTOR = 3
+DEGRADED_LATENCY = (0.25, 1.0)
+
+
+class ShardHealth:
+    """What is known about one shard, with recent samples in ring buffers."""
+
+    __slots__ = (
+        "latencies",
+        "event_rates",
+        "guilds",
+        "connects",
+        "resumes",
+        "disconnects",
+        "sequence",
+    )
+
+    def __init__(self):
+        # heartbeat latency in seconds, NaN while the shard is down
+        self.latencies: deque[float] = deque(maxlen=HISTORY)
+        # gateway events per second between samples
+        self.event_rates: deque[float] = deque(maxlen=HISTORY)
+        self.guilds = 0
+        self.connects = 0
+        self.resumes = 0
+        self.disconnects = 0
+        self.sequence: int | None = None
+
+    @property
+    def latency(self) -> float:
+        return self.latencies[-1] if self.latencies else math.nan
+
+    @property
+    def event_rate(self) -> float:
+        return self.event_rates[-1] if self.event_rates else math.nan
+
+    def peak_latency(self) -> float:
+        up = [latency for latency in self.latencies if not math.isnan(latency)]
+        return max(up, default=math.nan)
+
+
+def _sequence(shard: discord.ShardInfo) -> int | None:
+    # discord.py doesn't count events per shard, but the gateway numbers
+    # every event it sends, so the sequence number is a free event counter
+    ws = getattr(shard._parent, "ws", None)
+    return getattr(ws, "sequence", None)
+
+
+class ShardMonitor:
+    """Per-shard latency, event throughput, guild and reconnect counts.
+
+    Connection changes are counted as the bot's shard events arrive, the rest
+    is sampled every SAMPLE_INTERVAL seconds, so tracking costs nothing per
+    gateway event.
+    """
+
+    def __init__(self, bot: discord.AutoShardedClient):
+        self.bot = bot
+        self.shards: dict[int, ShardHealth] = {}
+        self._sampled_at: float | None = None
+
+    def get(self, shard_id: int) -> ShardHealth:
+        health = self.shards.get(shard_id)
+        if health is None:
+            health = self.shards[shard_id] = ShardHealth()
+        return health
+
+    def connected(self, shard_id: int) -> None:
+        self.get(shard_id).connects += 1
+
+    def resumed(self, shard_id: int) -> None:
+        self.get(shard_id).resumes += 1
+
+    def disconnected(self, shard_id: int) -> None:
+        self.get(shard_id).disconnects += 1
+
+    def sample(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._sampled_at if self._sampled_at is not None else None
+        self._sampled_at = now
+        guilds = Counter(guild.shard_id for guild in self.bot.guilds)
+
+        for shard_id, shard in self.bot.shards.items():
+            health = self.get(shard_id)
+            health.guilds = guilds[shard_id]
+            up = not shard.is_closed() and math.isfinite(shard.latency)
+            health.latencies.append(shard.latency if up else math.nan)
+
+            sequence = _sequence(shard)
+            if elapsed and sequence is not None and health.sequence is not None:
+                # the sequence starts again from 1 on a new session
+                events = sequence - health.sequence
+                if events < 0:
+                    events = sequence
+                health.event_rates.append(events / elapsed)
+            health.sequence = sequence
+
+    def degraded(self) -> list[int]:
+        """Shards that are down, or much slower than the others."""
+
+        latencies = [
+            health.latency
+            for health in self.shards.values()
+            if not math.isnan(health.latency)
+        ]
+        lower, upper = DEGRADED_LATENCY
+        threshold = upper
+        if latencies:
+            threshold = min(
+                upper, max(lower, statistics.median(latencies) * DEGRADED_FACTOR)
+            )
+        return [
+            shard_id
+            for shard_id, health in sorted(self.shards.items())
+            if math.isnan(health.latency) or health.latency > threshold
+        ]
+
+    def table(self) -> str:
+        """A fixed-width table of every shard, degraded ones marked with !."""
+
+        degraded = set(self.degraded())
+        lines = ["  ID   ping   peak   ev/s  guilds  conn  res  disc"]
+        for shard_id, health in sorted(self.shards.items()):
+            lines.append(
+                f"{'!' if shard_id in degraded else ' '}"
+                f"{shard_id:>3}"
+                f" {_ms(health.latency):>6}"
+                f" {_ms(health.peak_latency()):>6}"
+                f" {_number(health.event_rate):>6}"
+                f" {health.guilds:>7}"
+                f" {health.connects:>5}"
+                f" {health.resumes:>4}"
+                f" {health.disconnects:>5}"
+            )
+        return "\n".join(lines)
+
+
+def _ms(seconds: float) -> str:
+    return "down" if math.isnan(seconds) else f"{seconds * 1000:.0f}"
+
+
+def _number(value: float) -> str:
+    return "-" if math.isnan(value) else f"{value:.1f}"
@@ -0,0 +1,66 @@
+"""Text effects for /text.
+
+Every effect is a `str.translate` table, a slice or a few `str.replace`
+calls, so the work happens in C instead of a Python loop over each character.
+"""
+
+import string
+
+SMALL_CAPS = str.maketrans(string.ascii_lowercase, "ᴀʙᴄᴅᴇꜰɢʜɪᴊᴋʟᴍɴᴏᴘǫʀꜱᴛᴜᴠᴡxʏᴢ")
+# printable ASCII maps to the Halfwidth and Fullwidth Forms block
+FULLWIDTH = str.maketrans(
+    {chr(code): chr(code + 0xFEE0) for code in range(0x21, 0x7F)} | {" ": "　"}
+)
+LEET = str.maketrans("AaEeIiOoSsTt", "443311005577")
+UWU = str.maketrans("RrLl", "WwWw")
+# a handful of str.replace calls beat one regex substitution with a group here
+UWU_NY = tuple((n + vowel, n + "y" + vowel) for n in "nN" for vowel in "aeiouAEIOU")
+
+
+def mock(text: str) -> str:
+    lower, upper = text.lower(), text.upper()
+    if text.isascii():
+        mocked = bytearray(lower, "ascii")
+        mocked[1::2] = upper.encode("ascii")[1::2]
+        return mocked.decode("ascii")
+    if len(lower) == len(upper) == len(text):
+        mocked = list(lower)
+        mocked[1::2] = upper[1::2]
+        return "".join(mocked)
+    # some characters change length with their case, like ß -> SS
+    return "".join(
+        char.upper() if n % 2 else char.lower() for n, char in enumerate(text)
+    )
+
+
+def uwu(text: str) -> str:
+    text = text.translate(UWU)
+    for old, new in UWU_NY:
+        text = text.replace(old, new)
+    return text
+
+
+def small_caps(text: str) -> str:
+    return text.lower().translate(SMALL_CAPS)
+
+
+def fullwidth(text: str) -> str:
+    return text.translate(FULLWIDTH)
+
+
+def reverse(text: str) -> str:
+    return text[::-1]
+
+
+def leetspeak(text: str) -> str:
+    return text.translate(LEET)
+
+
+EFFECTS = {
+    "mock": mock,
+    "uwu": uwu,
+    "small caps": small_caps,
+    "fullwidth": fullwidth,
+    "reverse": reverse,
+    "leetspeak": leetspeak,
+}
@@ -0,0 +1,75 @@
+"""Bitboard Tic Tac Toe.
+
+A board is two 9-bit masks, one per player, where cell `y * 3 + x` is bit
+`1 << (y * 3 + x)`. X always moves first, so the player to move follows from
+the number of marks on the board.
+"""
+
+FULL = 0b111_111_111
+WIN_MASKS = (
+    0b000_000_111,
+    0b000_111_000,
+    0b111_000_000,
+    0b001_001_001,
+    0b010_010_010,
+    0b100_100_100,
+    0b100_010_001,
+    0b001_010_100,
+)
+# the lines that pass through each cell, so a move is checked against 2-4 masks
+LINES_THROUGH = tuple(
+    tuple(mask for mask in WIN_MASKS if mask >> cell & 1) for cell in range(9)
+)
+
+
+def wins(bits: int, cell: int) -> bool:
+    """Whether the player owning `bits` completed a line by playing `cell`."""
+    return any(bits & mask == mask for mask in LINES_THROUGH[cell])
+
+
+def x_to_move(x: int, o: int) -> bool:
+    return x.bit_count() == o.bit_count()
+
+
+def _solve(x: int, o: int, table: dict) -> int:
+    """Negamax over every position reachable from (x, o), filling `table`.
+
+    Scores are from the point of view of the player to move: positive is a
+    win, and quicker wins (or slower losses) score further from zero.
+    """
+
+    key = (x, o)
+    if key in table:
+        return table[key][0]
+
+    x_turn = x_to_move(x, o)
+    mine, theirs = (x, o) if x_turn else (o, x)
+    free = FULL & ~(x | o)
+    best_score, best_cell = -100, None
+    for cell in range(9):
+        bit = 1 << cell
+        if not free & bit:
+            continue
+        if wins(mine | bit, cell):
+            score = (free & ~bit).bit_count() + 1
+        elif free == bit:
+            score = 0
+        else:
+            child = (x | bit, o) if x_turn else (x, o | bit)
+            score = -_solve(*child, table)
+        if score > best_score:
+            best_score, best_cell = score, cell
+
+    table[key] = (best_score, best_cell)
+    return best_score
+
+
+# every non-terminal position reachable in a game, shared by all games
+# (a few thousand entries, solved once when the module is imported)
+TRANSPOSITIONS: dict[tuple[int, int], tuple[int, int]] = {}
+_solve(0, 0, TRANSPOSITIONS)
+
+
+def best_move(x: int, o: int) -> int:
+    """Returns the best cell for the player to move. The game must not be over."""
+    return TRANSPOSITIONS[x, o][1]
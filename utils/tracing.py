@@ -0,0 +1,320 @@
+"""Sampled tracing of slash command interactions.
+
+A sampled interaction gets a root span for its whole dispatch, with child
+spans for each check (cooldowns included), each HTTP request made while it
+runs (upstream APIs and Discord alike, so deferrals, responses and followups
+show up too), and anything wrapped in `span()`. Spans are written one per
+line to a rotating JSONL file, in the shape of OTLP/JSON spans, from a
+background thread.
+
+When an interaction isn't sampled there is no current span and every hook
+returns after one ContextVar lookup. When tracing is off (`trace_sample_rate`
+unset or 0) none of the hooks are installed at all.
+"""
+
+import json
+import logging
+import random
+import re
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+from types import SimpleNamespace
+from typing import Any
+
+import aiohttp
+import discord
+from discord import app_commands
+from discord.utils import maybe_coroutine
+from yarl import URL
+
+current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+# interaction callback types, to tell a deferral from a response
+CALLBACK_TYPES = {
+    4: "interaction.response",
+    5: "interaction.defer",
+    6: "interaction.defer_update",
+    7: "interaction.edit_message",
+    8: "interaction.autocomplete",
+    9: "interaction.modal",
+}
+CALLBACK_TYPE_RE = re.compile(rb'"type":\s*(\d+)')
+# the interaction token in any interaction or webhook route, including the
+# followup message routes
+TOKEN_SEGMENT_RE = re.compile(r"(/(?:interactions|webhooks)/\d+/)[^/]+")
+DISCORD_ROUTES = (
+    (
+        re.compile(r"^/api/v\d+/interactions/\d+/[^/]+/callback$"),
+        "interaction.callback",
+    ),
+    (re.compile(r"^/api/v\d+/webhooks/\d+/[^/]+$"), "interaction.followup"),
+    (
+        re.compile(r"^/api/v\d+/webhooks/\d+/[^/]+/messages/@original$"),
+        "interaction.original",
+    ),
+    (
+        re.compile(r"^/api/v\d+/webhooks/\d+/[^/]+/messages/\d+$"),
+        "interaction.followup_message",
+    ),
+)
+
+
+def _value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # 64-bit integers are strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    __slots__ = (
+        "tracer",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "kind",
+        "start",
+        "end",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        kind: str = "INTERNAL",
+        parent: "Span | None" = None,
+        attributes: dict | None = None,
+    ):
+        self.tracer = tracer
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end: int | None = None
+        self.attributes = attributes or {}
+        self.error: str | None = None
+
+    def child(self, name: str, kind: str = "INTERNAL", **attributes) -> "Span":
+        return Span(self.tracer, name, kind, self, attributes)
+
+    def finish(self) -> None:
+        self.end = time.time_ns()
+        self.tracer.export(self)
+
+    def to_json(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": f"SPAN_KIND_{self.kind}",
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [
+                {"key": key, "value": _value(value)}
+                for key, value in self.attributes.items()
+                if value is not None
+            ],
+            "status": (
+                {"code": "STATUS_CODE_ERROR", "message": self.error}
+                if self.error is not None
+                else {"code": "STATUS_CODE_OK"}
+            ),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span | None]:
+    """Times a block as a child of the current span, if there is one."""
+
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = parent.child(name, **attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = repr(e)
+        raise
+    finally:
+        current_span.reset(token)
+        child.finish()
+
+
+class Tracer:
+    def __init__(self, path: str, sample_rate: float):
+        self.sample_rate = sample_rate
+        # spans are queued and written by a thread, so a slow disk never
+        # blocks the event loop
+        queue = SimpleQueue()
+        self.logger = logging.getLogger("1bot.traces")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(QueueHandler(queue))
+        handler = RotatingFileHandler(
+            path, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8"
+        )
+        self.listener = QueueListener(queue, handler)
+        self.listener.start()
+
+    def sample(self, name: str, **attributes) -> Span | None:
+        """A root span, or None if this trace isn't sampled."""
+
+        if random.random() >= self.sample_rate:
+            return None
+        return Span(self, name, "SERVER", attributes=attributes)
+
+    def export(self, span: Span) -> None:
+        self.logger.info(json.dumps(span.to_json(), separators=(",", ":")))
+
+    def close(self) -> None:
+        self.listener.stop()
+
+
+def _traced_check(predicate):
+    if getattr(predicate, "__traced__", False):
+        return predicate
+    # checks.cooldown(...) returns cooldown.<locals>.predicate
+    name = f"check.{predicate.__qualname__.split('.<locals>')[0]}"
+
+    @wraps(predicate)
+    async def check(interaction: discord.Interaction) -> bool:
+        with span(name):
+            return await maybe_coroutine(predicate, interaction)
+
+    check.__traced__ = True
+    return check
+
+
+class TracedCommandTree(app_commands.CommandTree):
+    """A command tree that starts a trace for a sample of its interactions."""
+
+    def add_command(self, command, /, **kwargs) -> None:
+        commands = [command]
+        if isinstance(command, app_commands.Group):
+            commands += command.walk_commands()
+        for cmd in commands:
+            if hasattr(cmd, "checks"):
+                cmd.checks[:] = [_traced_check(check) for check in cmd.checks]
+        return super().add_command(command, **kwargs)
+
+    async def _call(self, interaction: discord.Interaction) -> None:
+        tracer: Tracer = self.client.tracer
+        root = tracer.sample(
+            f"/{interaction.data.get('name', '?')}",
+            **{
+                "discord.interaction.type": interaction.type.name,
+                "discord.shard.id": interaction.guild and interaction.guild.shard_id,
+            },
+        )
+        if root is None:
+            return await super()._call(interaction)
+
+        token = current_span.set(root)
+        try:
+            await super()._call(interaction)
+        except BaseException as e:
+            root.error = repr(e)
+            raise
+        finally:
+            current_span.reset(token)
+            if interaction.command is not None:
+                root.name = f"/{interaction.command.qualified_name}"
+            if interaction.command_failed and root.error is None:
+                root.error = "command failed"
+            root.attributes["discord.response.type"] = (
+                interaction.response.type and interaction.response.type.name
+            )
+            root.finish()
+
+
+def _route(url: URL) -> tuple[str, str]:
+    """A span name and a path safe to store, without interaction tokens."""
+
+    path = url.path
+    if url.host != "discord.com":
+        return url.host, path
+    path = TOKEN_SEGMENT_RE.sub(r"\1{token}", path)
+    for pattern, name in DISCORD_ROUTES:
+        if pattern.match(path):
+            return name, path
+    return "discord", path
+
+
+async def _on_request_start(session, context: SimpleNamespace, params) -> None:
+    parent = current_span.get()
+    if parent is None:
+        context.span = None
+        return
+    name, path = _route(params.url)
+    context.span = parent.child(
+        name,
+        "CLIENT",
+        **{
+            "http.request.method": params.method,
+            "server.address": params.url.host,
+            "url.path": path,
+        },
+    )
+
+
+async def _on_request_chunk_sent(session, context: SimpleNamespace, params) -> None:
+    child = getattr(context, "span", None)
+    if child is None or child.name != "interaction.callback":
+        return
+    match = CALLBACK_TYPE_RE.search(params.chunk)
+    if match:
+        child.name = CALLBACK_TYPES.get(int(match[1]), child.name)
+
+
+async def _on_request_end(session, context: SimpleNamespace, params) -> None:
+    child = getattr(context, "span", None)
+    if child is None:
+        return
+    status = params.response.status
+    child.attributes["http.response.status_code"] = status
+    if status >= 400:
+        child.error = str(status)
+    child.finish()
+
+
+async def _on_request_exception(session, context: SimpleNamespace, params) -> None:
+    child = getattr(context, "span", None)
+    if child is None:
+        return
+    child.error = repr(params.exception)
+    child.finish()
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """Records HTTP requests made in a sampled interaction as client spans.
+
+    The span ends when the response headers arrive, so the time spent reading
+    and parsing the body belongs to whatever comes after it.
+    """
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_on_request_start)
+    config.on_request_chunk_sent.append(_on_request_chunk_sent)
+    config.on_request_end.append(_on_request_end)
+    config.on_request_exception.append(_on_request_exception)
+    return config
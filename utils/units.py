@@ -0,0 +1,188 @@
+"""Unit registry and conversions for /convert.
+
+Every unit converts to its dimension's base unit with an affine map,
+`base = value * scale + offset`, so between two units of a dimension it is
+`value * factor + shift`. Both numbers are precomputed for every pair.
+"""
+
+from typing import NamedTuple
+
+
+class Unit(NamedTuple):
+    symbol: str
+    name: str
+    dimension: str
+    scale: float
+    offset: float = 0.0
+    aliases: tuple[str, ...] = ()
+
+
+# ordered by how often each unit is likely to be used, which is also the
+# order autocomplete suggests them in
+UNITS = (
+    # length, in metres
+    Unit("m", "metre", "length", 1, aliases=("meter", "meters", "metres")),
+    Unit("km", "kilometre", "length", 1000, aliases=("kilometer", "kilometers")),
+    Unit("cm", "centimetre", "length", 0.01, aliases=("centimeter",)),
+    Unit("mm", "millimetre", "length", 0.001, aliases=("millimeter",)),
+    Unit("mi", "mile", "length", 1609.344, aliases=("miles",)),
+    Unit("ft", "foot", "length", 0.3048, aliases=("feet", "'")),
+    Unit("in", "inch", "length", 0.0254, aliases=("inches", '"')),
+    Unit("yd", "yard", "length", 0.9144, aliases=("yards",)),
+    Unit("nmi", "nautical mile", "length", 1852),
+    Unit("µm", "micrometre", "length", 1e-6, aliases=("um", "micron")),
+    Unit("au", "astronomical unit", "length", 149_597_870_700),
+    Unit("ly", "light-year", "length", 9_460_730_472_580_800),
+    # mass, in kilograms
+    Unit("kg", "kilogram", "mass", 1, aliases=("kilo", "kilos")),
+    Unit("g", "gram", "mass", 0.001, aliases=("grams",)),
+    Unit("lb", "pound", "mass", 0.45359237, aliases=("lbs", "pounds")),
+    Unit("oz", "ounce", "mass", 0.028349523125, aliases=("ounces",)),
+    Unit("mg", "milligram", "mass", 1e-6),
+    Unit("t", "tonne", "mass", 1000, aliases=("metric ton",)),
+    Unit("st", "stone", "mass", 6.35029318),
+    Unit("ton", "short ton", "mass", 907.18474, aliases=("us ton",)),
+    # temperature, in kelvin
+    Unit("°C", "Celsius", "temperature", 1, 273.15, aliases=("c", "centigrade")),
+    Unit("°F", "Fahrenheit", "temperature", 5 / 9, 273.15 - 32 * 5 / 9, aliases=("f",)),
+    Unit("K", "kelvin", "temperature", 1),
+    Unit("°R", "Rankine", "temperature", 5 / 9, aliases=("r",)),
+    # volume, in litres
+    Unit("L", "litre", "volume", 1, aliases=("liter", "liters", "litres")),
+    Unit("mL", "millilitre", "volume", 0.001, aliases=("milliliter", "cc")),
+    Unit("gal", "US gallon", "volume", 3.785411784, aliases=("gallon",)),
+    Unit("cup", "US cup", "volume", 0.2365882365, aliases=("cups",)),
+    Unit("fl oz", "US fluid ounce", "volume", 0.0295735295625, aliases=("floz",)),
+    Unit("tbsp", "tablespoon", "volume", 0.01478676478125),
+    Unit("tsp", "teaspoon", "volume", 0.00492892159375),
+    Unit("pt", "US pint", "volume", 0.473176473, aliases=("pint",)),
+    Unit("qt", "US quart", "volume", 0.946352946, aliases=("quart",)),
+    Unit("imp gal", "imperial gallon", "volume", 4.54609),
+    Unit("cL", "centilitre", "volume", 0.01, aliases=("centiliter",)),
+    Unit("m³", "cubic metre", "volume", 1000, aliases=("m3", "cubic meter")),
+    # area, in square metres
+    Unit("m²", "square metre", "area", 1, aliases=("m2", "square meter")),
+    Unit("km²", "square kilometre", "area", 1e6, aliases=("km2",)),
+    Unit("ha", "hectare", "area", 10_000, aliases=("hectares",)),
+    Unit("ac", "acre", "area", 4046.8564224, aliases=("acres",)),
+    Unit("ft²", "square foot", "area", 0.09290304, aliases=("ft2", "sq ft")),
+    Unit("mi²", "square mile", "area", 2_589_988.110336, aliases=("mi2", "sq mi")),
+    Unit("cm²", "square centimetre", "area", 1e-4, aliases=("cm2",)),
+    Unit("in²", "square inch", "area", 0.00064516, aliases=("in2", "sq in")),
+    # time, in seconds
+    Unit("s", "second", "time", 1, aliases=("sec", "seconds")),
+    Unit("min", "minute", "time", 60, aliases=("minutes",)),
+    Unit("h", "hour", "time", 3600, aliases=("hr", "hours")),
+    Unit("d", "day", "time", 86400, aliases=("days",)),
+    Unit("wk", "week", "time", 604_800, aliases=("weeks",)),
+    Unit("yr", "year", "time", 31_557_600, aliases=("years",)),
+    Unit("ms", "millisecond", "time", 0.001),
+    # speed, in metres per second
+    Unit("km/h", "kilometres per hour", "speed", 1 / 3.6, aliases=("kph", "kmh")),
+    Unit("mph", "miles per hour", "speed", 0.44704),
+    Unit("m/s", "metres per second", "speed", 1),
+    Unit("kn", "knot", "speed", 1852 / 3600, aliases=("knots", "kt")),
+    Unit("ft/s", "feet per second", "speed", 0.3048, aliases=("fps",)),
+    # data, in bytes
+    Unit("B", "byte", "data", 1, aliases=("bytes",)),
+    Unit("KB", "kilobyte", "data", 1000),
+    Unit("MB", "megabyte", "data", 1e6),
+    Unit("GB", "gigabyte", "data", 1e9),
+    Unit("TB", "terabyte", "data", 1e12),
+    Unit("KiB", "kibibyte", "data", 1024),
+    Unit("MiB", "mebibyte", "data", 1024**2),
+    Unit("GiB", "gibibyte", "data", 1024**3),
+    Unit("TiB", "tebibyte", "data", 1024**4),
+    Unit("bit", "bit", "data", 0.125, aliases=("bits",)),
+    # energy, in joules
+    Unit("J", "joule", "energy", 1, aliases=("joules",)),
+    Unit("kJ", "kilojoule", "energy", 1000),
+    Unit("kcal", "kilocalorie", "energy", 4184, aliases=("calories",)),
+    Unit("cal", "calorie", "energy", 4.184),
+    Unit("kWh", "kilowatt-hour", "energy", 3.6e6),
+    Unit("Wh", "watt-hour", "energy", 3600),
+    Unit("eV", "electronvolt", "energy", 1.602176634e-19),
+    # pressure, in pascals
+    Unit("Pa", "pascal", "pressure", 1),
+    Unit("kPa", "kilopascal", "pressure", 1000),
+    Unit("bar", "bar", "pressure", 100_000),
+    Unit("atm", "atmosphere", "pressure", 101_325),
+    Unit("psi", "pound per square inch", "pressure", 6894.757293168),
+    Unit("mmHg", "millimetre of mercury", "pressure", 133.322387415),
+)
+
+# every way of writing each unit, lowercased
+LOOKUP: dict[str, Unit] = {}
+for _unit in UNITS:
+    for _key in {_unit.symbol, _unit.name, *_unit.aliases}:
+        if LOOKUP.setdefault(_key.lower(), _unit) is not _unit:
+            raise ValueError(f"Unit name '{_key}' is used twice")
+
+# (factor, shift) for every pair of units of the same dimension
+CONVERSIONS: dict[tuple[str, str], tuple[float, float]] = {
+    (source.symbol, target.symbol): (
+        source.scale / target.scale,
+        (source.offset - target.offset) / target.scale,
+    )
+    for source in UNITS
+    for target in UNITS
+    if source.dimension == target.dimension
+}
+
+
+class TrieNode:
+    __slots__ = ("children", "units")
+
+    def __init__(self):
+        self.children: dict[str, TrieNode] = {}
+        # every unit with a name starting with this node's prefix, in UNITS order
+        self.units: list[Unit] = []
+
+
+def _build_trie() -> TrieNode:
+    root = TrieNode()
+    for unit in UNITS:
+        names = {unit.symbol, unit.name, *unit.aliases}
+        # "square foot" can also be found by typing "foot"
+        names.update(word for name in list(names) for word in name.split()[1:])
+        for name in names:
+            node = root
+            for char in name.lower():
+                node = node.children.setdefault(char, TrieNode())
+                if not node.units or node.units[-1] is not unit:
+                    node.units.append(unit)
+    root.units = list(UNITS)
+    return root
+
+
+TRIE = _build_trie()
+
+
+def find(text: str) -> Unit:
+    unit = LOOKUP.get(text.strip().lower())
+    if unit is None:
+        raise ValueError(f"Unknown unit `{text}`. Pick one from the suggestions.")
+    return unit
+
+
+def suggest(prefix: str, dimension: str | None = None, limit: int = 25) -> list[Unit]:
+    """Units with a name, symbol or alias starting with `prefix`."""
+
+    node = TRIE
+    for char in prefix.strip().lower():
+        node = node.children.get(char)
+        if node is None:
+            return []
+    if dimension is None:
+        return node.units[:limit]
+    return [unit for unit in node.units if unit.dimension == dimension][:limit]
+
+
+def convert(values: list[float], source: Unit, target: Unit) -> list[float]:
+    if source.dimension != target.dimension:
+        raise ValueError(
+            f"Can't convert {source.dimension} ({source.symbol})"
+            f" to {target.dimension} ({target.symbol})."
+        )
+    factor, shift = CONVERSIONS[source.symbol, target.symbol]
+    return [value * factor + shift for value in values]
@@ -0,0 +1,118 @@
+import time
+from datetime import UTC, datetime, timedelta
+
+import aiohttp
+from aiohttp import ClientSession
+
+from utils.cache import LRUCache
+from utils.database import Database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS weather_locations (
+    query TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    resolved_at REAL NOT NULL
+);
+"""
+
+API = "https://api.popcat.xyz/weather"
+# how often the upstream publishes a new observation for a location
+OBSERVATION_INTERVAL = 30 * 60
+# observations are cached until the next one is expected, but at least this
+# long, in case the upstream is late
+MIN_TTL = 5 * 60
+
+
+def normalize(location: str) -> str:
+    """'London ', 'london' and 'LONDON,UK' all become 'london' or 'london, uk'."""
+    parts = (" ".join(part.split()) for part in location.casefold().split(","))
+    return ", ".join(part for part in parts if part)
+
+
+def observed_at(data: dict) -> float | None:
+    """When an observation was made, as a UNIX timestamp, if it can be told."""
+    try:
+        local = datetime.fromisoformat(
+            f"{data['current']['date']}T{data['current']['observationtime']}"
+        )
+        offset = timedelta(hours=float(data["location"]["timezone"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (local - offset).replace(tzinfo=UTC).timestamp()
+
+
+class WeatherService:
+    """Weather observations, with as few upstream requests as possible.
+
+    A location query is normalized and resolved to the upstream's canonical
+    location name once; the resolution is stored in SQLite for good. Each
+    canonical location's observation is cached in memory until the upstream
+    is expected to publish the next one, so every spelling of a popular city
+    is served from memory for the whole observation interval.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        # normalized query -> canonical name, for the queries used lately
+        self._names = LRUCache(4096)
+        # canonical name -> (expiry timestamp, observation)
+        self._observations: dict[str, tuple[float, dict]] = {}
+
+    async def create_schema(self) -> None:
+        await self.db.executescript(SCHEMA)
+
+    async def _resolve(self, query: str) -> str | None:
+        name = self._names.get(query)
+        if name is None:
+            rows = await self.db.execute(
+                "SELECT name FROM weather_locations WHERE query = ?", (query,)
+            )
+            if rows:
+                name = self._names[query] = rows[0][0]
+        return name
+
+    async def _fetch(self, session: ClientSession, location: str) -> dict:
+        async with session.get(API, params={"q": location}) as r:
+            try:
+                json = await r.json()
+            except aiohttp.ContentTypeError:
+                raise ValueError("Invalid location")
+        if not isinstance(json, list) or not json:
+            raise ValueError("Invalid location")
+        return json[0]
+
+    def _store(self, name: str, data: dict) -> None:
+        now = time.time()
+        observed = observed_at(data)
+        expires = (observed or now) + OBSERVATION_INTERVAL
+        self._observations[name] = (max(expires, now + MIN_TTL), data)
+        # forget observations that have expired, so memory tracks active cities
+        if len(self._observations) > 1000:
+            self._observations = {
+                key: value
+                for key, value in self._observations.items()
+                if value[0] > now
+            }
+
+    async def get(self, session: ClientSession, location: str) -> dict:
+        query = normalize(location)
+        if not query:
+            raise ValueError("Invalid location")
+
+        name = await self._resolve(query)
+        if name is not None:
+            cached = self._observations.get(name)
+            if cached is not None and cached[0] > time.time():
+                return cached[1]
+
+        data = await self._fetch(session, name or query)
+        canonical = data["location"]["name"]
+        if name is None:
+            self._names[query] = canonical
+            await self.db.execute(
+                "INSERT OR REPLACE INTO weather_locations (query, name, resolved_at)"
+                " VALUES (?, ?, ?)",
+                (query, canonical, time.time()),
+            )
+        self._store(canonical, data)
+        return data
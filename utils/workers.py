@@ -0,0 +1,117 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any, NamedTuple
+
+import discord
+
+
+class Result(NamedTuple):
+    item: Any
+    value: Any = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class WorkerPool:
+    """Runs a coroutine function over many items with bounded concurrency.
+
+    discord.py already waits out per-route rate limits, but a bulk job can still
+    exhaust its retries on a long 429. When that happens the pool pauses every
+    worker until the limit resets, then retries the item, instead of letting
+    each worker discover the limit on its own.
+    """
+
+    def __init__(self, limit: int = 5, retries: int = 3):
+        self.limit = limit
+        self.retries = retries
+        self._gate = asyncio.Event()
+        self._gate.set()
+
+    @staticmethod
+    def _retry_after(error: discord.HTTPException) -> float | None:
+        if isinstance(error, discord.RateLimited):
+            return error.retry_after
+        if error.status == 429:
+            try:
+                return float(error.response.headers.get("Retry-After", 1))
+            except (AttributeError, TypeError, ValueError):
+                return 1.0
+        return None
+
+    async def _pause(self, seconds: float) -> None:
+        if not self._gate.is_set():
+            return await self._gate.wait()
+        self._gate.clear()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self._gate.set()
+
+    async def _call(self, func: Callable[[Any], Awaitable[Any]], item) -> Result:
+        for attempt in range(self.retries + 1):
+            await self._gate.wait()
+            try:
+                return Result(item, await func(item))
+            except discord.HTTPException as e:
+                retry_after = self._retry_after(e)
+                if retry_after is None or attempt == self.retries:
+                    return Result(item, error=e)
+                await self._pause(retry_after)
+            except Exception as e:
+                return Result(item, error=e)
+
+    async def run(
+        self,
+        items: Iterable,
+        func: Callable[[Any], Awaitable[Any]],
+        on_progress: Callable[[int, int], Awaitable[None]] | None = None,
+    ) -> list[Result]:
+        """Call `func` on every item and return the results in input order.
+
+        Exceptions are captured per item rather than raised, so one failed
+        channel or member doesn't abort the rest of the job.
+        """
+
+        items = list(items)
+        results: list[Result | None] = [None] * len(items)
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for index in range(len(items)):
+            queue.put_nowait(index)
+        done = 0
+
+        async def worker():
+            nonlocal done
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results[index] = await self._call(func, items[index])
+                done += 1
+                if on_progress is not None:
+                    await on_progress(done, len(items))
+
+        await asyncio.gather(*(worker() for _ in range(min(self.limit, len(items)))))
+        return results
+
+
+class ProgressReporter:
+    """Throttles progress edits on a message so a bulk job doesn't spam the API."""
+
+    def __init__(self, update: Callable[[str], Awaitable[Any]], interval: float = 2.0):
+        self.update = update
+        self.interval = interval
+        self._last = 0.0
+
+    async def __call__(self, done: int, total: int) -> None:
+        now = asyncio.get_running_loop().time()
+        if done != total and now - self._last < self.interval:
+            return
+        self._last = now
+        try:
+            await self.update(f"⏳ Working... {done}/{total}")
+        except discord.HTTPException:
+            pass
@@ -2,6 +2,18 @@ import discord
 
 from config import config
 
+BASE36_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def b36encode(number: int) -> str:
+    """Encodes a non-negative integer compactly, for packing IDs into custom IDs."""
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = BASE36_DIGITS[digit] + digits
+        if not number:
+            return digits
+
 
 class Confirm(discord.ui.View):
     def __init__(self, target: discord.User, *args, **kwargs):